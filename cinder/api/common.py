@@ -14,6 +14,7 @@
 #    under the License.
 
 
+import hashlib
 import os
 import re
 
@@ -104,18 +105,8 @@ def _get_marker_param(request):
     return request.GET['marker']
 
 
-def limited(items, request, max_limit=CONF.osapi_max_limit):
-    """Return a slice of items according to requested offset and limit.
-
-    :param items: A sliceable entity
-    :param request: ``wsgi.Request`` possibly containing 'offset' and 'limit'
-                    GET variables. 'offset' is where to start in the list,
-                    and 'limit' is the maximum number of items to return. If
-                    'limit' is not specified, 0, or > max_limit, we default
-                    to max_limit. Negative values for either offset or limit
-                    will cause exc.HTTPBadRequest() exceptions to be raised.
-    :kwarg max_limit: The maximum number of items to return from 'items'
-    """
+def _get_offset_and_limit(request, max_limit):
+    """Extract validated integer offset and limit from request or fail."""
     try:
         offset = int(request.GET.get('offset', 0))
     except ValueError:
@@ -137,10 +128,36 @@ def limited(items, request, max_limit=CONF.osapi_max_limit):
         raise webob.exc.HTTPBadRequest(explanation=msg)
 
     limit = min(max_limit, limit or max_limit)
+    return offset, limit
+
+
+def limited(items, request, max_limit=CONF.osapi_max_limit):
+    """Return a slice of items according to requested offset and limit.
+
+    :param items: A sliceable entity
+    :param request: ``wsgi.Request`` possibly containing 'offset' and 'limit'
+                    GET variables. 'offset' is where to start in the list,
+                    and 'limit' is the maximum number of items to return. If
+                    'limit' is not specified, 0, or > max_limit, we default
+                    to max_limit. Negative values for either offset or limit
+                    will cause exc.HTTPBadRequest() exceptions to be raised.
+    :kwarg max_limit: The maximum number of items to return from 'items'
+    """
+    offset, limit = _get_offset_and_limit(request, max_limit)
     range_end = offset + limit
     return items[offset:range_end]
 
 
+def get_limited_fetch_size(request, max_limit=CONF.osapi_max_limit):
+    """Return how many items must be fetched for ``limited`` to succeed.
+
+    Lets callers push the limit down to the database while still applying
+    the requested offset with ``limited`` afterwards.
+    """
+    offset, limit = _get_offset_and_limit(request, max_limit)
+    return offset + limit
+
+
 def limited_by_marker(items, request, max_limit=CONF.osapi_max_limit):
     """Return a slice of items according to the requested marker and limit."""
     params = get_pagination_params(request)
@@ -207,6 +224,21 @@ def dict_to_query_str(params):
     return param_str.rstrip('&')
 
 
+def resource_etag(request, version):
+    """Return an entity tag for a resource as seen by this request.
+
+    :param version: dict of the fields identifying the resource state, as
+                    returned by the *_get_version DB calls
+
+    The response content type and the caller's roles are folded in since
+    both change the representation (serializer and extension output).
+    """
+    context = request.environ['cinder.context']
+    key = (sorted(version.items()), request.best_match_content_type(),
+           sorted(context.roles))
+    return hashlib.md5(repr(key)).hexdigest()
+
+
 class ViewBuilder(object):
     """Model API responses as dictionaries."""
 
@@ -185,12 +185,14 @@ class BackupsController(wsgi.Controller):
 
         return webob.Response(status_int=202)
 
-    @wsgi.serializers(xml=BackupsTemplate)
+    @wsgi.serializers(xml=BackupsTemplate,
+                      json=wsgi.StreamingJSONDictSerializer)
     def index(self, req):
         """Returns a summary list of backups."""
         return self._get_backups(req, is_detail=False)
 
-    @wsgi.serializers(xml=BackupsTemplate)
+    @wsgi.serializers(xml=BackupsTemplate,
+                      json=wsgi.StreamingJSONDictSerializer)
     def detail(self, req):
         """Returns a detailed list of backups."""
         return self._get_backups(req, is_detail=True)
@@ -33,32 +33,35 @@ class VolumeImageMetadataController(wsgi.Controller):
         super(VolumeImageMetadataController, self).__init__(*args, **kwargs)
         self.volume_api = volume.API()
 
-    def _get_all_images_metadata(self, context):
-        """Returns the image metadata for all volumes."""
+    def _get_images_metadata(self, context, volume_ids):
+        """Returns the image metadata for the given volumes."""
         try:
-            all_metadata = self.volume_api.get_volumes_image_metadata(context)
+            all_metadata = self.volume_api.get_volumes_image_metadata(
+                context, volume_ids=volume_ids)
         except Exception as e:
             LOG.debug('Problem retrieving volume image metadata. '
                       'It will be skipped. Error: %s', e)
             all_metadata = {}
         return all_metadata
 
-    def _add_image_metadata(self, context, resp_volume, image_meta=None):
+    def _get_image_metadata(self, context, volume_id):
+        """Returns the image metadata of a single volume, keyed by its ID."""
+        try:
+            volume = {'id': volume_id}
+            image_meta = self.volume_api.get_volume_image_metadata(context,
+                                                                   volume)
+        except Exception:
+            return {}
+        return {volume_id: image_meta}
+
+    def _add_image_metadata(self, context, resp_volume, image_meta):
         """Appends the image metadata to the given volume.
 
         :param context: the request context
         :param resp_volume: the response volume
-        :param image_meta: The image metadata to append, if None is provided it
-                           will be retrieved from the database. An empty dict
-                           means there is no metadata and it should not be
-                           retrieved from the db.
+        :param image_meta: The image metadata to append. An empty dict means
+                           there is no metadata for the volume.
         """
-        if image_meta is None:
-            try:
-                image_meta = self.volume_api.get_volume_image_metadata(
-                    context, resp_volume)
-            except Exception:
-                return
         if image_meta:
             resp_volume['volume_image_metadata'] = dict(
                 image_meta.iteritems())
@@ -68,15 +71,26 @@ class VolumeImageMetadataController(wsgi.Controller):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeImageMetadataTemplate())
-            self._add_image_metadata(context, resp_obj.obj['volume'])
+            vol = resp_obj.obj['volume']
+            all_meta = req.cached_resources_by_ids(
+                [vol['id']],
+                lambda ids: self._get_image_metadata(context, ids[0]),
+                name='volume_image_metadata')
+            self._add_image_metadata(context, vol,
+                                     all_meta.get(vol['id'], {}))
 
     @wsgi.extends
     def detail(self, req, resp_obj):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumesImageMetadataTemplate())
-            all_meta = self._get_all_images_metadata(context)
-            for vol in list(resp_obj.obj.get('volumes', [])):
+            volumes = list(resp_obj.obj.get('volumes', []))
+            # Prefetch the metadata of the whole page with a single query
+            all_meta = req.cached_resources_by_ids(
+                [vol['id'] for vol in volumes],
+                lambda ids: self._get_images_metadata(context, ids),
+                name='volume_image_metadata')
+            for vol in volumes:
                 image_meta = all_meta.get(vol['id'], {})
                 self._add_image_metadata(context, vol, image_meta)
 
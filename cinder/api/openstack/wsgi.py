@@ -21,6 +21,7 @@ from xml.dom import minidom
 from xml.parsers import expat
 
 from lxml import etree
+from oslo.config import cfg
 import six
 import webob
 
@@ -37,6 +38,17 @@ XML_NS_V1 = 'http://docs.openstack.org/api/openstack-block-storage/1.0/content'
 XML_NS_V2 = 'http://docs.openstack.org/api/openstack-block-storage/2.0/content'
 XML_NS_ATOM = 'http://www.w3.org/2005/Atom'
 
+api_stream_opts = [
+    cfg.BoolOpt('osapi_stream_json_lists',
+                default=False,
+                help='Stream the JSON bodies of collection responses that '
+                     'support it one item at a time, instead of building '
+                     'the whole body in memory before sending it'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(api_stream_opts)
+
 LOG = logging.getLogger(__name__)
 
 SUPPORTED_CONTENT_TYPES = (
@@ -132,6 +144,32 @@ class Request(webob.Request):
             return None
         return resources.get(resource_id)
 
+    def cached_resources_by_ids(self, resource_ids, loader, name):
+        """Get resources by ID, batch loading the ones not cached yet.
+
+        Allow API extensions that need data beyond what the main controller
+        cached to prefetch it for a whole collection with a single call,
+        and to share it with any other extension that needs the same data
+        within the API request.
+
+        The loader is called at most once, with the list of IDs that have
+        not been requested before under the given resource name, and must
+        return a dict of ID to resource. IDs missing from that dict are
+        remembered as missing so they are not loaded again.
+
+        :returns: a dict of ID to resource for the requested IDs that exist
+        """
+        cached_resources = self._resource_cache.setdefault(name, {})
+        missing_ids = [resource_id for resource_id in resource_ids
+                       if resource_id not in cached_resources]
+        if missing_ids:
+            loaded = loader(missing_ids)
+            for resource_id in missing_ids:
+                cached_resources[resource_id] = loaded.get(resource_id)
+        return dict((resource_id, cached_resources[resource_id])
+                    for resource_id in resource_ids
+                    if cached_resources[resource_id] is not None)
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'cinder.best_content_type' not in self.environ:
@@ -336,6 +374,38 @@ class JSONDictSerializer(DictSerializer):
         return jsonutils.dumps(data)
 
 
+class StreamingJSONDictSerializer(JSONDictSerializer):
+    """JSON serialization streaming the items of top-level lists.
+
+    When osapi_stream_json_lists is enabled, returns an iterator over the
+    serialized body which encodes the items of the top-level lists one at
+    a time, so the body is never held in memory as a whole.  Meant for
+    collection responses, such as ``{"volumes": [...]}``.
+    """
+
+    def default(self, data):
+        if not CONF.osapi_stream_json_lists:
+            return super(StreamingJSONDictSerializer, self).default(data)
+        return self._iterencode(data)
+
+    def _iterencode(self, data):
+        yield '{'
+        for idx, (key, value) in enumerate(data.items()):
+            if idx:
+                yield ', '
+            yield '%s: ' % jsonutils.dumps(key)
+            if isinstance(value, list):
+                yield '['
+                for item_idx, item in enumerate(value):
+                    if item_idx:
+                        yield ', '
+                    yield jsonutils.dumps(item)
+                yield ']'
+            else:
+                yield jsonutils.dumps(value)
+        yield '}'
+
+
 class XMLDictSerializer(DictSerializer):
 
     def __init__(self, metadata=None, xmlns=None):
@@ -604,7 +674,12 @@ class ResponseObject(object):
             response.headers[hdr] = value
         response.headers['Content-Type'] = content_type
         if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
+            body = serializer.serialize(self.obj)
+            if isinstance(body, basestring):
+                response.body = body
+            else:
+                # A streaming serializer; send the body as it is produced
+                response.app_iter = body
 
         return response
 
@@ -960,6 +1035,7 @@ class Resource(wsgi.Application):
             # Run post-processing extensions
             if resp_obj:
                 _set_request_id_header(request, resp_obj)
+                _set_etag_header(request, resp_obj)
                 # Do a preserialize to set up the response object
                 serializers = getattr(meth, 'wsgi_serializers', {})
                 resp_obj._bind_method_serializers(serializers)
@@ -1193,6 +1269,12 @@ def _set_request_id_header(req, headers):
         headers['x-compute-request-id'] = context.request_id
 
 
+def _set_etag_header(req, headers):
+    etag = req.environ.get('cinder.etag')
+    if etag:
+        headers['ETag'] = '"%s"' % etag
+
+
 class OverLimitFault(webob.exc.HTTPException):
     """Rate-limited request response."""
 
@@ -19,6 +19,7 @@ Module dedicated functions/classes dealing with rate limiting requests.
 
 import collections
 import copy
+import hashlib
 import httplib
 import math
 import re
@@ -30,6 +31,8 @@ import webob.exc
 from cinder.api.openstack import wsgi
 from cinder.api.views import limits as limits_views
 from cinder.api import xmlutil
+from cinder import context as cinder_context
+from cinder import db
 from cinder.i18n import _
 from cinder.openstack.common import importutils
 from cinder.openstack.common import jsonutils
@@ -370,6 +373,146 @@ class Limiter(object):
         return result
 
 
+class MemoryBucketStore(object):
+    """Token bucket store kept in the memory of this process.
+
+    Only useful for a single API worker, or as a local stand-in for a
+    shared store in tests.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+
+    def consume(self, bucket_key, capacity, rate, count):
+        """Take up to `count` tokens from a bucket.
+
+        @return: Tuple of tokens granted, tokens left and seconds until the
+                 next token is available if none was granted.
+        """
+        now = self._get_time()
+        tokens, refilled_at = self.buckets.get(bucket_key, (capacity, now))
+        tokens = min(float(capacity), tokens + (now - refilled_at) * rate)
+
+        granted = min(count, int(tokens))
+        tokens -= granted
+        self.buckets[bucket_key] = (tokens, now)
+
+        wait = 0 if granted else (1 - tokens) / rate
+        return granted, tokens, wait
+
+    def _get_time(self):
+        """Retrieve the current time. Broken out for testability."""
+        return time.time()
+
+
+class DbBucketStore(object):
+    """Token bucket store in the Cinder database, shared by all workers.
+
+    A bucket left alone for as long as it takes to refill is full, which
+    is no different from having no bucket at all. Such buckets are deleted
+    once every `idle` seconds so the store only holds the buckets in use.
+    """
+
+    def __init__(self, idle=max(Limit.UNITS)):
+        self.context = cinder_context.get_admin_context()
+        self.idle = float(idle)
+        self.purged_at = None
+
+    def consume(self, bucket_key, capacity, rate, count):
+        self.idle = max(self.idle, float(capacity) / rate)
+        now = self._get_time()
+        if self.purged_at is None or now - self.purged_at >= self.idle:
+            self.purged_at = now
+            db.rate_limit_purge(self.context, self.idle)
+        return db.rate_limit_consume(self.context, bucket_key, capacity,
+                                     rate, count)
+
+    def _get_time(self):
+        """Retrieve the current time. Broken out for testability."""
+        return time.time()
+
+
+class SharedLimiter(Limiter):
+    """Rate-limit checking class backed by a store shared between workers.
+
+    Every limit is a token bucket holding `value` tokens and refilled at
+    `value` tokens per `unit`, so the configured limits hold for the whole
+    deployment instead of for each API worker.  To keep most requests away
+    from the store, tokens are taken from it in batches of up to `batch`
+    (but never more than a tenth of the limit) and handed out locally.
+
+    To use it, configure the rate limiting middleware with::
+
+        limiter = cinder.api.v1.limits.SharedLimiter
+        store = cinder.api.v1.limits.DbBucketStore
+        batch = 10
+    """
+
+    def __init__(self, limits, store=None, batch=10, **kwargs):
+        """Initialize the new `SharedLimiter`.
+
+        @param limits: List of `Limit` objects
+        @param store: String identifying class of the token bucket store
+        @param batch: Maximum number of tokens taken from the store at once
+        """
+        super(SharedLimiter, self).__init__(limits, **kwargs)
+        if store is None:
+            self.store = DbBucketStore()
+        else:
+            self.store = importutils.import_object(store)
+        self.batch = int(batch)
+        self.leased = collections.defaultdict(int)
+
+    def check_for_delay(self, verb, url, username=None):
+        """Check the given verb/user/user triplet for limit.
+
+        @return: Tuple of delay (in seconds) and error message (or None, None)
+        """
+        delays = []
+
+        for limit in self.levels[username]:
+            if limit.verb != verb or not re.match(limit.regex, url):
+                continue
+            delay = self._consume(limit, username)
+            if delay:
+                delays.append((delay, limit.error_message))
+
+        if delays:
+            delays.sort()
+            return delays[0]
+
+        return None, None
+
+    def _consume(self, limit, username):
+        """Take one token for the limit, return the delay if there is none."""
+        bucket_key = self._bucket_key(limit, username)
+        now = limit._get_time()
+
+        if self.leased[bucket_key] < 1:
+            count = max(1, min(self.batch, limit.value // 10))
+            granted, tokens, wait = self.store.consume(
+                bucket_key, limit.value,
+                float(limit.value) / limit.unit, count)
+            if not granted:
+                limit.remaining = 0
+                limit.next_request = now + wait
+                return wait
+            self.leased[bucket_key] = granted
+            limit.remaining = math.floor(tokens) + granted
+
+        self.leased[bucket_key] -= 1
+        if not self.leased[bucket_key]:
+            del self.leased[bucket_key]
+        limit.remaining = max(limit.remaining - 1, 0)
+        limit.next_request = now
+
+    @staticmethod
+    def _bucket_key(limit, username):
+        digest = hashlib.md5('%s|%s|%s|%s' % (limit.verb, limit.regex,
+                                              limit.value, limit.unit))
+        return '%s:%s' % (username or '', digest.hexdigest())
+
+
 class WsgiLimiter(object):
     """Rate-limit checking from a WSGI application.
 
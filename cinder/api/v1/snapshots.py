@@ -144,6 +144,7 @@ class SnapshotsController(wsgi.Controller):
         search_opts = req.GET.copy()
         search_opts.pop('limit', None)
         search_opts.pop('offset', None)
+        limit = common.get_limited_fetch_size(req)
 
         #filter out invalid option
         allowed_search_options = ('status', 'volume_id', 'display_name')
@@ -151,7 +152,8 @@ class SnapshotsController(wsgi.Controller):
                                             allowed_search_options)
 
         snapshots = self.volume_api.get_all_snapshots(context,
-                                                      search_opts=search_opts)
+                                                      search_opts=search_opts,
+                                                      limit=limit)
         limited_list = common.limited(snapshots, req)
         req.cache_resource(limited_list)
         res = [entity_maker(context, snapshot) for snapshot in limited_list]
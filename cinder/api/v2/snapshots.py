@@ -106,6 +106,14 @@ class SnapshotsController(wsgi.Controller):
         context = req.environ['cinder.context']
 
         try:
+            version = self.volume_api.get_snapshot_version(context, id)
+            etag = common.resource_etag(req, version)
+            if etag in req.if_none_match:
+                resp = exc.HTTPNotModified()
+                resp.etag = etag
+                return resp
+            req.environ['cinder.etag'] = etag
+
             snapshot = self.volume_api.get_snapshot(context, id)
             req.cache_resource(snapshot)
         except exception.NotFound:
@@ -129,12 +137,14 @@ class SnapshotsController(wsgi.Controller):
 
         return webob.Response(status_int=202)
 
-    @wsgi.serializers(xml=SnapshotsTemplate)
+    @wsgi.serializers(xml=SnapshotsTemplate,
+                      json=wsgi.StreamingJSONDictSerializer)
     def index(self, req):
         """Returns a summary list of snapshots."""
         return self._items(req, entity_maker=_translate_snapshot_summary_view)
 
-    @wsgi.serializers(xml=SnapshotsTemplate)
+    @wsgi.serializers(xml=SnapshotsTemplate,
+                      json=wsgi.StreamingJSONDictSerializer)
     def detail(self, req):
         """Returns a detailed list of snapshots."""
         return self._items(req, entity_maker=_translate_snapshot_detail_view)
@@ -143,10 +153,14 @@ class SnapshotsController(wsgi.Controller):
         """Returns a list of snapshots, transformed through entity_maker."""
         context = req.environ['cinder.context']
 
-        #pop out limit and offset , they are not search_opts
+        #pop out pagination and sort params, they are not search_opts
         search_opts = req.GET.copy()
+        marker = search_opts.pop('marker', None)
+        sort_key = search_opts.pop('sort_key', 'created_at')
+        sort_dir = search_opts.pop('sort_dir', 'desc')
         search_opts.pop('limit', None)
         search_opts.pop('offset', None)
+        limit = common.get_limited_fetch_size(req)
 
         #filter out invalid option
         allowed_search_options = ('status', 'volume_id', 'name')
@@ -159,7 +173,11 @@ class SnapshotsController(wsgi.Controller):
             del search_opts['name']
 
         snapshots = self.volume_api.get_all_snapshots(context,
-                                                      search_opts=search_opts)
+                                                      search_opts=search_opts,
+                                                      marker=marker,
+                                                      limit=limit,
+                                                      sort_key=sort_key,
+                                                      sort_dir=sort_dir)
         limited_list = common.limited(snapshots, req)
         req.cache_resource(limited_list)
         res = [entity_maker(context, snapshot) for snapshot in limited_list]
@@ -169,6 +169,16 @@ class VolumeController(wsgi.Controller):
         context = req.environ['cinder.context']
 
         try:
+            # Answer polling clients from the version row alone when their
+            # copy is still current, skipping the full load and extensions.
+            version = self.volume_api.get_version(context, id)
+            etag = common.resource_etag(req, version)
+            if etag in req.if_none_match:
+                resp = exc.HTTPNotModified()
+                resp.etag = etag
+                return resp
+            req.environ['cinder.etag'] = etag
+
             vol = self.volume_api.get(context, id, viewable_admin_meta=True)
             req.cache_resource(vol)
         except exception.NotFound:
@@ -196,12 +206,14 @@ class VolumeController(wsgi.Controller):
             raise exc.HTTPBadRequest(explanation=msg)
         return webob.Response(status_int=202)
 
-    @wsgi.serializers(xml=VolumesTemplate)
+    @wsgi.serializers(xml=VolumesTemplate,
+                      json=wsgi.StreamingJSONDictSerializer)
     def index(self, req):
         """Returns a summary list of volumes."""
         return self._get_volumes(req, is_detail=False)
 
-    @wsgi.serializers(xml=VolumesTemplate)
+    @wsgi.serializers(xml=VolumesTemplate,
+                      json=wsgi.StreamingJSONDictSerializer)
     def detail(self, req):
         """Returns a detailed list of volumes."""
         return self._get_volumes(req, is_detail=True)
@@ -33,6 +33,11 @@ XMLNS_VOLUME_V2 = ('http://docs.openstack.org/api/openstack-block-storage/2.0/'
 
 _split_pattern = re.compile(r'([^:{]*{[^}]*}[^:]*|[^:]+)')
 
+# Rendering plans compiled from lists of sibling template elements, keyed
+# by the tuple of those elements.  Cleared whenever a template element
+# gains or loses a child.
+_render_plans = {}
+
 
 def validate_schema(xml, schema_name):
     if isinstance(xml, str):
@@ -57,6 +62,7 @@ class Selector(object):
         """
 
         self.chain = chain
+        self._steps = tuple((callable(elem), elem) for elem in chain)
 
     def __repr__(self):
         """Return a representation of the selector."""
@@ -75,9 +81,9 @@ class Selector(object):
         """
 
         # Walk the selector list
-        for elem in self.chain:
+        for is_callable, elem in self._steps:
             # If it's callable, call it
-            if callable(elem):
+            if is_callable:
                 obj = elem(obj)
             else:
                 # Use indexing
@@ -175,6 +181,8 @@ class TemplateElement(object):
         self.selector = selector
         self.subselector = subselector
         self.attrib = {}
+        self._tagname_list = (None if callable(tag)
+                              else self._splitTagName(tag))
         self._text = None
         self._children = []
         self._childmap = {}
@@ -225,6 +233,7 @@ class TemplateElement(object):
 
         self._children.append(elem)
         self._childmap[elem.tag] = elem
+        _render_plans.clear()
 
     def extend(self, elems):
         """Append children to the element."""
@@ -246,6 +255,7 @@ class TemplateElement(object):
         # Update the children
         self._children.extend(elemlist)
         self._childmap.update(elemmap)
+        _render_plans.clear()
 
     def insert(self, idx, elem):
         """Insert a child element at the given index."""
@@ -259,6 +269,7 @@ class TemplateElement(object):
 
         self._children.insert(idx, elem)
         self._childmap[elem.tag] = elem
+        _render_plans.clear()
 
     def remove(self, elem):
         """Remove a child element."""
@@ -272,6 +283,7 @@ class TemplateElement(object):
 
         self._children.remove(elem)
         del self._childmap[elem.tag]
+        _render_plans.clear()
 
     def get(self, key):
         """Get an attribute.
@@ -379,27 +391,31 @@ class TemplateElement(object):
         """
 
         # Allocate a node
-        if callable(self.tag):
-            tagname = self.tag(datum)
-        else:
-            tagname = self.tag
-
-        # If the datum is None
-        if datum is not None:
-            tmpattrib = self.getAttrib(datum)
+        if self._tagname_list is None:
+            tagnameList = self._splitTagName(self.tag(datum))
         else:
-            tmpattrib = {}
+            tagnameList = self._tagname_list
 
-        tagnameList = self._splitTagName(tagname)
+        # The attributes are only needed to decide whether to merge into
+        # an existing element, so only compute them if there is one
+        tmpattrib = None
         insertIndex = 0
 
         #If parent is not none and has same tagname
         if parent is not None:
             for i in range(0, len(tagnameList)):
+                if not len(parent):
+                    break
                 tmpInsertPos = parent.find(tagnameList[i])
                 if tmpInsertPos is None:
                     break
-                elif not cmp(parent.attrib, tmpattrib) == 0:
+                if tmpattrib is None:
+                    # If the datum is None
+                    if datum is not None:
+                        tmpattrib = self.getAttrib(datum)
+                    else:
+                        tmpattrib = {}
+                if not cmp(parent.attrib, tmpattrib) == 0:
                     break
                 parent = tmpInsertPos
                 insertIndex = i + 1
@@ -571,6 +587,46 @@ def SubTemplateElement(parent, tag, attrib=None, selector=None,
     return elem
 
 
+class _RenderPlan(object):
+    """Rendering plan compiled from a list of sibling template elements.
+
+    The first sibling is rendered and the others are applied to it as
+    patches.  The children of all the siblings are merged by tag once, at
+    compile time, instead of for every datum that is serialized.
+    """
+
+    def __init__(self, siblings):
+        self.element = siblings[0]
+        self.patches = siblings[1:]
+        self.children = []
+
+        seen = set()
+        for idx, sibling in enumerate(siblings):
+            for child in sibling:
+                # Have we handled this child already?
+                if child.tag in seen:
+                    continue
+                seen.add(child.tag)
+
+                # Determine the child's siblings
+                nieces = [child]
+                for sib in siblings[idx + 1:]:
+                    if child.tag in sib:
+                        nieces.append(sib[child.tag])
+
+                self.children.append(_get_render_plan(nieces))
+
+
+def _get_render_plan(siblings):
+    """Return the cached rendering plan for a list of sibling elements."""
+
+    key = tuple(siblings)
+    plan = _render_plans.get(key)
+    if plan is None:
+        plan = _render_plans[key] = _RenderPlan(siblings)
+    return plan
+
+
 class Template(object):
     """Represent a template."""
 
@@ -604,27 +660,30 @@ class Template(object):
                       rendered.
         """
 
-        # First step, render the element
-        elems = siblings[0].render(parent, obj, siblings[1:], nsmap)
+        return self._serialize_plan(parent, obj, _get_render_plan(siblings),
+                                    nsmap)
 
-        # Now, traverse all child elements
-        seen = set()
-        for idx, sibling in enumerate(siblings):
-            for child in sibling:
-                # Have we handled this child already?
-                if child.tag in seen:
-                    continue
-                seen.add(child.tag)
+    def _serialize_plan(self, parent, obj, plan, nsmap=None):
+        """Internal serialization against a compiled rendering plan.
 
-                # Determine the child's siblings
-                nieces = [child]
-                for sib in siblings[idx + 1:]:
-                    if child.tag in sib:
-                        nieces.append(sib[child.tag])
+        :param parent: The parent etree.Element instance.  Can be
+                       None.
+        :param obj: The object to render.
+        :param plan: The _RenderPlan of the sibling TemplateElement
+                     instances against which to render the object.
+        :param nsmap: An optional namespace dictionary to be
+                      associated with the etree.Element instance
+                      rendered.
+        """
+
+        # First step, render the element
+        elems = plan.element.render(parent, obj, plan.patches, nsmap)
 
-                # Now call this function for all data elements recursively
-                for elem, datum in elems:
-                    self._serialize(elem, datum, nieces)
+        # Now call this function for all child elements and all data
+        # elements recursively
+        for child_plan in plan.children:
+            for elem, datum in elems:
+                self._serialize_plan(elem, datum, child_plan)
 
         # Return the first element; at the top level, this will be the
         # root element
@@ -79,11 +79,13 @@ class API(base.Base):
             search_opts = {}
         check_policy(context, 'get_all')
         if context.is_admin:
-            backups = self.db.backup_get_all(context, filters=search_opts)
+            backups = self.db.backup_get_all(context, filters=search_opts,
+                                             use_slave=True)
         else:
             backups = self.db.backup_get_all_by_project(context,
                                                         context.project_id,
-                                                        filters=search_opts)
+                                                        filters=search_opts,
+                                                        use_slave=True)
 
         return backups
 
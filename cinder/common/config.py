@@ -203,6 +203,15 @@ global_opts = [
                help='The full class name of the volume replication API class'),
     cfg.StrOpt('consistencygroup_api_class',
                default='cinder.consistencygroup.api.API',
-               help='The full class name of the consistencygroup API class'), ]
+               help='The full class name of the consistencygroup API class'),
+    cfg.StrOpt('cinder_internal_tenant_project_id',
+               default=None,
+               help='ID of the project which will be used as the Cinder '
+                    'internal tenant, owning volumes Cinder creates for '
+                    'itself such as image volume cache entries'),
+    cfg.StrOpt('cinder_internal_tenant_user_id',
+               default=None,
+               help='ID of the user to be used in volume operations as the '
+                    'Cinder internal tenant'), ]
 
 CONF.register_opts(global_opts)
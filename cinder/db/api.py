@@ -141,6 +141,16 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_heartbeat(context, service_ids):
+    """Increment the report_count of the given services in one update.
+
+    Returns the number of services that were updated, which is lower than
+    the number of given IDs if some of them do not exist anymore.
+
+    """
+    return IMPL.service_heartbeat(context, service_ids)
+
+
 ###################
 
 
@@ -185,6 +195,11 @@ def volume_data_get_for_host(context, host, count_only=False):
                                          count_only)
 
 
+def volume_capacity_get_by_host(context, host, statuses=None):
+    """Get (host, gigabytes) for each host and host#pool value of host."""
+    return IMPL.volume_capacity_get_by_host(context, host, statuses=statuses)
+
+
 def volume_data_get_for_project(context, project_id):
     """Get (volume_count, gigabytes) for project."""
     return IMPL.volume_data_get_for_project(context, project_id)
@@ -210,28 +225,56 @@ def volume_get(context, volume_id):
     return IMPL.volume_get(context, volume_id)
 
 
+def volume_get_version(context, volume_id):
+    """Get the fields identifying the current state of a volume."""
+    return IMPL.volume_get_version(context, volume_id)
+
+
 def volume_get_all(context, marker, limit, sort_key, sort_dir,
-                   filters=None):
+                   filters=None, use_slave=False):
     """Get all volumes."""
     return IMPL.volume_get_all(context, marker, limit, sort_key, sort_dir,
-                               filters=filters)
+                               filters=filters, use_slave=use_slave)
 
 
-def volume_get_all_by_host(context, host):
+def volume_get_all_by_host(context, host, use_slave=False):
     """Get all volumes belonging to a host."""
-    return IMPL.volume_get_all_by_host(context, host)
+    return IMPL.volume_get_all_by_host(context, host, use_slave=use_slave)
+
+
+def host_resource_counts(context, host):
+    """Count the volumes, consistency groups and backups on a host.
+
+    Rows on a pool of the host (host#pool) are counted too.
+
+    :returns: list of (table name, host value, row count) tuples, one per
+              distinct host value
+    """
+    return IMPL.host_resource_counts(context, host)
+
+
+def host_resource_rename(context, renames):
+    """Move volumes, consistency groups and backups to another host.
 
+    All the renames are done in one transaction with one UPDATE each.
 
-def volume_get_all_by_group(context, group_id):
+    :param renames: list of (table name, old host value, new host value)
+    :returns: list of (table name, old host, new host, updated row count)
+    """
+    return IMPL.host_resource_rename(context, renames)
+
+
+def volume_get_all_by_group(context, group_id, use_slave=False):
     """Get all volumes belonging to a consistency group."""
-    return IMPL.volume_get_all_by_group(context, group_id)
+    return IMPL.volume_get_all_by_group(context, group_id, use_slave=use_slave)
 
 
 def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
-                              sort_dir, filters=None):
+                              sort_dir, filters=None, use_slave=False):
     """Get all volumes belonging to a project."""
     return IMPL.volume_get_all_by_project(context, project_id, marker, limit,
-                                          sort_key, sort_dir, filters=filters)
+                                          sort_key, sort_dir, filters=filters,
+                                          use_slave=use_slave)
 
 
 def volume_get_iscsi_target_num(context, volume_id):
@@ -266,24 +309,41 @@ def snapshot_get(context, snapshot_id):
     return IMPL.snapshot_get(context, snapshot_id)
 
 
-def snapshot_get_all(context):
+def snapshot_get_version(context, snapshot_id):
+    """Get the fields identifying the current state of a snapshot."""
+    return IMPL.snapshot_get_version(context, snapshot_id)
+
+
+def snapshot_get_all(context, marker=None, limit=None, sort_key='created_at',
+                     sort_dir='desc', filters=None, use_slave=False):
     """Get all snapshots."""
-    return IMPL.snapshot_get_all(context)
+    return IMPL.snapshot_get_all(context, marker=marker, limit=limit,
+                                 sort_key=sort_key, sort_dir=sort_dir,
+                                 filters=filters, use_slave=use_slave)
 
 
-def snapshot_get_all_by_project(context, project_id):
+def snapshot_get_all_by_project(context, project_id, marker=None, limit=None,
+                                sort_key='created_at', sort_dir='desc',
+                                filters=None, use_slave=False):
     """Get all snapshots belonging to a project."""
-    return IMPL.snapshot_get_all_by_project(context, project_id)
+    return IMPL.snapshot_get_all_by_project(context, project_id,
+                                            marker=marker, limit=limit,
+                                            sort_key=sort_key,
+                                            sort_dir=sort_dir,
+                                            filters=filters,
+                                            use_slave=use_slave)
 
 
-def snapshot_get_all_for_cgsnapshot(context, project_id):
+def snapshot_get_all_for_cgsnapshot(context, project_id, use_slave=False):
     """Get all snapshots belonging to a cgsnapshot."""
-    return IMPL.snapshot_get_all_for_cgsnapshot(context, project_id)
+    return IMPL.snapshot_get_all_for_cgsnapshot(context, project_id,
+                                                use_slave=use_slave)
 
 
-def snapshot_get_all_for_volume(context, volume_id):
+def snapshot_get_all_for_volume(context, volume_id, use_slave=False):
     """Get all snapshots for a volume."""
-    return IMPL.snapshot_get_all_for_volume(context, volume_id)
+    return IMPL.snapshot_get_all_for_volume(context, volume_id,
+                                            use_slave=use_slave)
 
 
 def snapshot_update(context, snapshot_id, values):
@@ -302,12 +362,16 @@ def snapshot_data_get_for_project(context, project_id, volume_type_id=None):
                                               volume_type_id)
 
 
-def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
+def snapshot_get_active_by_window(context, begin, end=None, project_id=None,
+                                  marker=None, limit=None, use_slave=False):
     """Get all the snapshots inside the window.
 
-    Specifying a project_id will filter for a certain project.
+    Specifying a project_id will filter for a certain project.  Specifying
+    a marker and/or a limit returns one id-ordered batch of the window.
     """
-    return IMPL.snapshot_get_active_by_window(context, begin, end, project_id)
+    return IMPL.snapshot_get_active_by_window(context, begin, end, project_id,
+                                              marker=marker, limit=limit,
+                                              use_slave=use_slave)
 
 
 ####################
@@ -427,12 +491,16 @@ def volume_type_destroy(context, id):
     return IMPL.volume_type_destroy(context, id)
 
 
-def volume_get_active_by_window(context, begin, end=None, project_id=None):
+def volume_get_active_by_window(context, begin, end=None, project_id=None,
+                                marker=None, limit=None, use_slave=False):
     """Get all the volumes inside the window.
 
-    Specifying a project_id will filter for a certain project.
+    Specifying a project_id will filter for a certain project.  Specifying
+    a marker and/or a limit returns one id-ordered batch of the window.
     """
-    return IMPL.volume_get_active_by_window(context, begin, end, project_id)
+    return IMPL.volume_get_active_by_window(context, begin, end, project_id,
+                                            marker=marker, limit=limit,
+                                            use_slave=use_slave)
 
 
 ####################
@@ -562,11 +630,22 @@ def volume_glance_metadata_create(context, volume_id, key, value):
                                               value)
 
 
+def volume_glance_metadata_bulk_create(context, volume_id, metadata):
+    """Add Glance metadata key:value pairs to a volume, skipping known keys."""
+    return IMPL.volume_glance_metadata_bulk_create(context, volume_id,
+                                                   metadata)
+
+
 def volume_glance_metadata_get_all(context):
     """Return the glance metadata for all volumes."""
     return IMPL.volume_glance_metadata_get_all(context)
 
 
+def volume_glance_metadata_get_many(context, volume_ids):
+    """Return the glance metadata for the given volumes."""
+    return IMPL.volume_glance_metadata_get_many(context, volume_ids)
+
+
 def volume_glance_metadata_get(context, volume_id):
     """Return the glance metadata for a volume."""
     return IMPL.volume_glance_metadata_get(context, volume_id)
@@ -692,14 +771,16 @@ def quota_class_destroy_all_by_name(context, class_name):
 ###################
 
 
-def quota_usage_get(context, project_id, resource):
+def quota_usage_get(context, project_id, resource, use_slave=False):
     """Retrieve a quota usage or raise if it does not exist."""
-    return IMPL.quota_usage_get(context, project_id, resource)
+    return IMPL.quota_usage_get(context, project_id, resource,
+                                use_slave=use_slave)
 
 
-def quota_usage_get_all_by_project(context, project_id):
+def quota_usage_get_all_by_project(context, project_id, use_slave=False):
     """Retrieve all usage associated with a given resource."""
-    return IMPL.quota_usage_get_all_by_project(context, project_id)
+    return IMPL.quota_usage_get_all_by_project(context, project_id,
+                                               use_slave=use_slave)
 
 
 ###################
@@ -742,14 +823,14 @@ def backup_get(context, backup_id):
     return IMPL.backup_get(context, backup_id)
 
 
-def backup_get_all(context, filters=None):
+def backup_get_all(context, filters=None, use_slave=False):
     """Get all backups."""
-    return IMPL.backup_get_all(context, filters=filters)
+    return IMPL.backup_get_all(context, filters=filters, use_slave=use_slave)
 
 
-def backup_get_all_by_host(context, host):
+def backup_get_all_by_host(context, host, use_slave=False):
     """Get all backups belonging to a host."""
-    return IMPL.backup_get_all_by_host(context, host)
+    return IMPL.backup_get_all_by_host(context, host, use_slave=use_slave)
 
 
 def backup_create(context, values):
@@ -757,10 +838,11 @@ def backup_create(context, values):
     return IMPL.backup_create(context, values)
 
 
-def backup_get_all_by_project(context, project_id, filters=None):
+def backup_get_all_by_project(context, project_id, filters=None,
+                              use_slave=False):
     """Get all backups belonging to a project."""
     return IMPL.backup_get_all_by_project(context, project_id,
-                                          filters=filters)
+                                          filters=filters, use_slave=use_slave)
 
 
 def backup_update(context, backup_id, values):
@@ -894,3 +976,90 @@ def cgsnapshot_update(context, cgsnapshot_id, values):
 def cgsnapshot_destroy(context, cgsnapshot_id):
     """Destroy the cgsnapshot or raise if it does not exist."""
     return IMPL.cgsnapshot_destroy(context, cgsnapshot_id)
+
+
+###################
+
+
+def rate_limit_consume(context, bucket_key, capacity, rate, count):
+    """Take up to count tokens from a shared rate limit token bucket.
+
+    The bucket holds at most capacity tokens and is refilled with rate
+    tokens per second; it is created full on first use.
+
+    :returns: tuple of the number of tokens granted, the number of tokens
+              left in the bucket and the number of seconds until the next
+              token is available if none was granted.
+    """
+    return IMPL.rate_limit_consume(context, bucket_key, capacity, rate,
+                                   count)
+
+
+def rate_limit_purge(context, idle):
+    """Delete the rate limit buckets unused for more than idle seconds.
+
+    :returns: number of buckets deleted.
+    """
+    return IMPL.rate_limit_purge(context, idle)
+
+
+###################
+
+
+def image_volume_cache_create(context, host, image_id, image_updated_at,
+                              image_checksum, volume_id, size):
+    """Create a new image volume cache entry."""
+    return IMPL.image_volume_cache_create(context, host, image_id,
+                                          image_updated_at, image_checksum,
+                                          volume_id, size)
+
+
+def image_volume_cache_delete(context, volume_id):
+    """Delete the image volume cache entry of a volume."""
+    return IMPL.image_volume_cache_delete(context, volume_id)
+
+
+def image_volume_cache_get_and_update_last_used(context, image_id, host):
+    """Get the cache entry of an image on host and mark it used."""
+    return IMPL.image_volume_cache_get_and_update_last_used(context,
+                                                            image_id,
+                                                            host)
+
+
+def image_volume_cache_get_by_volume_id(context, volume_id):
+    """Get the image volume cache entry of a volume."""
+    return IMPL.image_volume_cache_get_by_volume_id(context, volume_id)
+
+
+def image_volume_cache_get_all_for_host(context, host):
+    """Get all cache entries on host, most recently used first."""
+    return IMPL.image_volume_cache_get_all_for_host(context, host)
+
+
+###################
+
+
+def purge_deleted_rows(context, age_in_days, batch_size=1000, throttle=0):
+    """Delete rows soft deleted more than age_in_days ago.
+
+    Rows are removed in batches of batch_size, each in its own transaction,
+    sleeping throttle seconds between batches. Rows something still
+    references are kept.
+
+    :returns: dict of the number of rows removed per table
+    """
+    return IMPL.purge_deleted_rows(context, age_in_days,
+                                   batch_size=batch_size, throttle=throttle)
+
+
+def archive_deleted_rows(context, age_in_days, batch_size=1000, throttle=0):
+    """Move rows soft deleted more than age_in_days ago to shadow tables.
+
+    Works like purge_deleted_rows, except that the rows are copied to the
+    shadow_<table> table before being removed.
+
+    :returns: dict of the number of rows archived per table
+    """
+    return IMPL.archive_deleted_rows(context, age_in_days,
+                                     batch_size=batch_size,
+                                     throttle=throttle)
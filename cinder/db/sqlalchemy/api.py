@@ -19,6 +19,7 @@
 """Implementation of SQLAlchemy backend."""
 
 
+import datetime
 import functools
 import sys
 import threading
@@ -55,6 +56,7 @@ options.set_defaults(CONF, connection='sqlite:///$state_path/cinder.sqlite')
 
 _LOCK = threading.Lock()
 _FACADE = None
+_READER = threading.local()
 
 
 def _create_facade_lazily():
@@ -76,14 +78,23 @@ def _create_facade_lazily():
         return _FACADE
 
 
-def get_engine():
+def get_engine(use_slave=False):
     facade = _create_facade_lazily()
-    return facade.get_engine()
+    return facade.get_engine(use_slave=use_slave)
 
 
-def get_session(**kwargs):
+def get_session(use_slave=None, **kwargs):
+    """Return a session, bound to the slave engine inside a read-only call.
+
+    Unless *use_slave* is given explicitly, the choice is inherited from the
+    innermost enclosing :py:func:`_read_only` call on this thread.  When no
+    ``[database] slave_connection`` is configured the facade falls back to
+    the master engine.
+    """
+    if use_slave is None:
+        use_slave = getattr(_READER, 'use_slave', False)
     facade = _create_facade_lazily()
-    return facade.get_session(**kwargs)
+    return facade.get_session(use_slave=use_slave, **kwargs)
 
 _DEFAULT_QUOTA_NAME = 'default'
 
@@ -219,6 +230,28 @@ def _retry_on_deadlock(f):
     return wrapped
 
 
+def _read_only(f):
+    """Decorator for DB API calls that may be served by the slave database.
+
+    The wrapped function accepts an optional ``use_slave`` keyword argument.
+    Callers pass ``use_slave=True`` only when they can tolerate data that
+    lags the master by the replication delay; the sessions created for the
+    duration of the call are then bound to the slave engine.
+    """
+    @functools.wraps(f)
+    def wrapped(*args, **kwargs):
+        use_slave = kwargs.pop('use_slave', None)
+        if use_slave is None:
+            return f(*args, **kwargs)
+        previous = getattr(_READER, 'use_slave', False)
+        _READER.use_slave = use_slave
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _READER.use_slave = previous
+    return wrapped
+
+
 def model_query(context, *args, **kwargs):
     """Query helper that accounts for context's `read_deleted` field.
 
@@ -458,6 +491,21 @@ def service_update(context, service_id, values):
         return service_ref
 
 
+@require_admin_context
+@_retry_on_deadlock
+def service_heartbeat(context, service_ids):
+    """Bump report_count of the given services with a single UPDATE.
+
+    :returns: the number of services that were updated
+    """
+    if not service_ids:
+        return 0
+    return model_query(context, models.Service, read_deleted="no").\
+        filter(models.Service.id.in_(service_ids)).\
+        update({'report_count': models.Service.report_count + 1,
+                'updated_at': timeutils.utcnow()},
+               synchronize_session=False)
+
 ###################
 
 
@@ -682,6 +730,7 @@ def quota_class_destroy_all_by_name(context, class_name):
 ###################
 
 
+@_read_only
 @require_context
 def quota_usage_get(context, project_id, resource):
     result = model_query(context, models.QuotaUsage, read_deleted="no").\
@@ -695,6 +744,7 @@ def quota_usage_get(context, project_id, resource):
     return result
 
 
+@_read_only
 @require_context
 def quota_usage_get_all_by_project(context, project_id):
     authorize_project_context(context, project_id)
@@ -1078,6 +1128,20 @@ def volume_data_get_for_host(context, host, count_only=False):
         return (result[0] or 0, result[1] or 0)
 
 
+@require_admin_context
+def volume_capacity_get_by_host(context, host, statuses=None):
+    query = model_query(context, models.Volume.host,
+                        func.sum(models.Volume.size), read_deleted="no").\
+        filter(_host_filter(models.Volume, host))
+    if statuses:
+        query = query.filter(models.Volume.status.in_(statuses))
+    rows = query.group_by(models.Volume.host).all()
+    # LIKE treats '_' and '%' in the host name as wildcards, see
+    # host_resource_counts
+    return [(row_host, size or 0) for row_host, size in sorted(rows)
+            if row_host == host or row_host.startswith(host + '#')]
+
+
 @require_admin_context
 def _volume_data_get_for_project(context, project_id, volume_type_id=None,
                                  session=None):
@@ -1227,6 +1291,50 @@ def volume_get(context, volume_id):
     return _volume_get(context, volume_id)
 
 
+def _metadata_version_subquery(meta_model, fk_column, parent_model):
+    """Latest change time across a resource's metadata rows.
+
+    Deleted rows are included on purpose so that removing a key also moves
+    the version forward.
+    """
+    changed_at = func.coalesce(meta_model.deleted_at, meta_model.updated_at,
+                               meta_model.created_at)
+    return sqlalchemy.select([func.max(changed_at)]).\
+        where(fk_column == parent_model.id).\
+        correlate(parent_model).\
+        as_scalar()
+
+
+@require_context
+def volume_get_version(context, volume_id):
+    """Return the fields that identify the visible state of a volume.
+
+    This is a single row query without the joined loads done by
+    volume_get, meant for conditional GET checks.
+    """
+    query = model_query(
+        context, models.Volume.project_id, models.Volume.status,
+        models.Volume.updated_at,
+        _metadata_version_subquery(models.VolumeMetadata,
+                                   models.VolumeMetadata.volume_id,
+                                   models.Volume),
+        _metadata_version_subquery(models.VolumeAdminMetadata,
+                                   models.VolumeAdminMetadata.volume_id,
+                                   models.Volume),
+        project_only=True)
+    result = query.filter(models.Volume.id == volume_id).first()
+    if not result:
+        raise exception.VolumeNotFound(volume_id=volume_id)
+
+    return {'id': volume_id,
+            'project_id': result[0],
+            'status': result[1],
+            'updated_at': result[2],
+            'metadata_updated_at': result[3],
+            'admin_metadata_updated_at': result[4]}
+
+
+@_read_only
 @require_admin_context
 def volume_get_all(context, marker, limit, sort_key, sort_dir,
                    filters=None):
@@ -1255,6 +1363,7 @@ def volume_get_all(context, marker, limit, sort_key, sort_dir,
         return query.all()
 
 
+@_read_only
 @require_admin_context
 def volume_get_all_by_host(context, host):
     """Retrieves all volumes hosted on a host."""
@@ -1276,12 +1385,58 @@ def volume_get_all_by_host(context, host):
         return []
 
 
+# Tables with a host column naming the volume backend, by table name
+_HOSTED_MODELS = {'volumes': models.Volume,
+                  'consistencygroups': models.ConsistencyGroup,
+                  'backups': models.Backup}
+
+
+def _host_filter(model, host):
+    # Matches both Host and Host#Pool, see volume_get_all_by_host
+    return or_(model.host == host, model.host.like(host + '#%'))
+
+
+@require_admin_context
+def host_resource_counts(context, host):
+    counts = []
+    for table in sorted(_HOSTED_MODELS):
+        model = _HOSTED_MODELS[table]
+        rows = model_query(context, model.host, func.count(model.id)).\
+            filter(_host_filter(model, host)).\
+            group_by(model.host).\
+            all()
+        # LIKE treats '_' and '%' in the host name as wildcards, drop
+        # whatever they matched beyond the real prefix.
+        counts.extend((table, row_host, count)
+                      for row_host, count in sorted(rows)
+                      if row_host == host or
+                      row_host.startswith(host + '#'))
+    return counts
+
+
+@require_admin_context
+@_retry_on_deadlock
+def host_resource_rename(context, renames):
+    session = get_session()
+    counts = []
+    with session.begin():
+        for table, old_host, new_host in renames:
+            model = _HOSTED_MODELS[table]
+            count = model_query(context, model, session=session).\
+                filter_by(host=old_host).\
+                update({'host': new_host}, synchronize_session=False)
+            counts.append((table, old_host, new_host, count))
+    return counts
+
+
+@_read_only
 @require_admin_context
 def volume_get_all_by_group(context, group_id):
     return _volume_get_query(context).filter_by(consistencygroup_id=group_id).\
         all()
 
 
+@_read_only
 @require_context
 def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
                               sort_dir, filters=None):
@@ -1483,47 +1638,54 @@ def _volume_x_metadata_get_item(context, volume_id, key, model, notfound_exec,
     return result
 
 
+def _metadata_bulk_update(query, model, values, metadata, delete, session):
+    """Upsert metadata rows with a fixed set of statements.
+
+    The live rows are read once.  Dropped keys are then soft deleted and
+    changed values rewritten with one UPDATE each, and new keys added with
+    a single multi-row INSERT, whatever the number of keys.
+
+    :param query: query over the live metadata rows of the resource
+    :param values: columns to set on new rows, i.e. the resource foreign key
+    """
+    existing = dict(query.with_entities(model.key, model.value).all())
+
+    if delete:
+        stale = [key for key in existing if key not in metadata]
+        if stale:
+            query.filter(model.key.in_(stale)).\
+                update({'deleted': True,
+                        'deleted_at': timeutils.utcnow(),
+                        'updated_at': literal_column('updated_at')},
+                       synchronize_session=False)
+
+    changed = dict((key, value) for key, value in metadata.iteritems()
+                   if key in existing and existing[key] != value)
+    if changed:
+        query.filter(model.key.in_(changed.keys())).\
+            update({'value': sqlalchemy.case(changed, value=model.key)},
+                   synchronize_session=False)
+
+    new_rows = [dict(values, key=key, value=value)
+                for key, value in metadata.iteritems()
+                if key not in existing]
+    if new_rows:
+        session.execute(model.__table__.insert(), new_rows)
+
+
 def _volume_x_metadata_update(context, volume_id, metadata, delete,
-                              model, notfound_exec, session=None):
+                              model, session=None):
     if not session:
         session = get_session()
 
     with session.begin(subtransactions=True):
-        # Set existing metadata to deleted if delete argument is True
-        if delete:
-            original_metadata = _volume_x_metadata_get(context, volume_id,
-                                                       model, session=session)
-            for meta_key, meta_value in original_metadata.iteritems():
-                if meta_key not in metadata:
-                    meta_ref = _volume_x_metadata_get_item(context, volume_id,
-                                                           meta_key, model,
-                                                           notfound_exec,
-                                                           session=session)
-                    meta_ref.update({'deleted': True})
-                    meta_ref.save(session=session)
-
-        meta_ref = None
-
-        # Now update all existing items with new values, or create new meta
-        # objects
-        for meta_key, meta_value in metadata.items():
-
-            # update the value whether it exists or not
-            item = {"value": meta_value}
+        query = _volume_x_metadata_get_query(context, volume_id, model,
+                                             session=session)
+        _metadata_bulk_update(query, model, {'volume_id': volume_id},
+                              metadata, delete, session)
 
-            try:
-                meta_ref = _volume_x_metadata_get_item(context, volume_id,
-                                                       meta_key, model,
-                                                       notfound_exec,
-                                                       session=session)
-            except notfound_exec:
-                meta_ref = model()
-                item.update({"key": meta_key, "volume_id": volume_id})
-
-            meta_ref.update(item)
-            meta_ref.save(session=session)
-
-    return _volume_x_metadata_get(context, volume_id, model)
+        return _volume_x_metadata_get(context, volume_id, model,
+                                      session=session)
 
 
 def _volume_user_metadata_get_query(context, volume_id, session=None):
@@ -1552,7 +1714,6 @@ def _volume_user_metadata_update(context, volume_id, metadata, delete,
                                  session=None):
     return _volume_x_metadata_update(context, volume_id, metadata, delete,
                                      models.VolumeMetadata,
-                                     exception.VolumeMetadataNotFound,
                                      session=session)
 
 
@@ -1608,7 +1769,6 @@ def _volume_admin_metadata_update(context, volume_id, metadata, delete,
                                   session=None):
     return _volume_x_metadata_update(context, volume_id, metadata, delete,
                                      models.VolumeAdminMetadata,
-                                     exception.VolumeAdminMetadataNotFound,
                                      session=session)
 
 
@@ -1693,13 +1853,61 @@ def snapshot_get(context, snapshot_id):
     return _snapshot_get(context, snapshot_id)
 
 
+@require_context
+def snapshot_get_version(context, snapshot_id):
+    """Return the fields that identify the visible state of a snapshot.
+
+    Like volume_get_version this skips the joined loads of snapshot_get.
+    """
+    query = model_query(
+        context, models.Snapshot.project_id, models.Snapshot.status,
+        models.Snapshot.updated_at, models.Snapshot.progress,
+        _metadata_version_subquery(models.SnapshotMetadata,
+                                   models.SnapshotMetadata.snapshot_id,
+                                   models.Snapshot),
+        project_only=True)
+    result = query.filter(models.Snapshot.id == snapshot_id).first()
+    if not result:
+        raise exception.SnapshotNotFound(snapshot_id=snapshot_id)
+
+    return {'id': snapshot_id,
+            'project_id': result[0],
+            'status': result[1],
+            'updated_at': result[2],
+            'progress': result[3],
+            'metadata_updated_at': result[4]}
+
+
+@_read_only
 @require_admin_context
-def snapshot_get_all(context):
-    return model_query(context, models.Snapshot).\
-        options(joinedload('snapshot_metadata')).\
-        all()
+def snapshot_get_all(context, marker=None, limit=None, sort_key='created_at',
+                     sort_dir='desc', filters=None):
+    """Retrieves all snapshots.
+
+    :param context: context to query under
+    :param marker: the last item of the previous page, used to determine the
+                   next page of results to return
+    :param limit: maximum number of items to return
+    :param sort_key: single attributes by which results should be sorted
+    :param sort_dir: direction in which results should be sorted (asc, desc)
+    :param filters: dictionary of filters; values that are lists, tuples,
+                    sets, or frozensets cause an 'IN' test to be performed,
+                    while exact matching ('==' operator) is used for other
+                    values
+    :returns: list of matching snapshots
+    """
+    session = get_session()
+    with session.begin():
+        query = _generate_snapshot_paginate_query(context, session, marker,
+                                                  limit, sort_key, sort_dir,
+                                                  filters)
+        # No snapshots would match, return empty list
+        if query is None:
+            return []
+        return query.all()
 
 
+@_read_only
 @require_context
 def snapshot_get_all_for_volume(context, volume_id):
     return model_query(context, models.Snapshot, read_deleted='no',
@@ -1709,6 +1917,7 @@ def snapshot_get_all_for_volume(context, volume_id):
         all()
 
 
+@_read_only
 @require_context
 def snapshot_get_all_for_cgsnapshot(context, cgsnapshot_id):
     return model_query(context, models.Snapshot, read_deleted='no',
@@ -1719,13 +1928,112 @@ def snapshot_get_all_for_cgsnapshot(context, cgsnapshot_id):
         all()
 
 
+@_read_only
 @require_context
-def snapshot_get_all_by_project(context, project_id):
-    authorize_project_context(context, project_id)
-    return model_query(context, models.Snapshot).\
-        filter_by(project_id=project_id).\
-        options(joinedload('snapshot_metadata')).\
-        all()
+def snapshot_get_all_by_project(context, project_id, marker=None, limit=None,
+                                sort_key='created_at', sort_dir='desc',
+                                filters=None):
+    """Retrieves all snapshots in a project.
+
+    :param context: context to query under
+    :param project_id: project for all snapshots being retrieved
+    :param marker: the last item of the previous page, used to determine the
+                   next page of results to return
+    :param limit: maximum number of items to return
+    :param sort_key: single attributes by which results should be sorted
+    :param sort_dir: direction in which results should be sorted (asc, desc)
+    :param filters: dictionary of filters, see snapshot_get_all
+    :returns: list of matching snapshots
+    """
+    session = get_session()
+    with session.begin():
+        authorize_project_context(context, project_id)
+        # Add in the project filter without modifying the given filters
+        filters = filters.copy() if filters else {}
+        filters['project_id'] = project_id
+        query = _generate_snapshot_paginate_query(context, session, marker,
+                                                  limit, sort_key, sort_dir,
+                                                  filters)
+        # No snapshots would match, return empty list
+        if query is None:
+            return []
+        return query.all()
+
+
+def _generate_snapshot_paginate_query(context, session, marker, limit,
+                                      sort_key, sort_dir, filters):
+    """Generate the snapshot query including filters and paginate options.
+
+    Returns a query with sorting / pagination criteria added or None
+    if the given filters will not yield any results.
+
+    :param context: context to query under
+    :param session: the session to use
+    :param marker: the last item of the previous page; we returns the next
+                    results after this value.
+    :param limit: maximum number of items to return
+    :param sort_key: single attributes by which results should be sorted
+    :param sort_dir: direction in which results should be sorted (asc, desc)
+    :param filters: dictionary of filters; values that are lists,
+                    tuples, sets, or frozensets cause an 'IN' test to
+                    be performed, while exact matching ('==' operator)
+                    is used for other values. A 'metadata' dict matches
+                    snapshots carrying every given key/value pair.
+    :returns: updated query or None
+    """
+    query = model_query(context, models.Snapshot, session=session).\
+        options(joinedload('snapshot_metadata'))
+
+    if filters:
+        # Ensure that the filter value exists on the model
+        for key in filters.keys():
+            # metadata is unique, must be a dict
+            if key == 'metadata':
+                if not isinstance(filters[key], dict):
+                    LOG.debug("'metadata' filter value is not valid.")
+                    return None
+                continue
+            try:
+                column_attr = getattr(models.Snapshot, key)
+                # Do not allow relationship properties since those require
+                # schema specific knowledge
+                prop = getattr(column_attr, 'property')
+                if isinstance(prop, RelationshipProperty):
+                    LOG.debug("'%s' filter key is not valid, it maps to a "
+                              "relationship.", key)
+                    return None
+            except AttributeError:
+                LOG.debug("'%s' filter key is not valid.", key)
+                return None
+
+        # Holds the simple exact matches
+        filter_dict = {}
+
+        for key, value in filters.iteritems():
+            if key == 'metadata':
+                col_attr = getattr(models.Snapshot, 'snapshot_metadata')
+                for k, v in value.iteritems():
+                    query = query.filter(col_attr.any(key=k, value=v))
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                # Looking for values in a list; apply to query directly
+                column_attr = getattr(models.Snapshot, key)
+                query = query.filter(column_attr.in_(value))
+            else:
+                # OK, simple exact match; save for later
+                filter_dict[key] = value
+
+        # Apply simple exact matches
+        if filter_dict:
+            query = query.filter_by(**filter_dict)
+
+    marker_snapshot = None
+    if marker is not None:
+        marker_snapshot = _snapshot_get(context, marker, session)
+
+    return sqlalchemyutils.paginate_query(query, models.Snapshot, limit,
+                                          [sort_key, 'created_at', 'id'],
+                                          marker=marker_snapshot,
+                                          sort_dir=sort_dir)
 
 
 @require_context
@@ -1753,9 +2061,16 @@ def snapshot_data_get_for_project(context, project_id, volume_type_id=None):
     return _snapshot_data_get_for_project(context, project_id, volume_type_id)
 
 
+@_read_only
 @require_context
-def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
-    """Return snapshots that were active during window."""
+def snapshot_get_active_by_window(context, begin, end=None, project_id=None,
+                                  marker=None, limit=None):
+    """Return snapshots that were active during window.
+
+    When a marker or a limit is given the snapshots are returned ordered by
+    id, starting after the snapshot id given as marker, so that the window
+    can be walked in batches.
+    """
 
     query = model_query(context, models.Snapshot, read_deleted="yes")
     query = query.filter(or_(models.Snapshot.deleted_at == None,  # noqa
@@ -1765,6 +2080,7 @@ def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
         query = query.filter(models.Snapshot.created_at < end)
     if project_id:
         query = query.filter_by(project_id=project_id)
+    query = _window_batch_query(query, models.Snapshot, marker, limit)
 
     return query.all()
 
@@ -1814,56 +2130,16 @@ def snapshot_metadata_delete(context, snapshot_id, key):
                 'updated_at': literal_column('updated_at')})
 
 
-@require_context
-def _snapshot_metadata_get_item(context, snapshot_id, key, session=None):
-    result = _snapshot_metadata_get_query(context,
-                                          snapshot_id,
-                                          session=session).\
-        filter_by(key=key).\
-        first()
-
-    if not result:
-        raise exception.SnapshotMetadataNotFound(metadata_key=key,
-                                                 snapshot_id=snapshot_id)
-    return result
-
-
 @require_context
 @require_snapshot_exists
 @_retry_on_deadlock
 def snapshot_metadata_update(context, snapshot_id, metadata, delete):
     session = get_session()
     with session.begin():
-        # Set existing metadata to deleted if delete argument is True
-        if delete:
-            original_metadata = _snapshot_metadata_get(context, snapshot_id,
-                                                       session)
-            for meta_key, meta_value in original_metadata.iteritems():
-                if meta_key not in metadata:
-                    meta_ref = _snapshot_metadata_get_item(context,
-                                                           snapshot_id,
-                                                           meta_key, session)
-                    meta_ref.update({'deleted': True})
-                    meta_ref.save(session=session)
-
-        meta_ref = None
-
-        # Now update all existing items with new values, or create new meta
-        # objects
-        for meta_key, meta_value in metadata.items():
-
-            # update the value whether it exists or not
-            item = {"value": meta_value}
-
-            try:
-                meta_ref = _snapshot_metadata_get_item(context, snapshot_id,
-                                                       meta_key, session)
-            except exception.SnapshotMetadataNotFound:
-                meta_ref = models.SnapshotMetadata()
-                item.update({"key": meta_key, "snapshot_id": snapshot_id})
-
-            meta_ref.update(item)
-            meta_ref.save(session=session)
+        query = _snapshot_metadata_get_query(context, snapshot_id, session)
+        _metadata_bulk_update(query, models.SnapshotMetadata,
+                              {'snapshot_id': snapshot_id},
+                              metadata, delete, session)
 
     return snapshot_metadata_get(context, snapshot_id)
 
@@ -2090,12 +2366,20 @@ def volume_type_destroy(context, id):
                     'updated_at': literal_column('updated_at')})
 
 
+@_read_only
 @require_context
 def volume_get_active_by_window(context,
                                 begin,
                                 end=None,
-                                project_id=None):
-    """Return volumes that were active during window."""
+                                project_id=None,
+                                marker=None,
+                                limit=None):
+    """Return volumes that were active during window.
+
+    When a marker or a limit is given the volumes are returned ordered by
+    id, starting after the volume id given as marker, so that the window
+    can be walked in batches.
+    """
     query = model_query(context, models.Volume, read_deleted="yes")
     query = query.filter(or_(models.Volume.deleted_at == None,  # noqa
                              models.Volume.deleted_at > begin))
@@ -2103,10 +2387,28 @@ def volume_get_active_by_window(context,
         query = query.filter(models.Volume.created_at < end)
     if project_id:
         query = query.filter_by(project_id=project_id)
+    query = _window_batch_query(query, models.Volume, marker, limit)
 
     return query.all()
 
 
+def _window_batch_query(query, model, marker, limit):
+    """Restrict an active-by-window query to one batch keyed on id.
+
+    The id of the last row of the previous batch is used as marker instead
+    of an offset, so that every batch is a bounded index range scan no
+    matter how far into the window it is.
+    """
+    if marker is None and limit is None:
+        return query
+    query = query.order_by(model.id)
+    if marker is not None:
+        query = query.filter(model.id > marker)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
 ####################
 
 
@@ -2559,6 +2861,21 @@ def volume_glance_metadata_get_all(context):
     return _volume_glance_metadata_get_all(context)
 
 
+@require_context
+def volume_glance_metadata_get_many(context, volume_ids):
+    """Return the Glance metadata for the given volumes in one query."""
+    if not volume_ids:
+        return []
+
+    query = model_query(context, models.VolumeGlanceMetadata).\
+        filter(models.VolumeGlanceMetadata.volume_id.in_(volume_ids))
+    if is_user_context(context):
+        query = query.filter(
+            models.Volume.id == models.VolumeGlanceMetadata.volume_id,
+            models.Volume.project_id == context.project_id)
+    return query.all()
+
+
 @require_context
 @require_volume_exists
 def _volume_glance_metadata_get(context, volume_id, session=None):
@@ -2633,6 +2950,30 @@ def volume_glance_metadata_create(context, volume_id, key, value):
     return
 
 
+@require_context
+@require_volume_exists
+def volume_glance_metadata_bulk_create(context, volume_id, metadata):
+    """Add a set of key:value pairs to the Glance metadata of a volume.
+
+    All the pairs are added in one transaction and a single INSERT. Keys the
+    volume already has are skipped, their value is never changed.
+    """
+
+    session = get_session()
+    with session.begin():
+        existing = set(key for key, in session.query(
+            models.VolumeGlanceMetadata.key).
+            filter_by(volume_id=volume_id).
+            filter_by(deleted=False))
+
+        new_rows = [{'volume_id': volume_id, 'key': key, 'value': str(value)}
+                    for key, value in metadata.iteritems()
+                    if key not in existing]
+        if new_rows:
+            session.execute(models.VolumeGlanceMetadata.__table__.insert(),
+                            new_rows)
+
+
 @require_context
 @require_snapshot_exists
 def volume_glance_metadata_copy_to_snapshot(context, snapshot_id, volume_id):
@@ -2748,16 +3089,19 @@ def _backup_get_all(context, filters=None):
         return query.all()
 
 
+@_read_only
 @require_admin_context
 def backup_get_all(context, filters=None):
     return _backup_get_all(context, filters)
 
 
+@_read_only
 @require_admin_context
 def backup_get_all_by_host(context, host):
     return model_query(context, models.Backup).filter_by(host=host).all()
 
 
+@_read_only
 @require_context
 def backup_get_all_by_project(context, project_id, filters=None):
 
@@ -3137,3 +3481,206 @@ def cgsnapshot_destroy(context, cgsnapshot_id):
                     'deleted': True,
                     'deleted_at': timeutils.utcnow(),
                     'updated_at': literal_column('updated_at')})
+
+
+###############################
+
+
+@require_context
+def rate_limit_consume(context, bucket_key, capacity, rate, count):
+    try:
+        return _rate_limit_consume(context, bucket_key, capacity, rate, count)
+    except db_exc.DBDuplicateEntry:
+        # NOTE: two workers may try to create the bucket of a new key at the
+        #       same time, the loser retries once against the row the winner
+        #       added and gives up if that fails too.
+        return _rate_limit_consume(context, bucket_key, capacity, rate, count)
+
+
+@_retry_on_deadlock
+def _rate_limit_consume(context, bucket_key, capacity, rate, count):
+    now = time.time()
+    session = get_session()
+    with session.begin():
+        # NOTE: bucket_key is unique among deleted rows too, so a deleted
+        #       bucket is brought back rather than added again.
+        bucket = model_query(context, models.RateLimitBucket,
+                             session=session, read_deleted="yes").\
+            filter_by(bucket_key=bucket_key).\
+            with_lockmode('update').\
+            first()
+
+        if bucket is None:
+            bucket = models.RateLimitBucket()
+            bucket.bucket_key = bucket_key
+        if bucket.id is None or bucket.deleted:
+            bucket.deleted = False
+            bucket.deleted_at = None
+            bucket.tokens = float(capacity)
+        else:
+            elapsed = max(now - bucket.refilled_at, 0)
+            bucket.tokens = min(float(capacity),
+                                bucket.tokens + elapsed * rate)
+        bucket.refilled_at = now
+
+        granted = min(count, int(bucket.tokens))
+        bucket.tokens -= granted
+        tokens = bucket.tokens
+        session.add(bucket)
+
+    wait = 0 if granted else (1 - tokens) / rate
+    return granted, tokens, wait
+
+
+@require_admin_context
+def rate_limit_purge(context, idle):
+    session = get_session()
+    with session.begin():
+        return session.query(models.RateLimitBucket).\
+            filter(models.RateLimitBucket.refilled_at < time.time() - idle).\
+            delete(synchronize_session=False)
+
+
+###############################
+
+
+@require_admin_context
+def image_volume_cache_create(context, host, image_id, image_updated_at,
+                              image_checksum, volume_id, size):
+    session = get_session()
+    with session.begin():
+        cache_entry = models.ImageVolumeCacheEntry()
+        cache_entry.host = host
+        cache_entry.image_id = image_id
+        cache_entry.image_updated_at = image_updated_at
+        cache_entry.image_checksum = image_checksum
+        cache_entry.volume_id = volume_id
+        cache_entry.size = size
+        cache_entry.last_used = timeutils.utcnow()
+        session.add(cache_entry)
+        return cache_entry
+
+
+@require_admin_context
+def image_volume_cache_delete(context, volume_id):
+    session = get_session()
+    with session.begin():
+        session.query(models.ImageVolumeCacheEntry).\
+            filter_by(volume_id=volume_id).\
+            delete()
+
+
+@require_admin_context
+def image_volume_cache_get_and_update_last_used(context, image_id, host):
+    session = get_session()
+    with session.begin():
+        entry = session.query(models.ImageVolumeCacheEntry).\
+            filter_by(image_id=image_id).\
+            filter_by(host=host).\
+            order_by(models.ImageVolumeCacheEntry.last_used.desc()).\
+            first()
+
+        if entry:
+            entry.last_used = timeutils.utcnow()
+            entry.save(session=session)
+        return entry
+
+
+@require_admin_context
+def image_volume_cache_get_by_volume_id(context, volume_id):
+    return get_session().query(models.ImageVolumeCacheEntry).\
+        filter_by(volume_id=volume_id).\
+        first()
+
+
+@require_admin_context
+def image_volume_cache_get_all_for_host(context, host):
+    return get_session().query(models.ImageVolumeCacheEntry).\
+        filter_by(host=host).\
+        order_by(models.ImageVolumeCacheEntry.last_used.desc()).\
+        all()
+
+
+###############################
+
+
+def _soft_deleted_tables(meta):
+    """Soft deletable tables, each after the tables referencing it."""
+    return [table for table in reversed(meta.sorted_tables)
+            if not table.name.startswith('shadow_') and
+            'deleted' in table.c and 'deleted_at' in table.c]
+
+
+def _expired_rows_query(meta, table, cutoff):
+    """Select ids of rows soft deleted before cutoff.
+
+    Rows still referenced from another table, live or not yet expired, are
+    left alone so removing them never breaks a foreign key.
+    """
+    (pk,) = table.primary_key.columns
+    query = sqlalchemy.select([pk]).\
+        where(table.c.deleted == sqlalchemy.true()).\
+        where(table.c.deleted_at < cutoff)
+    for child in meta.sorted_tables:
+        for fk in child.foreign_keys:
+            if fk.column.table is table:
+                query = query.where(~sqlalchemy.exists().
+                                    where(fk.parent == fk.column))
+    return query.order_by(pk)
+
+
+def _remove_deleted_rows(age_in_days, batch_size, throttle, archive):
+    engine = get_engine()
+    cutoff = timeutils.utcnow() - datetime.timedelta(days=age_in_days)
+    # The foreign keys are taken from the database, the models don't
+    # declare all of them.
+    meta = sqlalchemy.MetaData()
+    meta.reflect(bind=engine)
+    counts = {}
+
+    for table in _soft_deleted_tables(meta):
+        shadow = None
+        if archive:
+            shadow = meta.tables.get('shadow_' + table.name)
+            if shadow is None:
+                LOG.warn(_("Not archiving %s, it has no shadow table."),
+                         table.name)
+                continue
+
+        (pk,) = table.primary_key.columns
+        query = _expired_rows_query(meta, table, cutoff).limit(batch_size)
+        counts[table.name] = 0
+        while True:
+            # One transaction per batch keeps the locks short enough to run
+            # against a live database.
+            with engine.begin() as conn:
+                ids = [row[0] for row in conn.execute(query)]
+                if not ids:
+                    break
+                if shadow is not None:
+                    columns = [shadow.c[column.name]
+                               for column in table.columns]
+                    conn.execute(shadow.insert().from_select(
+                        columns,
+                        sqlalchemy.select(table.columns).
+                        where(pk.in_(ids))))
+                conn.execute(table.delete().where(pk.in_(ids)))
+            counts[table.name] += len(ids)
+            if len(ids) < batch_size:
+                break
+            if throttle:
+                time.sleep(throttle)
+
+    return counts
+
+
+@require_admin_context
+def purge_deleted_rows(context, age_in_days, batch_size=1000, throttle=0):
+    return _remove_deleted_rows(age_in_days, batch_size, throttle,
+                                archive=False)
+
+
+@require_admin_context
+def archive_deleted_rows(context, age_in_days, batch_size=1000, throttle=0):
+    return _remove_deleted_rows(age_in_days, batch_size, throttle,
+                                archive=True)
@@ -0,0 +1,59 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer
+from sqlalchemy import MetaData, String, Table, UniqueConstraint
+
+from cinder.i18n import _
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    # New table
+    rate_limit_buckets = Table(
+        'rate_limit_buckets', meta,
+        Column('created_at', DateTime(timezone=False)),
+        Column('updated_at', DateTime(timezone=False)),
+        Column('deleted_at', DateTime(timezone=False)),
+        Column('deleted', Boolean(create_constraint=True, name=None)),
+        Column('id', Integer, primary_key=True, nullable=False),
+        Column('bucket_key', String(length=255), nullable=False),
+        Column('tokens', Float, nullable=False),
+        Column('refilled_at', Float, nullable=False),
+        UniqueConstraint('bucket_key',
+                         name='uniq_rate_limit_buckets0bucket_key'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+
+    try:
+        rate_limit_buckets.create()
+    except Exception:
+        LOG.error(_("Table |%s| not created!"), repr(rate_limit_buckets))
+        raise
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    rate_limit_buckets = Table('rate_limit_buckets', meta, autoload=True)
+    try:
+        rate_limit_buckets.drop()
+    except Exception:
+        LOG.error(_("rate_limit_buckets table not dropped"))
+        raise
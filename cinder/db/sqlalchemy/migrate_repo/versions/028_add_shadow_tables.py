@@ -0,0 +1,61 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column, MetaData, Table
+
+from cinder.i18n import _
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Tables whose soft deleted rows can be archived by cinder-manage db archive
+TABLES = ['services', 'consistencygroups', 'cgsnapshots', 'volumes',
+          'volume_metadata', 'volume_admin_metadata', 'volume_types',
+          'volume_type_extra_specs', 'quality_of_service_specs',
+          'volume_glance_metadata', 'quotas', 'quota_classes',
+          'quota_usages', 'reservations', 'snapshots', 'snapshot_metadata',
+          'iscsi_targets', 'backups', 'encryption', 'transfers']
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for name in TABLES:
+        table = Table(name, meta, autoload=True)
+        # Same columns without any constraints or defaults, archived rows
+        # must not depend on anything still in the live tables.
+        columns = [Column(column.name, column.type,
+                          primary_key=column.primary_key,
+                          nullable=column.nullable)
+                   for column in table.columns]
+        shadow = Table('shadow_' + name, meta, *columns,
+                       mysql_engine='InnoDB',
+                       mysql_charset='utf8')
+        try:
+            shadow.create()
+        except Exception:
+            LOG.error(_("Table |%s| not created!"), repr(shadow))
+            raise
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for name in TABLES:
+        shadow = Table('shadow_' + name, meta, autoload=True)
+        try:
+            shadow.drop()
+        except Exception:
+            LOG.error(_("shadow_%s table not dropped"), name)
+            raise
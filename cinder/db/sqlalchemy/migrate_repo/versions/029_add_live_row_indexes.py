@@ -0,0 +1,59 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table, false
+
+from cinder.i18n import _
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# (index name, table, column) of the lookups made with read_deleted="no"
+INDEXES = [
+    ('volumes_project_id_live_idx', 'volumes', 'project_id'),
+    ('volumes_host_live_idx', 'volumes', 'host'),
+    ('snapshots_project_id_live_idx', 'snapshots', 'project_id'),
+    ('snapshots_volume_id_live_idx', 'snapshots', 'volume_id'),
+    ('backups_project_id_live_idx', 'backups', 'project_id'),
+]
+
+
+def _partial_indexes_supported(migrate_engine):
+    return migrate_engine.name == 'postgresql'
+
+
+def upgrade(migrate_engine):
+    if not _partial_indexes_supported(migrate_engine):
+        LOG.info(_('Skipped adding partial indexes on live rows, not '
+                   'supported by the %s backend.'), migrate_engine.name)
+        return
+
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for name, table_name, column in INDEXES:
+        table = Table(table_name, meta, autoload=True)
+        index = Index(name, table.c[column],
+                      postgresql_where=(table.c.deleted == false()))
+        index.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    if not _partial_indexes_supported(migrate_engine):
+        return
+
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for name, table_name, column in INDEXES:
+        table = Table(table_name, meta, autoload=True)
+        Index(name, table.c[column]).drop(migrate_engine)
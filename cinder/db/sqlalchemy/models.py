@@ -21,7 +21,7 @@ SQLAlchemy models for cinder data.
 
 from oslo.config import cfg
 from oslo.db.sqlalchemy import models
-from sqlalchemy import Column, Integer, String, Text, schema
+from sqlalchemy import Column, Float, Integer, String, Text, schema
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import ForeignKey, DateTime, Boolean
 from sqlalchemy.orm import relationship, backref, validates
@@ -524,6 +524,36 @@ class Transfer(BASE, CinderBase):
                           'Transfer.deleted == False)')
 
 
+class RateLimitBucket(BASE, CinderBase):
+    """Represents the token bucket of an API rate limit shared by workers."""
+    __tablename__ = 'rate_limit_buckets'
+    __table_args__ = (schema.UniqueConstraint(
+                      "bucket_key", name="uniq_rate_limit_buckets0bucket_key"),
+                      {'mysql_engine': 'InnoDB'})
+    id = Column(Integer, primary_key=True)
+    bucket_key = Column(String(255), nullable=False)
+    tokens = Column(Float, nullable=False)
+    refilled_at = Column(Float, nullable=False)
+
+
+class ImageVolumeCacheEntry(BASE, models.ModelBase):
+    """Represents a volume holding a cached image on a backend pool.
+
+    Entries are removed along with their volume, so they are not soft
+    deleted.
+    """
+    __tablename__ = 'image_volume_cache_entries'
+    __table_args__ = {'mysql_engine': 'InnoDB'}
+    id = Column(Integer, primary_key=True, nullable=False)
+    host = Column(String(255), index=True, nullable=False)
+    image_id = Column(String(36), index=True, nullable=False)
+    image_updated_at = Column(DateTime)
+    image_checksum = Column(String(32))
+    volume_id = Column(String(36), nullable=False)
+    size = Column(Integer, nullable=False)
+    last_used = Column(DateTime, default=lambda: timeutils.utcnow())
+
+
 def register_models():
     """Register Models and create metadata.
 
@@ -543,7 +573,9 @@ def register_models():
               VolumeTypes,
               VolumeGlanceMetadata,
               ConsistencyGroup,
-              Cgsnapshot
+              Cgsnapshot,
+              RateLimitBucket,
+              ImageVolumeCacheEntry
               )
     engine = create_engine(CONF.database.connection, echo=False)
     for model in models:
@@ -144,6 +144,11 @@ class ImageNotAuthorized(CinderException):
     message = _("Not authorized for image %(image_id)s.")
 
 
+class ImageChecksumMismatch(CinderException):
+    message = _("Downloaded data of image %(image_id)s has checksum "
+                "%(checksum)s, expected %(expected)s.")
+
+
 class DriverNotInitialized(CinderException):
     message = _("Volume driver not ready.")
 
@@ -0,0 +1,195 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of image volumes, one per image and backend pool.
+
+Creating a volume from an image that has a cache entry on the pool clones
+the cached volume instead of downloading and converting the image again.
+Cached volumes belong to the Cinder internal tenant and are evicted least
+recently used first when the cache of a pool is over its size or count
+limit.
+"""
+
+from cinder import exception
+from cinder.i18n import _
+from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
+from cinder import rpc
+
+LOG = logging.getLogger(__name__)
+
+
+class ImageVolumeCache(object):
+    def __init__(self, db, volume_api, max_cache_size_gb=0,
+                 max_cache_size_count=0):
+        self.db = db
+        self.volume_api = volume_api
+        self.max_cache_size_gb = int(max_cache_size_gb or 0)
+        self.max_cache_size_count = int(max_cache_size_count or 0)
+
+    def get_by_image_volume(self, context, volume_id):
+        return self.db.image_volume_cache_get_by_volume_id(context.elevated(),
+                                                           volume_id)
+
+    def evict(self, context, cache_entry):
+        """Remove an entry from the cache, leaving its volume alone."""
+        LOG.debug('Evicting image volume cache entry: %s.', dict(cache_entry))
+        self.db.image_volume_cache_delete(context.elevated(),
+                                          cache_entry['volume_id'])
+        self._notify_cache_eviction(context, cache_entry['image_id'],
+                                    cache_entry['host'])
+
+    def get_entry(self, context, volume_ref, image_id, image_meta):
+        """Get the cache entry to clone volume_ref from, if there is one.
+
+        An entry made from an older version of the image, or whose volume
+        is larger than volume_ref, is evicted and None is returned so the
+        new volume can take its place. Entries are made at the size of the
+        image where it is known, so they fit any volume the image fits in.
+        """
+        cache_entry = self.db.image_volume_cache_get_and_update_last_used(
+            context.elevated(), image_id, volume_ref['host'])
+
+        if cache_entry:
+            LOG.debug('Found image-volume cache entry: %s.', dict(cache_entry))
+            if self._should_update_entry(cache_entry, image_meta):
+                LOG.debug('Image %s has changed, evicting its image-volume '
+                          'cache entry.', image_id)
+                self._delete_image_volume(context, cache_entry)
+                cache_entry = None
+            elif cache_entry['size'] > volume_ref['size']:
+                # A clone can be larger than its source, never smaller.
+                LOG.debug('Image-volume cache entry of image %s is larger '
+                          'than the requested volume, replacing it.',
+                          image_id)
+                self._delete_image_volume(context, cache_entry)
+                cache_entry = None
+
+        if cache_entry:
+            self._notify_cache_hit(context, image_id, volume_ref['host'])
+        else:
+            self._notify_cache_miss(context, image_id, volume_ref['host'])
+        return cache_entry
+
+    def create_cache_entry(self, context, volume_ref, image_id, image_meta):
+        """Create a new cache entry for an image.
+
+        This assumes that the volume described by volume_ref has already been
+        created and is in an available state.
+        """
+        LOG.debug('Creating new image-volume cache entry for image '
+                  '%(image_id)s on host %(host)s.',
+                  {'image_id': image_id, 'host': volume_ref['host']})
+
+        image_updated_at = image_meta.get('updated_at')
+        if image_updated_at is not None:
+            image_updated_at = timeutils.normalize_time(image_updated_at)
+
+        cache_entry = self.db.image_volume_cache_create(
+            context.elevated(),
+            volume_ref['host'],
+            image_id,
+            image_updated_at,
+            image_meta.get('checksum'),
+            volume_ref['id'],
+            volume_ref['size'])
+
+        LOG.debug('New image-volume cache entry created: %s.',
+                  dict(cache_entry))
+        return cache_entry
+
+    def ensure_space(self, context, space_required, host):
+        """Makes room for a cache entry of space_required GB on host.
+
+        Returns True if the entry fits, evicting and deleting least
+        recently used entries when needed, or False if it can never fit.
+        """
+        if (self.max_cache_size_gb == 0 and
+                self.max_cache_size_count == 0):
+            return True
+
+        if 0 < self.max_cache_size_gb < space_required:
+            LOG.warning(_('Image-volume cache for host %(host)s does not '
+                          'have enough space (GB).'), {'host': host})
+            return False
+
+        # Most recently used first, evict from the end
+        entries = self.db.image_volume_cache_get_all_for_host(
+            context.elevated(), host)
+
+        current_count = len(entries)
+        current_size = sum(entry['size'] for entry in entries)
+
+        while entries and (
+                self._over_size(current_size + space_required) or
+                self._over_count(current_count + 1)):
+            entry = entries.pop()
+            self._delete_image_volume(context, entry)
+            current_size -= entry['size']
+            current_count -= 1
+
+        return True
+
+    def _over_size(self, size):
+        return 0 < self.max_cache_size_gb < size
+
+    def _over_count(self, count):
+        return 0 < self.max_cache_size_count < count
+
+    def _delete_image_volume(self, context, cache_entry):
+        """Delete a volume and remove the cache entry."""
+        self.evict(context, cache_entry)
+        try:
+            volume_ref = self.db.volume_get(context.elevated(),
+                                            cache_entry['volume_id'])
+        except exception.VolumeNotFound:
+            return
+        LOG.debug('Deleting image volume %s.', volume_ref['id'])
+        self.volume_api.delete(context, volume_ref, force=True)
+
+    def _should_update_entry(self, cache_entry, image_meta):
+        """Returns True if the cache entry is from an older image version."""
+        checksum = image_meta.get('checksum')
+        if (checksum and cache_entry['image_checksum'] and
+                checksum != cache_entry['image_checksum']):
+            return True
+
+        image_updated_at = image_meta.get('updated_at')
+        if image_updated_at is None:
+            return False
+        if cache_entry['image_updated_at'] is None:
+            return True
+        # The database drops time zones and sub-second precision.
+        image_updated_at = timeutils.normalize_time(
+            image_updated_at).replace(microsecond=0)
+        entry_updated_at = cache_entry['image_updated_at'].replace(
+            microsecond=0)
+        return image_updated_at > entry_updated_at
+
+    def _notify_cache_hit(self, context, image_id, host):
+        self._notify_cache_action(context, image_id, host, 'hit')
+
+    def _notify_cache_miss(self, context, image_id, host):
+        self._notify_cache_action(context, image_id, host, 'miss')
+
+    def _notify_cache_eviction(self, context, image_id, host):
+        self._notify_cache_action(context, image_id, host, 'evict')
+
+    def _notify_cache_action(self, context, image_id, host, action):
+        data = {
+            'image_id': image_id,
+            'host': host,
+        }
+        LOG.debug('ImageVolumeCache notification: action=%(action)s'
+                  ' data=%(data)s.', {'action': action, 'data': data})
+        rpc.get_notifier('volume', host).info(
+            context, 'image_volume_cache.%s' % action, data)
@@ -19,13 +19,20 @@
 
 from __future__ import absolute_import
 
+import collections
 import copy
+import hashlib
 import itertools
+import os
 import random
 import shutil
+import stat
 import sys
 import time
 
+from eventlet import event
+from eventlet import greenpool
+from eventlet import tpool
 import glanceclient.exc
 from oslo.config import cfg
 import six.moves.urllib.parse as urlparse
@@ -35,6 +42,7 @@ from cinder.i18n import _
 from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
+from cinder.openstack.common import units
 
 glance_opts = [
     cfg.ListOpt('allowed_direct_url_schemes',
@@ -42,6 +50,34 @@ glance_opts = [
                 help='A list of url schemes that can be downloaded directly '
                      'via the direct_url.  Currently supported schemes: '
                      '[file].'),
+    cfg.IntOpt('glance_download_parallelism',
+               default=1,
+               help='Number of ranges of an image downloaded at the same '
+                    'time, using HTTP Range requests to Glance or parallel '
+                    'reads of a file:// direct URL. Only used when the '
+                    'image is written to a regular file or block device. '
+                    '1 downloads images as a single stream.'),
+    cfg.IntOpt('glance_download_chunk_size_mb',
+               default=64,
+               help='Size in MB of each range of a parallel image '
+                    'download.'),
+    cfg.IntOpt('glance_client_pool_size',
+               default=64,
+               help='Number of Glance clients kept open for reuse, one '
+                    'per API server, API version and auth token.'),
+    cfg.IntOpt('glance_api_server_down_time',
+               default=60,
+               help='Seconds an API server from glance_api_servers that '
+                    'could not be reached is left out of the round robin, '
+                    'unless all of them are down.'),
+    cfg.IntOpt('glance_image_cache_ttl',
+               default=5,
+               help='Seconds image metadata fetched from Glance is reused '
+                    'for later requests that can see the image. 0 disables '
+                    'the cache.'),
+    cfg.IntOpt('glance_image_cache_size',
+               default=256,
+               help='Maximum number of images whose metadata is cached.'),
 ]
 glance_core_properties = [
     cfg.ListOpt('glance_core_properties',
@@ -114,6 +150,153 @@ def get_api_servers():
     return itertools.cycle(api_servers)
 
 
+class GlanceClientPool(object):
+    """Glance clients kept open for reuse, and health of the API servers.
+
+    Clients are kept per API server, API version and auth token, so the
+    calls made for one request share a client and its keep-alive
+    connections. API servers that could not be reached are skipped by the
+    round robin for glance_api_server_down_time seconds.
+    """
+
+    def __init__(self):
+        self._clients = collections.OrderedDict()
+        self._api_servers = None
+        self._down_until = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def next_server(self):
+        """Returns the next (netloc, use_ssl) of the round robin that is up.
+
+        If every server is down the next one is returned anyway.
+        """
+        if self._api_servers is None:
+            self._api_servers = get_api_servers()
+        now = time.time()
+        for _i in xrange(len(CONF.glance_api_servers)):
+            server = self._api_servers.next()
+            if self._down_until.get(server, 0) <= now:
+                return server
+        return self._api_servers.next()
+
+    def has_server_up(self):
+        now = time.time()
+        down = sum(1 for until in self._down_until.values() if until > now)
+        return down < len(CONF.glance_api_servers)
+
+    def mark_down(self, server):
+        self._down_until[server] = (time.time() +
+                                    CONF.glance_api_server_down_time)
+        # Connections to the server may be broken, do not reuse them.
+        for key in [key for key in self._clients if key[:2] == server]:
+            del self._clients[key]
+
+    def mark_up(self, server):
+        self._down_until.pop(server, None)
+
+    def get_client(self, context, server, version):
+        token = None
+        if CONF.auth_strategy == 'keystone':
+            token = getattr(context, 'auth_token', None)
+        key = server + (version, token)
+        client = self._clients.pop(key, None)
+        if client is None:
+            self.misses += 1
+            client = _create_glance_client(context, server[0], server[1],
+                                           version)
+        else:
+            self.hits += 1
+        self._clients[key] = client
+        while len(self._clients) > CONF.glance_client_pool_size:
+            self._clients.popitem(last=False)
+            self.evictions += 1
+        return client
+
+    def stats(self):
+        """Returns counters of the pool, for monitoring."""
+        now = time.time()
+        return {'clients': len(self._clients),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'servers_down': sorted(netloc for (netloc, use_ssl), until
+                                       in self._down_until.items()
+                                       if until > now)}
+
+
+_client_pool = GlanceClientPool()
+
+
+def get_client_pool_stats():
+    """Returns the counters of the shared Glance client pool."""
+    return _client_pool.stats()
+
+
+class ImageMetadataCache(object):
+    """Image metadata fetched from Glance, reused for a few seconds.
+
+    Lookups of an image that is already being fetched wait for that fetch
+    instead of making their own, so creating many volumes from one image
+    at once costs a single Glance call. A cached image is only returned if
+    the visible check passes for the caller, otherwise it is fetched again
+    with the caller's credentials.
+    """
+
+    def __init__(self):
+        self._images = collections.OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fetch, visible):
+        ttl = CONF.glance_image_cache_ttl
+        if ttl <= 0:
+            return fetch()
+
+        entry = self._images.pop(key, None)
+        if entry is not None and entry[0] > time.time():
+            self._images[key] = entry
+            if visible(entry[1]):
+                self.hits += 1
+                return entry[1]
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            image = pending.wait()
+            if image is not None and visible(image):
+                self.hits += 1
+                return image
+
+        self.misses += 1
+        done = event.Event()
+        self._pending[key] = done
+        image = None
+        try:
+            image = fetch()
+        finally:
+            if self._pending.get(key) is done:
+                del self._pending[key]
+            # Waiters fetch the image themselves if this fetch failed.
+            done.send(image)
+        self._images.pop(key, None)
+        self._images[key] = (time.time() + ttl, image)
+        while len(self._images) > CONF.glance_image_cache_size:
+            self._images.popitem(last=False)
+        return image
+
+    def invalidate(self, image_id):
+        for key in [key for key in self._images if key[-1] == image_id]:
+            del self._images[key]
+
+    def clear(self):
+        self._images.clear()
+
+
+_image_cache = ImageMetadataCache()
+
+
 class GlanceClientWrapper(object):
     """Glance client wrapper class that implements retries."""
 
@@ -125,7 +308,6 @@ class GlanceClientWrapper(object):
                                                      use_ssl, version)
         else:
             self.client = None
-        self.api_servers = None
         self.version = version
 
     def _create_static_client(self, context, netloc, use_ssl, version):
@@ -137,15 +319,6 @@ class GlanceClientWrapper(object):
                                      self.netloc,
                                      self.use_ssl, self.version)
 
-    def _create_onetime_client(self, context, version):
-        """Create a client that will be used for one call."""
-        if self.api_servers is None:
-            self.api_servers = get_api_servers()
-        self.netloc, self.use_ssl = self.api_servers.next()
-        return _create_glance_client(context,
-                                     self.netloc,
-                                     self.use_ssl, version)
-
     def call(self, context, method, *args, **kwargs):
         """Call a glance client method.
 
@@ -156,18 +329,54 @@ class GlanceClientWrapper(object):
         if version in kwargs:
             version = kwargs['version']
 
+        def _call(client):
+            return getattr(client.images, method)(*args, **kwargs)
+
+        return self._call_with_retries(context, method, version, _call)
+
+    def data_range(self, context, image_id, offset, length):
+        """Get length bytes of image data starting at offset.
+
+        Returns a (status, chunks) tuple. The status is 206 if Glance sent
+        only the requested range and 200 if it ignored the Range header and
+        sent the whole image.
+        """
+        version = self.version or CONF.glance_api_version
+        if int(version) == 1:
+            url = '/v1/images/%s' % urlparse.quote(str(image_id))
+        else:
+            url = '/v2/images/%s/file' % urlparse.quote(str(image_id))
+        headers = {'Range': 'bytes=%d-%d' % (offset, offset + length - 1)}
+
+        def _call(client):
+            resp, body = client.http_client.get(url, headers=headers)
+            return resp.status_code, body
+
+        return self._call_with_retries(context, 'data', version, _call)
+
+    def _call_with_retries(self, context, method, version, fn):
         retry_excs = (glanceclient.exc.ServiceUnavailable,
                       glanceclient.exc.InvalidEndpoint,
                       glanceclient.exc.CommunicationError)
         num_attempts = 1 + CONF.glance_num_retries
 
         for attempt in xrange(1, num_attempts + 1):
-            client = self.client or self._create_onetime_client(context,
-                                                                version)
+            if self.client:
+                server = None
+                client = self.client
+                netloc = self.netloc
+            else:
+                server = _client_pool.next_server()
+                client = _client_pool.get_client(context, server, version)
+                netloc = server[0]
             try:
-                return getattr(client.images, method)(*args, **kwargs)
+                result = fn(client)
+                if server:
+                    _client_pool.mark_up(server)
+                return result
             except retry_excs as e:
-                netloc = self.netloc
+                if server:
+                    _client_pool.mark_down(server)
                 extra = "retrying"
                 error_msg = _("Error contacting glance server "
                               "'%(netloc)s' for '%(method)s', "
@@ -186,7 +395,10 @@ class GlanceClientWrapper(object):
                     LOG.exception(error_msg)
                     raise exception.GlanceConnectionFailed(reason=e)
                 LOG.exception(error_msg)
-                time.sleep(1)
+                # Go straight to the next server of the round robin if
+                # there is one up, otherwise give them time to recover.
+                if not server or not _client_pool.has_server_up():
+                    time.sleep(1)
 
 
 class GlanceImageService(object):
@@ -228,7 +440,7 @@ class GlanceImageService(object):
     def show(self, context, image_id):
         """Returns a dict with image data for the given opaque image id."""
         try:
-            image = self._client.call(context, 'get', image_id)
+            image = self._get_image(context, self._client, image_id)
         except Exception:
             _reraise_translated_image_exception(image_id)
 
@@ -248,7 +460,7 @@ class GlanceImageService(object):
         try:
             # direct_url is returned by v2 api
             client = GlanceClientWrapper(version=2)
-            image_meta = client.call(context, 'get', image_id)
+            image_meta = self._get_image(context, client, image_id)
         except Exception:
             _reraise_translated_image_exception(image_id)
 
@@ -263,10 +475,15 @@ class GlanceImageService(object):
 
     def download(self, context, image_id, data=None):
         """Calls out to Glance for data and writes data."""
+        parallel = _is_positional_target(data)
         if 'file' in CONF.allowed_direct_url_schemes:
-            location = self.get_location(context, image_id)
-            o = urlparse.urlparse(location)
+            direct_url, locations = self.get_location(context, image_id)
+            o = urlparse.urlparse(direct_url or '')
             if o.scheme == "file":
+                if parallel:
+                    image_meta = self.show(context, image_id)
+                    if self._copy_file_ranges(o.path, image_meta, data):
+                        return
                 with open(o.path, "r") as f:
                     # a system call to cp could have significant performance
                     # advantages, however we do not have the path to files at
@@ -274,6 +491,11 @@ class GlanceImageService(object):
                     shutil.copyfileobj(f, data)
                 return
 
+        if parallel:
+            image_meta = self.show(context, image_id)
+            if self._download_ranges(context, image_id, image_meta, data):
+                return
+
         try:
             image_chunks = self._client.call(context, 'data', image_id)
         except Exception:
@@ -285,6 +507,77 @@ class GlanceImageService(object):
             for chunk in image_chunks:
                 data.write(chunk)
 
+    def _download_ranges(self, context, image_id, image_meta, data):
+        """Download the image into data with parallel Range requests.
+
+        The first range is fetched on its own to find out whether Glance
+        honours Range requests; if it sends the whole image instead, that
+        response is written out sequentially. Returns False if the image is
+        too small to be split, leaving the download to the caller.
+        """
+        ranges = _split_ranges(image_meta.get('size'))
+        if not ranges:
+            return False
+
+        offset, length = ranges[0]
+        try:
+            status, chunks = self._client.data_range(context, image_id,
+                                                     offset, length)
+        except Exception:
+            _reraise_translated_image_exception(image_id)
+
+        if status != 206:
+            LOG.debug('Glance ignored the Range request for image %s, '
+                      'downloading it as a single stream.', image_id)
+            checksum = hashlib.md5()
+            for chunk in chunks:
+                checksum.update(chunk)
+                data.write(chunk)
+            _verify_checksum(image_id, image_meta, checksum.hexdigest())
+            return True
+
+        data.flush()
+        path = data.name
+        _write_range(path, offset, length, chunks)
+
+        def _fetch(offset, length):
+            try:
+                status, chunks = self._client.data_range(context, image_id,
+                                                         offset, length)
+            except Exception:
+                _reraise_translated_image_exception(image_id)
+            if status != 206:
+                raise exception.GlanceConnectionFailed(
+                    reason=_('Range request for bytes %(offset)d-%(end)d of '
+                             'image %(image_id)s returned status %(status)s.')
+                    % {'offset': offset, 'end': offset + length - 1,
+                       'image_id': image_id, 'status': status})
+            _write_range(path, offset, length, chunks)
+
+        _run_in_parallel(_fetch, ranges[1:])
+        _verify_checksum(image_id, image_meta, _file_checksum(path))
+        return True
+
+    def _copy_file_ranges(self, src_path, image_meta, data):
+        """Copy a file:// image into data with parallel positional reads.
+
+        The reads and writes block, so each range is copied by a native
+        thread. Returns False if the image is too small to be split.
+        """
+        ranges = _split_ranges(image_meta.get('size'))
+        if not ranges:
+            return False
+
+        data.flush()
+        path = data.name
+
+        def _copy(offset, length):
+            tpool.execute(_copy_range, src_path, path, offset, length)
+
+        _run_in_parallel(_copy, ranges)
+        _verify_checksum(image_meta['id'], image_meta, _file_checksum(path))
+        return True
+
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
         sent_service_image_meta = self._translate_to_glance(image_meta)
@@ -309,6 +602,7 @@ class GlanceImageService(object):
         image_meta.pop('id', None)
         if data:
             image_meta['data'] = data
+        _image_cache.invalidate(image_id)
         try:
             #NOTE(dosaboy): the v2 api separates update from upload
             if data and CONF.glance_api_version > 1:
@@ -322,6 +616,23 @@ class GlanceImageService(object):
         else:
             return self._translate_from_glance(image_meta)
 
+    def add_location(self, context, image_id, url, metadata):
+        """Add url as a location Glance serves the image data from.
+
+        With API v1 the image must still be queued.
+        """
+        _image_cache.invalidate(image_id)
+        try:
+            if CONF.glance_api_version == 1:
+                image = self._client.call(context, 'update', image_id,
+                                          location=url)
+            else:
+                image = self._client.call(context, 'add_location', image_id,
+                                          url, metadata)
+        except Exception:
+            _reraise_translated_image_exception(image_id)
+        return self._translate_from_glance(image)
+
     def delete(self, context, image_id):
         """Delete the given image.
 
@@ -329,12 +640,23 @@ class GlanceImageService(object):
         :raises: NotAuthorized if the user is not an owner.
 
         """
+        _image_cache.invalidate(image_id)
         try:
             self._client.call(context, 'delete', image_id)
         except glanceclient.exc.NotFound:
             raise exception.ImageNotFound(image_id=image_id)
         return True
 
+    @staticmethod
+    def _get_image(context, client, image_id):
+        """Gets an image through the image metadata cache."""
+        version = int(client.version or CONF.glance_api_version)
+        netloc = client.netloc if client.client else None
+        return _image_cache.get(
+            (netloc, version, image_id),
+            lambda: client.call(context, 'get', image_id),
+            lambda image: _is_image_visible(context, image, version))
+
     @staticmethod
     def _translate_to_glance(image_meta):
         image_meta = _convert_to_string(image_meta)
@@ -379,6 +701,26 @@ class GlanceImageService(object):
         return str(user_id) == str(context.user_id)
 
 
+def _is_image_visible(context, image, version):
+    """Whether Glance would show image to context without asking it.
+
+    Unlike _is_image_available this does not trust any auth token, it is
+    used to decide whether an image fetched for another request may be
+    handed to this one.
+    """
+    if context.is_admin:
+        return True
+    # v1 images fetch themselves again on access to a missing attribute.
+    if version == 1:
+        public = image.is_public
+    else:
+        public = getattr(image, 'visibility', None) == 'public'
+    if public:
+        return True
+    owner = getattr(image, 'owner', None)
+    return owner is not None and str(owner) == str(context.project_id)
+
+
 def _convert_timestamps_to_datetimes(image_meta):
     """Returns image with timestamp fields converted to datetime objects."""
     for attr in ['created_at', 'updated_at', 'deleted_at']:
@@ -457,6 +799,109 @@ def _remove_read_only(image_meta):
     return output
 
 
+def _is_positional_target(data):
+    """Returns True if data is an open regular file or block device.
+
+    Parallel downloads write each range through its own descriptor, so
+    they need a destination that can be reopened by name.
+    """
+    if CONF.glance_download_parallelism <= 1:
+        return False
+    path = getattr(data, 'name', None)
+    if not isinstance(path, basestring) or not hasattr(data, 'flush'):
+        return False
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return False
+    return stat.S_ISREG(mode) or stat.S_ISBLK(mode)
+
+
+def _split_ranges(size):
+    """Split size bytes into (offset, length) ranges of the chunk size.
+
+    Returns an empty list if the size is unknown or fits in one range.
+    """
+    chunk_size = CONF.glance_download_chunk_size_mb * units.Mi
+    if not size or chunk_size <= 0 or size <= chunk_size:
+        return []
+    return [(offset, min(chunk_size, size - offset))
+            for offset in xrange(0, size, chunk_size)]
+
+
+def _run_in_parallel(fn, ranges):
+    """Call fn(offset, length) for each range in a pool of green threads.
+
+    The first failure is raised once the running calls have finished.
+    """
+    pool = greenpool.GreenPool(CONF.glance_download_parallelism)
+    threads = [pool.spawn(fn, offset, length) for offset, length in ranges]
+    pool.waitall()
+    for thread in threads:
+        thread.wait()
+
+
+def _write_all(fd, chunk):
+    while chunk:
+        written = os.write(fd, chunk)
+        chunk = chunk[written:]
+
+
+def _write_range(path, offset, length, chunks):
+    """Write the chunks of one range at offset through a new descriptor."""
+    received = 0
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        os.lseek(fd, offset, os.SEEK_SET)
+        for chunk in chunks:
+            received += len(chunk)
+            if received > length:
+                break
+            _write_all(fd, chunk)
+    finally:
+        os.close(fd)
+    if received != length:
+        raise exception.GlanceConnectionFailed(
+            reason=_('Received %(received)d bytes for a range of %(length)d '
+                     'bytes at offset %(offset)d.')
+            % {'received': received, 'length': length, 'offset': offset})
+
+
+def _copy_range(src_path, dest_path, offset, length):
+    src = os.open(src_path, os.O_RDONLY)
+    try:
+        os.lseek(src, offset, os.SEEK_SET)
+
+        def _chunks():
+            remaining = length
+            while remaining:
+                chunk = os.read(src, min(remaining, units.Mi))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+        _write_range(dest_path, offset, length, _chunks())
+    finally:
+        os.close(src)
+
+
+def _file_checksum(path):
+    checksum = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(units.Mi), ''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _verify_checksum(image_id, image_meta, checksum):
+    expected = image_meta.get('checksum')
+    if expected and expected != checksum:
+        raise exception.ImageChecksumMismatch(image_id=image_id,
+                                              checksum=checksum,
+                                              expected=expected)
+
+
 def _reraise_translated_image_exception(image_id):
     """Transform the exception for the image but keep its traceback intact."""
     exc_type, exc_value, exc_trace = sys.exc_info()
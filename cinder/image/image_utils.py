@@ -24,18 +24,24 @@ we should look at maybe pushing this up to Oslo
 """
 
 
+import collections
 import contextlib
+import errno
+import mmap
 import os
 import tempfile
 
+from eventlet import event
 from oslo.config import cfg
 
 from cinder import exception
 from cinder.i18n import _
+from cinder.image import qcow2
 from cinder.openstack.common import fileutils
 from cinder.openstack.common import imageutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import processutils
+from cinder.openstack.common import strutils
 from cinder.openstack.common import timeutils
 from cinder.openstack.common import units
 from cinder import utils
@@ -46,11 +52,56 @@ LOG = logging.getLogger(__name__)
 image_helper_opt = [cfg.StrOpt('image_conversion_dir',
                                default='$state_path/conversion',
                                help='Directory used for temporary storage '
-                                    'during image conversion'), ]
+                                    'during image conversion'),
+                    cfg.BoolOpt('image_upload_stream_qcow2',
+                                default=False,
+                                help='Upload raw volumes as qcow2 images '
+                                     'by encoding them as they are sent, '
+                                     'leaving out zero clusters, instead '
+                                     'of converting them with qemu-img '
+                                     'into image_conversion_dir first'),
+                    cfg.IntOpt('image_conversion_concurrency',
+                               default=0,
+                               help='Maximum number of images staged in '
+                                    'image_conversion_dir and converted '
+                                    'with qemu-img at the same time by '
+                                    'each service process, further ones '
+                                    'wait their turn. Each backend of '
+                                    'cinder-volume runs in its own '
+                                    'process and has its own limit. 0 '
+                                    'means no limit'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_helper_opt)
 
+# Signatures of the image formats qemu-img knows, as (offset, magic).  An
+# image claiming to be raw that starts with one of these is not written
+# straight to a volume.
+IMAGE_FORMAT_SIGNATURES = {
+    'qcow': [(0, 'QFI\xfb')],
+    'qed': [(0, 'QED\x00')],
+    'vmdk': [(0, 'KDMV'), (0, 'COWD'), (0, '# Disk DescriptorFile')],
+    'vdi': [(0x40, '\x7f\x10\xda\xbe')],
+    'vhd': [(0, 'conectix')],
+    'vhdx': [(0, 'vhdxfile')],
+    'luks': [(0, 'LUKS\xba\xbe')],
+    'parallels': [(0, 'WithoutFreeSpace'), (0, 'WithouFreSpacExt')],
+    'bochs': [(0, 'Bochs Virtual HD Image')],
+    'cloop': [(0, '#!/bin/sh\n#V2.0 Format')],
+    'dmg': [(0, 'koly')],
+}
+
+# Bytes of an image looked at by detect_image_format
+IMAGE_HEADER_SIZE = 512
+
+# Set once qemu-img has been found to work, it is not probed again.
+_qemu_img_installed = False
+
+# qemu-img info of downloaded images by (image_id, checksum), least
+# recently used first.
+_image_info_cache = collections.OrderedDict()
+IMAGE_INFO_CACHE_SIZE = 64
+
 
 def qemu_img_info(path):
     """Return an object containing the parsed output from qemu-img info."""
@@ -61,6 +112,175 @@ def qemu_img_info(path):
     return imageutils.QemuImgInfo(out)
 
 
+def check_qemu_img_installed(path):
+    """Returns True if 'qemu-img info' works, probing it with path.
+
+    A successful probe is remembered for the life of the process. A failed
+    one is repeated on the next call, so qemu-img can be installed without
+    restarting the service.
+    """
+    global _qemu_img_installed
+    if not _qemu_img_installed:
+        try:
+            qemu_img_info(path)
+        except processutils.ProcessExecutionError:
+            return False
+        _qemu_img_installed = True
+    return True
+
+
+def downloaded_image_info(image_id, image_meta, path):
+    """qemu_img_info of the image downloaded to path.
+
+    Images with a checksum have the same content, and so the same info,
+    every time they are downloaded, so the info is cached by image id and
+    checksum.
+    """
+    checksum = image_meta.get('checksum') if image_meta else None
+    if not checksum:
+        return qemu_img_info(path)
+
+    key = (image_id, checksum)
+    info = _image_info_cache.pop(key, None)
+    if info is None:
+        info = qemu_img_info(path)
+    _image_info_cache[key] = info
+    while len(_image_info_cache) > IMAGE_INFO_CACHE_SIZE:
+        _image_info_cache.popitem(last=False)
+    return info
+
+
+class Conversion(object):
+    """A conversion waiting for or admitted by ConversionScheduler.
+
+    path is the scratch file of the conversion, once it is known.
+    """
+
+    def __init__(self, scratch_size, path=None):
+        self.scratch_size = scratch_size
+        self.path = path
+        self._admitted = event.Event()
+
+    def unwritten(self):
+        """Scratch space the conversion has claimed but not used yet."""
+        written = 0
+        if self.path:
+            try:
+                written = os.path.getsize(self.path)
+            except OSError:
+                pass
+        return max(self.scratch_size - written, 0)
+
+
+class ConversionScheduler(object):
+    """Admission control for work using image_conversion_dir.
+
+    A conversion is admitted when fewer than image_conversion_concurrency
+    are running and the free space of image_conversion_dir, less the space
+    running conversions have claimed but not written yet, fits the scratch
+    space it needs. Conversions that cannot start wait in arrival order. A
+    conversion that is the only one left is always admitted, so an image
+    too large for the directory fails as it did before instead of waiting
+    forever.
+
+    The scheduler only knows the conversions of its own process. Services
+    sharing image_conversion_dir, such as the per-backend processes of
+    cinder-volume, are limited separately and only see each other's work
+    through the free space of the directory.
+    """
+
+    def __init__(self):
+        self._queue = collections.deque()
+        self._running = []
+        self.admitted = 0
+        self.waited = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _free_space(self):
+        if not hasattr(os, 'statvfs'):
+            return None
+        st = os.statvfs(CONF.image_conversion_dir or tempfile.gettempdir())
+        return st.f_bavail * st.f_frsize
+
+    def _can_start(self, conversion):
+        if not self._running:
+            return True
+        limit = CONF.image_conversion_concurrency
+        if limit and len(self._running) >= limit:
+            return False
+        free = self._free_space()
+        if free is None:
+            return True
+        claimed = sum(running.unwritten() for running in self._running)
+        return free - claimed >= conversion.scratch_size
+
+    def _start(self, conversion):
+        self._running.append(conversion)
+        self.admitted += 1
+
+    def _finish(self, conversion):
+        self._running.remove(conversion)
+        while self._queue and self._can_start(self._queue[0]):
+            waiter = self._queue.popleft()
+            self._start(waiter)
+            waiter._admitted.send()
+
+    @contextlib.contextmanager
+    def admit(self, scratch_size, path=None):
+        """Runs the body once scratch_size bytes of scratch space are free.
+
+        Yields the Conversion, whose path can be set once the scratch file
+        is created.
+        """
+        conversion = Conversion(scratch_size, path)
+        if not self._queue and self._can_start(conversion):
+            self._start(conversion)
+        else:
+            self._queue.append(conversion)
+            LOG.debug("Waiting to start image conversion, %(running)d "
+                      "running and %(queued)d queued." %
+                      {'running': len(self._running),
+                       'queued': len(self._queue)})
+            start_time = timeutils.utcnow()
+            try:
+                conversion._admitted.wait()
+            except BaseException:
+                if conversion in self._queue:
+                    self._queue.remove(conversion)
+                else:
+                    self._finish(conversion)
+                raise
+            wait_time = timeutils.delta_seconds(start_time,
+                                                timeutils.utcnow())
+            self.waited += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        try:
+            yield conversion
+        finally:
+            self._finish(conversion)
+
+    def stats(self):
+        """Returns the queue depth and counters, for monitoring."""
+        return {'running': len(self._running),
+                'queued': len(self._queue),
+                'reserved_bytes': sum(conversion.scratch_size
+                                      for conversion in self._running),
+                'admitted': self.admitted,
+                'waited': self.waited,
+                'total_wait_time': self.total_wait_time,
+                'max_wait_time': self.max_wait_time}
+
+
+_conversion_scheduler = ConversionScheduler()
+
+
+def get_conversion_stats():
+    """Returns the counters of the image conversion scheduler."""
+    return _conversion_scheduler.stats()
+
+
 def convert_image(source, dest, out_format, bps_limit=None):
     """Convert image to other format."""
 
@@ -141,6 +361,216 @@ def fetch(context, image_service, image_id, path, _user_id, _project_id):
     LOG.info(msg % {"sz": fsz_mb, "mbps": mbps})
 
 
+def detect_image_format(header):
+    """Return the format whose signature header starts with, or None."""
+    for fmt, signatures in IMAGE_FORMAT_SIGNATURES.items():
+        for offset, magic in signatures:
+            if header[offset:offset + len(magic)] == magic:
+                return fmt
+    return None
+
+
+class ImageFormatMismatch(Exception):
+    """The data of an image does not match its disk format."""
+
+    def __init__(self, fmt):
+        super(ImageFormatMismatch, self).__init__(fmt)
+        self.fmt = fmt
+
+
+class RawImageWriter(object):
+    """File-like object writing a raw image straight to a volume.
+
+    Data is staged in a page aligned buffer and written to the volume in
+    whole buffers, so the volume can be opened with O_DIRECT and the image,
+    short of its tail, does not go through the page cache.  Nothing is
+    written before the first IMAGE_HEADER_SIZE bytes are checked for the
+    signature of another image format, ImageFormatMismatch is raised if
+    one is found.
+
+    With sparse, buffers holding only zeros are skipped over instead of
+    written, for volumes known to read back as zeros.
+    """
+
+    def __init__(self, path, bufsize, sparse=False):
+        self.path = path
+        self.sparse = sparse
+        # O_DIRECT needs the memory, offset and length of every write
+        # aligned to the logical block size of the device, a multiple of
+        # the page size covers them all.
+        self.bufsize = max(mmap.PAGESIZE,
+                           bufsize - bufsize % mmap.PAGESIZE)
+        self.bytes_written = 0
+        self.bytes_skipped = 0
+        self._buf = mmap.mmap(-1, self.bufsize)
+        self._zeros = '\0' * self.bufsize if sparse else None
+        self._used = 0
+        self._checked = False
+        self._fd = None
+        self.direct = False
+
+    def write(self, data):
+        while data:
+            count = min(len(data), self.bufsize - self._used)
+            self._buf[self._used:self._used + count] = data[:count]
+            self._used += count
+            data = data[count:]
+            if not self._checked and self._used >= IMAGE_HEADER_SIZE:
+                self._check_header()
+            if self._used == self.bufsize:
+                self._flush(self.bufsize)
+
+    def close(self):
+        """Write what is left and sync."""
+        try:
+            if not self._checked:
+                self._check_header()
+            if self._used:
+                if self._fd is None:
+                    self._open()
+                if self.direct:
+                    self._write_tail()
+                else:
+                    self._flush(self._used, sparse=False)
+            if self._fd is not None and not self.direct:
+                os.fsync(self._fd)
+        finally:
+            self.abort()
+
+    def _write_tail(self):
+        """Write the rest of the buffer without O_DIRECT.
+
+        An O_DIRECT write has to cover whole logical blocks, which can be
+        larger than the tail of the image, and padding the tail to one can
+        run past the end of the volume.
+        """
+        offset = os.lseek(self._fd, 0, os.SEEK_CUR)
+        fd = os.open(self.path, os.O_WRONLY)
+        try:
+            os.lseek(fd, offset, os.SEEK_SET)
+            self._write(fd, self._used)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._used = 0
+
+    def abort(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+
+    def _check_header(self):
+        fmt = detect_image_format(self._buf[:IMAGE_HEADER_SIZE])
+        if fmt is not None:
+            raise ImageFormatMismatch(fmt)
+        self._checked = True
+
+    def _open(self):
+        flags = os.O_WRONLY
+        o_direct = getattr(os, 'O_DIRECT', 0)
+        if o_direct:
+            try:
+                self._fd = os.open(self.path, flags | o_direct)
+                self.direct = True
+                return
+            except OSError as ex:
+                if ex.errno != errno.EINVAL:
+                    raise
+        self._fd = os.open(self.path, flags)
+
+    def _flush(self, length, sparse=None):
+        if self._fd is None:
+            self._open()
+        if sparse is None:
+            sparse = self.sparse
+        if sparse and self._buf[:length] == self._zeros[:length]:
+            os.lseek(self._fd, length, os.SEEK_CUR)
+            self.bytes_skipped += length
+            self._used = 0
+            return
+        self._write(self._fd, length)
+        self._used = 0
+
+    def _write(self, fd, length):
+        written = os.write(fd, buffer(self._buf, 0, length))
+        if written != length:
+            raise IOError(_("Short write to %(path)s: %(written)d of "
+                            "%(length)d bytes") %
+                          {'path': self.path, 'written': written,
+                           'length': length})
+        self.bytes_written += length
+
+
+def _can_stream_raw_image(image_meta, dest, volume_format):
+    """Whether the image can be written straight to dest, unconverted."""
+    return (volume_format == 'raw' and image_meta and
+            image_meta.get('disk_format') == 'raw' and
+            image_meta.get('container_format') in (None, 'bare') and
+            # The size is checked against the volume before anything is
+            # written, leave images of unknown size to qemu-img.
+            image_meta.get('size') is not None and
+            # The bandwidth limit is enforced with a cgroup on the process
+            # doing the copy, keep using qemu-img when one is set.
+            not CONF.volume_copy_bps_limit and
+            utils.is_blk_device(dest))
+
+
+def _stream_raw_image(context, image_service, image_id, image_meta, dest,
+                      blocksize, size=None, sparse=False):
+    """Download a raw image straight to the volume at dest.
+
+    Returns False, having written nothing to dest, if the image data is
+    not raw after all.
+    """
+    if size is not None and image_meta['size'] > size * units.Gi:
+        params = {'image_size': image_meta['size'] / units.Gi,
+                  'volume_size': size}
+        reason = _("Size is %(image_size)dGB and doesn't fit in a "
+                   "volume of size %(volume_size)dGB.") % params
+        raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+
+    try:
+        bufsize = strutils.string_to_bytes('%sB' % blocksize,
+                                           return_int=True)
+    except ValueError:
+        bufsize = units.Mi
+
+    start_time = timeutils.utcnow()
+    writer = RawImageWriter(dest, bufsize, sparse)
+    try:
+        if os.access(dest, os.W_OK):
+            image_service.download(context, image_id, writer)
+            writer.close()
+        else:
+            with utils.temporary_chown(dest):
+                image_service.download(context, image_id, writer)
+                writer.close()
+    except ImageFormatMismatch as ex:
+        LOG.warn(_("Image %(image_id)s is stored as raw but its data "
+                   "looks like %(fmt)s, not writing it directly to the "
+                   "volume.") % {'image_id': image_id, 'fmt': ex.fmt})
+        return False
+    finally:
+        writer.abort()
+
+    duration = max(timeutils.delta_seconds(start_time, timeutils.utcnow()),
+                   1)
+    fsz_mb = float(writer.bytes_written + writer.bytes_skipped) / units.Mi
+    LOG.debug("Image fetch details: dest %(dest)s, size %(sz).2f MB, "
+              "written %(written).2f MB, skipped %(skipped).2f MB, "
+              "duration %(duration).2f sec, direct %(direct)s" %
+              {"dest": dest, "sz": fsz_mb,
+               "written": float(writer.bytes_written) / units.Mi,
+               "skipped": float(writer.bytes_skipped) / units.Mi,
+               "duration": duration, "direct": writer.direct})
+    msg = _("Image download %(sz).2f MB at %(mbps).2f MB/s")
+    LOG.info(msg % {"sz": fsz_mb, "mbps": fsz_mb / duration})
+    return True
+
+
 def fetch_verify_image(context, image_service, image_id, dest,
                        user_id=None, project_id=None, size=None):
     fetch(context, image_service, image_id, dest,
@@ -180,14 +610,20 @@ def fetch_to_vhd(context, image_service,
 
 def fetch_to_raw(context, image_service,
                  image_id, dest, blocksize,
-                 user_id=None, project_id=None, size=None):
+                 user_id=None, project_id=None, size=None, sparse=False):
     fetch_to_volume_format(context, image_service, image_id, dest, 'raw',
-                           blocksize, user_id, project_id, size)
+                           blocksize, user_id, project_id, size, sparse)
 
 
 def fetch_to_volume_format(context, image_service,
                            image_id, dest, volume_format, blocksize,
-                           user_id=None, project_id=None, size=None):
+                           user_id=None, project_id=None, size=None,
+                           sparse=False):
+    """Write the image to dest in volume_format.
+
+    Pass sparse if dest reads back as zeros, zeros in the image are then
+    skipped instead of written to it.
+    """
     if (CONF.image_conversion_dir and not
             os.path.exists(CONF.image_conversion_dir)):
         os.makedirs(CONF.image_conversion_dir)
@@ -195,21 +631,30 @@ def fetch_to_volume_format(context, image_service,
     qemu_img = True
     image_meta = image_service.show(context, image_id)
 
+    # A raw image going to a raw volume needs no conversion, write it to
+    # the volume as it is downloaded instead of staging it in a temporary
+    # file for qemu-img.
+    if (_can_stream_raw_image(image_meta, dest, volume_format) and
+            _stream_raw_image(context, image_service, image_id, image_meta,
+                              dest, blocksize, size, sparse)):
+        return
+
     # NOTE(avishay): I'm not crazy about creating temp files which may be
     # large and cause disk full errors which would confuse users.
     # Unfortunately it seems that you can't pipe to 'qemu-img convert' because
     # it seeks. Maybe we can think of something for a future version.
-    with temporary_file() as tmp:
+    scratch_size = (image_meta or {}).get('size') or 0
+    with contextlib.nested(_conversion_scheduler.admit(scratch_size),
+                           temporary_file()) as (conversion, tmp):
+        conversion.path = tmp
         # We may be on a system that doesn't have qemu-img installed.  That
         # is ok if we are working with a RAW image.  This logic checks to see
         # if qemu-img is installed.  If not we make sure the image is RAW and
         # throw an exception if not.  Otherwise we stop before needing
         # qemu-img.  Systems with qemu-img will always progress through the
         # whole function.
-        try:
-            # Use the empty tmp file to make sure qemu_img_info works.
-            qemu_img_info(tmp)
-        except processutils.ProcessExecutionError:
+        # Use the empty tmp file to make sure qemu_img_info works.
+        if not check_qemu_img_installed(tmp):
             qemu_img = False
             if image_meta:
                 if image_meta['disk_format'] != 'raw':
@@ -228,7 +673,7 @@ def fetch_to_volume_format(context, image_service,
 
         fetch(context, image_service, image_id, tmp, user_id, project_id)
 
-        if is_xenserver_image(context, image_service, image_id):
+        if image_meta and is_xenserver_format(image_meta):
             replace_xenserver_image_with_coalesced_vhd(tmp)
 
         if not qemu_img:
@@ -238,10 +683,11 @@ def fetch_to_volume_format(context, image_service,
             LOG.debug('Copying image from %(tmp)s to volume %(dest)s - '
                       'size: %(size)s' % {'tmp': tmp, 'dest': dest,
                                           'size': image_meta['size']})
-            volume_utils.copy_volume(tmp, dest, image_meta['size'], blocksize)
+            volume_utils.copy_volume(tmp, dest, image_meta['size'], blocksize,
+                                     sparse=sparse)
             return
 
-        data = qemu_img_info(tmp)
+        data = downloaded_image_info(image_id, image_meta, tmp)
         virt_size = data.virtual_size / units.Gi
 
         # NOTE(xqueralt): If the image virtual size doesn't fit in the
@@ -267,12 +713,8 @@ def fetch_to_volume_format(context, image_service,
                 % {'fmt': fmt, 'backing_file': backing_file, })
 
         # NOTE(jdg): I'm using qemu-img convert to write
-        # to the volume regardless if it *needs* conversion or not
-        # TODO(avishay): We can speed this up by checking if the image is raw
-        # and if so, writing directly to the device. However, we need to keep
-        # check via 'qemu-img info' that what we copied was in fact a raw
-        # image and not a different format with a backing file, which may be
-        # malicious.
+        # to the volume regardless if it *needs* conversion or not, raw
+        # images going to raw block devices were streamed above.
         LOG.debug("%s was %s, converting to %s " % (image_id, fmt,
                                                     volume_format))
         convert_image(tmp, dest, volume_format,
@@ -303,6 +745,16 @@ def upload_volume(context, image_service, image_meta, volume_path,
                     image_service.update(context, image_id, {}, image_file)
         return
 
+    if _can_stream_qcow2_upload(image_meta, volume_format):
+        if os.access(volume_path, os.R_OK):
+            _stream_qcow2_upload(context, image_service, image_id,
+                                 volume_path)
+        else:
+            with utils.temporary_chown(volume_path):
+                _stream_qcow2_upload(context, image_service, image_id,
+                                     volume_path)
+        return
+
     if (CONF.image_conversion_dir and not
             os.path.exists(CONF.image_conversion_dir)):
         os.makedirs(CONF.image_conversion_dir)
@@ -326,19 +778,56 @@ def upload_volume(context, image_service, image_meta, volume_path,
                 reason=_("fmt=%(fmt)s backed by:%(backing_file)s")
                 % {'fmt': fmt, 'backing_file': backing_file})
 
-        convert_image(volume_path, tmp, image_meta['disk_format'],
-                      bps_limit=CONF.volume_copy_bps_limit)
+        # The converted image takes at most the virtual size of the volume.
+        with _conversion_scheduler.admit(data.virtual_size or 0, tmp):
+            convert_image(volume_path, tmp, image_meta['disk_format'],
+                          bps_limit=CONF.volume_copy_bps_limit)
 
-        data = qemu_img_info(tmp)
-        if data.file_format != image_meta['disk_format']:
-            raise exception.ImageUnacceptable(
-                image_id=image_id,
-                reason=_("Converted to %(f1)s, but format is now %(f2)s") %
-                {'f1': image_meta['disk_format'], 'f2': data.file_format})
+            data = qemu_img_info(tmp)
+            if data.file_format != image_meta['disk_format']:
+                raise exception.ImageUnacceptable(
+                    image_id=image_id,
+                    reason=_("Converted to %(f1)s, but format is now "
+                             "%(f2)s") %
+                    {'f1': image_meta['disk_format'],
+                     'f2': data.file_format})
+
+            with fileutils.file_open(tmp, 'rb') as image_file:
+                image_service.update(context, image_id, {}, image_file)
+            fileutils.delete_if_exists(tmp)
 
-        with fileutils.file_open(tmp, 'rb') as image_file:
-            image_service.update(context, image_id, {}, image_file)
-        fileutils.delete_if_exists(tmp)
+
+def _can_stream_qcow2_upload(image_meta, volume_format):
+    """Whether a volume can be uploaded as qcow2 without a scratch file."""
+    return (CONF.image_upload_stream_qcow2 and os.name != 'nt' and
+            volume_format == 'raw' and
+            image_meta['disk_format'] == 'qcow2' and
+            # The bandwidth limit is enforced with a cgroup on the process
+            # doing the copy, keep using qemu-img when one is set.
+            not CONF.volume_copy_bps_limit)
+
+
+def _stream_qcow2_upload(context, image_service, image_id, volume_path):
+    """Upload the raw volume at volume_path as a qcow2 image.
+
+    The image is encoded as it is sent. Reading a raw volume never
+    interprets its contents, so unlike 'qemu-img info' it cannot be fooled
+    into following a backing file written into the volume by its user.
+    """
+    start_time = timeutils.utcnow()
+    image_file = qcow2.Qcow2Stream(volume_path)
+    LOG.debug("Uploading %(path)s as qcow2 image %(image_id)s, "
+              "%(data)d of %(total)d clusters hold data." %
+              {'path': volume_path, 'image_id': image_id,
+               'data': image_file.data_clusters,
+               'total': image_file.virtual_clusters})
+    image_service.update(context, image_id, {}, image_file)
+
+    duration = max(timeutils.delta_seconds(start_time, timeutils.utcnow()),
+                   1)
+    fsz_mb = float(image_file.bytes_read) / units.Mi
+    msg = _("Uploaded %(sz).2f MB qcow2 image at %(mbps).2f MB/s")
+    LOG.info(msg % {"sz": fsz_mb, "mbps": fsz_mb / duration})
 
 
 def is_xenserver_image(context, image_service, image_id):
@@ -0,0 +1,221 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Sequential qcow2 encoding of raw volumes.
+
+qemu-img needs a seekable destination to write qcow2, so uploading a raw
+volume as a qcow2 image with it takes a scratch file the size of the
+volume. A qcow2 file only needs to be seekable because its metadata is
+written before it knows where the data clusters go; once the zero clusters
+of the volume are known the whole layout can be worked out up front and
+the image produced in file order.
+
+Qcow2Stream reads the volume once to find its zero clusters, then a second
+time while the image is read from it, so the image can be handed straight
+to the image service. Zero clusters are left unallocated in the image.
+Both passes read the volume in native threads, so they do not hold up the
+other green threads of the service.
+"""
+
+import struct
+
+from eventlet import tpool
+
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+QCOW2_MAGIC = 'QFI\xfb'
+QCOW2_VERSION = 2
+QCOW2_HEADER = struct.Struct('>4sIQIIQIIQQIIQ')
+
+# Set in L1 and L2 entries of clusters with a refcount of exactly 1
+QCOW_OFLAG_COPIED = 1 << 63
+
+# Refcounts are 16 bits in version 2 images
+REFCOUNT_SIZE = 2
+
+# Data clusters read from the volume by each call to a native thread
+READ_BATCH_CLUSTERS = 16
+
+
+def _div_round_up(x, y):
+    return (x + y - 1) // y
+
+
+class Qcow2Stream(object):
+    """File-like object reading the raw file or device at path as qcow2.
+
+    The path is scanned for zero clusters when the stream is created and
+    read again as the image is read, so it must not change in between.
+    """
+
+    def __init__(self, path, cluster_bits=16):
+        self.path = path
+        self.cluster_bits = cluster_bits
+        self.cluster_size = 1 << cluster_bits
+        self._l2_entries = self.cluster_size // 8
+        self._refcount_entries = self.cluster_size // REFCOUNT_SIZE
+
+        with open(path, 'rb') as f:
+            f.seek(0, 2)
+            self.virtual_size = f.tell()
+            f.seek(0)
+            self._allocated = tpool.execute(self._scan, f)
+        self._plan()
+
+        self._chunks = self._generate()
+        self._chunk = ''
+        self._chunk_offset = 0
+        self.bytes_read = 0
+
+    def _scan(self, f):
+        """Map of the clusters of f that hold data, one byte per cluster."""
+        zero = '\0' * self.cluster_size
+        allocated = bytearray(_div_round_up(self.virtual_size,
+                                            self.cluster_size))
+        for index in xrange(len(allocated)):
+            cluster = f.read(self.cluster_size)
+            if cluster != zero[:len(cluster)]:
+                allocated[index] = 1
+        return allocated
+
+    def _plan(self):
+        """Place the metadata and data clusters of the image.
+
+        The image is laid out as the header, the L1 table, the refcount
+        table, the refcount blocks, the L2 tables in use and finally the
+        allocated data clusters, in the order of their guest offsets.
+        """
+        self.virtual_clusters = len(self._allocated)
+        self.data_clusters = self._allocated.count('\1')
+        self._l1_size = _div_round_up(len(self._allocated), self._l2_entries)
+        l2_entries = self._l2_entries
+        self._l2_tables = [
+            table for table in xrange(self._l1_size)
+            if '\1' in self._allocated[table * l2_entries:
+                                       (table + 1) * l2_entries]]
+        l1_clusters = max(1, _div_round_up(self._l1_size * 8,
+                                           self.cluster_size))
+
+        # The refcount blocks have to count themselves and the table
+        # pointing to them, grow both until they cover the whole image.
+        fixed = (1 + l1_clusters + len(self._l2_tables) +
+                 self.data_clusters)
+        refcount_blocks = 0
+        refcount_table_clusters = 1
+        while True:
+            self.total_clusters = (fixed + refcount_table_clusters +
+                                   refcount_blocks)
+            blocks = _div_round_up(self.total_clusters,
+                                   self._refcount_entries)
+            table_clusters = _div_round_up(blocks * 8, self.cluster_size)
+            if (blocks, table_clusters) == (refcount_blocks,
+                                            refcount_table_clusters):
+                break
+            refcount_blocks, refcount_table_clusters = blocks, table_clusters
+
+        self._l1_offset = 1
+        self._l1_clusters = l1_clusters
+        self._refcount_table_offset = self._l1_offset + l1_clusters
+        self._refcount_table_clusters = refcount_table_clusters
+        self._refcount_blocks_offset = (self._refcount_table_offset +
+                                        refcount_table_clusters)
+        self._refcount_blocks = refcount_blocks
+        self._l2_offset = self._refcount_blocks_offset + refcount_blocks
+        self._data_offset = self._l2_offset + len(self._l2_tables)
+
+    @property
+    def size(self):
+        """Size in bytes of the qcow2 image."""
+        return self.total_clusters * self.cluster_size
+
+    def _pad(self, data, clusters=1):
+        return data.ljust(clusters * self.cluster_size, '\0')
+
+    def _entry(self, cluster):
+        return (cluster << self.cluster_bits) | QCOW_OFLAG_COPIED
+
+    def _generate(self):
+        yield self._pad(QCOW2_HEADER.pack(
+            QCOW2_MAGIC, QCOW2_VERSION, 0, 0, self.cluster_bits,
+            self.virtual_size, 0, self._l1_size,
+            self._l1_offset << self.cluster_bits,
+            self._refcount_table_offset << self.cluster_bits,
+            self._refcount_table_clusters, 0, 0))
+
+        l2_tables = dict((table, self._l2_offset + n)
+                         for n, table in enumerate(self._l2_tables))
+        l1 = [self._entry(l2_tables[table]) if table in l2_tables else 0
+              for table in xrange(self._l1_size)]
+        yield self._pad(struct.pack('>%dQ' % len(l1), *l1),
+                        self._l1_clusters)
+
+        blocks = [(self._refcount_blocks_offset + n) << self.cluster_bits
+                  for n in xrange(self._refcount_blocks)]
+        yield self._pad(struct.pack('>%dQ' % len(blocks), *blocks),
+                        self._refcount_table_clusters)
+
+        remaining = self.total_clusters
+        for n in xrange(self._refcount_blocks):
+            count = min(remaining, self._refcount_entries)
+            remaining -= count
+            yield self._pad('\0\1' * count)
+
+        data_cluster = self._data_offset
+        for table in self._l2_tables:
+            entries = []
+            start = table * self._l2_entries
+            for allocated in self._allocated[start:start + self._l2_entries]:
+                if allocated:
+                    entries.append(self._entry(data_cluster))
+                    data_cluster += 1
+                else:
+                    entries.append(0)
+            yield self._pad(struct.pack('>%dQ' % len(entries), *entries))
+
+        with open(self.path, 'rb') as f:
+            batch = []
+            for index, allocated in enumerate(self._allocated):
+                if allocated:
+                    batch.append(index)
+                    if len(batch) == READ_BATCH_CLUSTERS:
+                        yield tpool.execute(self._read_clusters, f, batch)
+                        batch = []
+            if batch:
+                yield tpool.execute(self._read_clusters, f, batch)
+
+    def _read_clusters(self, f, indexes):
+        clusters = []
+        for index in indexes:
+            f.seek(index * self.cluster_size)
+            clusters.append(self._pad(f.read(self.cluster_size)))
+        return ''.join(clusters)
+
+    def read(self, size=-1):
+        data = []
+        while size != 0:
+            if self._chunk_offset == len(self._chunk):
+                try:
+                    self._chunk = next(self._chunks)
+                except StopIteration:
+                    break
+                self._chunk_offset = 0
+            end = len(self._chunk)
+            if size > 0:
+                end = min(end, self._chunk_offset + size)
+                size -= end - self._chunk_offset
+            data.append(self._chunk[self._chunk_offset:end])
+            self._chunk_offset = end
+        data = ''.join(data)
+        self.bytes_read += len(data)
+        return data
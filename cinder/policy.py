@@ -15,8 +15,12 @@
 
 """Policy Engine For Cinder"""
 
+import ast
+import itertools
+import re
 
 from oslo.config import cfg
+import six
 
 from cinder import exception
 from cinder.openstack.common import policy
@@ -24,6 +28,177 @@ from cinder.openstack.common import policy
 CONF = cfg.CONF
 
 _ENFORCER = None
+_COMPILED = None
+
+# Credentials that RequestContext.to_dict() reports as the attribute of the
+# same name, and those it derives, so that compiled rules can read the
+# former straight off the context.  Keys outside both sets are never in the
+# credentials.
+_CONTEXT_CRED_KEYS = frozenset(['user_id', 'project_id', 'project_name',
+                                'domain', 'user_domain', 'project_domain',
+                                'is_admin', 'read_deleted', 'roles',
+                                'remote_address', 'request_id', 'auth_token',
+                                'quota_class', 'service_catalog', 'tenant',
+                                'user'])
+_DERIVED_CRED_KEYS = frozenset(['timestamp', 'user_identity'])
+
+_TARGET_KEY_RE = re.compile(r'%\(([^)]+)\)')
+
+_GENERATIONS = itertools.count()
+
+
+def _false_check(target, creds):
+    return False
+
+
+def _true_check(target, creds):
+    return True
+
+
+class _CompiledRules(object):
+    """A loaded rule set flattened into plain closures.
+
+    Rule references are resolved when the rules are compiled, so checking
+    an action is a chain of closure calls instead of a walk through the
+    Check tree with a rule lookup at every reference.  Rules using check
+    kinds that can't be flattened (http and custom checks) are left to the
+    enforcer.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.generation = next(_GENERATIONS)
+        self.checks = {}
+        self.target_keys = set()
+        self.cred_keys = set()
+        for name in rules:
+            self.lookup(name)
+
+    def lookup(self, name, _seen=None):
+        """Return the compiled check for a rule, or None if it can't be."""
+        try:
+            return self.checks[name]
+        except KeyError:
+            pass
+
+        seen = _seen or set()
+        if name in seen:
+            # Recursive rule, leave it to the enforcer
+            return None
+        try:
+            check = self.rules[name]
+        except KeyError:
+            # Same as the enforcer, an unknown rule fails closed
+            compiled = _false_check
+        else:
+            seen.add(name)
+            compiled = self._compile(check, seen)
+            seen.discard(name)
+        self.checks[name] = compiled
+        return compiled
+
+    def _compile(self, check, seen):
+        if isinstance(check, policy.TrueCheck):
+            return _true_check
+        if isinstance(check, policy.FalseCheck):
+            return _false_check
+        if isinstance(check, policy.NotCheck):
+            return self._compile_not(check, seen)
+        if isinstance(check, (policy.AndCheck, policy.OrCheck)):
+            return self._compile_bool(check, seen)
+        # Only the stock check kinds are flattened, a replacement registered
+        # under the same kind keeps its own behaviour.
+        if type(check) is policy.RuleCheck:
+            return self.lookup(check.match, seen)
+        if type(check) is policy.RoleCheck:
+            return self._compile_role(check)
+        if type(check) is policy.GenericCheck:
+            return self._compile_generic(check)
+        return None
+
+    def _compile_not(self, check, seen):
+        inner = self._compile(check.rule, seen)
+        if inner is None:
+            return None
+
+        def not_check(target, creds):
+            return not inner(target, creds)
+        return not_check
+
+    def _compile_bool(self, check, seen):
+        inners = [self._compile(rule, seen) for rule in check.rules]
+        if None in inners:
+            return None
+
+        if isinstance(check, policy.AndCheck):
+            def and_check(target, creds):
+                for inner in inners:
+                    if not inner(target, creds):
+                        return False
+                return True
+            return and_check
+
+        def or_check(target, creds):
+            for inner in inners:
+                if inner(target, creds):
+                    return True
+            return False
+        return or_check
+
+    def _compile_role(self, check):
+        role = check.match.lower()
+        self.cred_keys.add('roles')
+
+        def role_check(target, creds):
+            return role in [x.lower() for x in creds['roles']]
+        return role_check
+
+    def _compile_generic(self, check):
+        match = check.match
+        self.target_keys.update(_TARGET_KEY_RE.findall(match))
+        try:
+            value = six.text_type(ast.literal_eval(check.kind))
+            kind = None
+        except ValueError:
+            kind = check.kind
+            self.cred_keys.add(kind)
+        except SyntaxError:
+            return None
+
+        def generic_check(target, creds):
+            try:
+                expected = match % target
+            except KeyError:
+                return False
+            if kind is None:
+                return expected == value
+            try:
+                return expected == six.text_type(creds[kind])
+            except KeyError:
+                return False
+        return generic_check
+
+    def credentials(self, context):
+        if not self.cred_keys & _DERIVED_CRED_KEYS:
+            try:
+                return dict((key, getattr(context, key))
+                            for key in self.cred_keys
+                            if key in _CONTEXT_CRED_KEYS)
+            except AttributeError:
+                pass
+        return context.to_dict()
+
+    def memo_key(self, action, target, creds):
+        """Key on everything the compiled checks read."""
+        key = [action]
+        for name in self.target_keys:
+            key.append(target.get(name))
+        for name in self.cred_keys:
+            value = creds.get(name)
+            if isinstance(value, list):
+                value = tuple(value)
+            key.append(value)
+        return tuple(key)
 
 
 def init():
@@ -32,6 +207,26 @@ def init():
         _ENFORCER = policy.Enforcer()
 
 
+def _get_compiled_rules():
+    """Return the compiled form of the currently loaded rules."""
+    global _COMPILED
+    _ENFORCER.load_rules()
+    if _COMPILED is None or _COMPILED.rules is not _ENFORCER.rules:
+        _COMPILED = _CompiledRules(_ENFORCER.rules)
+    return _COMPILED
+
+
+def _get_request_memo(context, compiled):
+    # The memo rides on the context so it lives as long as the request.  It
+    # is tagged with the rules generation rather than the rules themselves so
+    # that copying a context stays cheap, and is dropped on reload.
+    memo = getattr(context, '_policy_memo', None)
+    if memo is None or memo[0] != compiled.generation:
+        memo = (compiled.generation, {})
+        context._policy_memo = memo
+    return memo[1]
+
+
 def enforce_action(context, action):
     """Checks that the action can be done by the given context.
 
@@ -62,10 +257,28 @@ def enforce(context, action, target):
     """
     init()
 
-    return _ENFORCER.enforce(action, target, context.to_dict(),
-                             do_raise=True,
-                             exc=exception.PolicyNotAuthorized,
-                             action=action)
+    compiled = _get_compiled_rules()
+    check = compiled.lookup(action)
+    if check is None:
+        return _ENFORCER.enforce(action, target, context.to_dict(),
+                                 do_raise=True,
+                                 exc=exception.PolicyNotAuthorized,
+                                 action=action)
+
+    creds = compiled.credentials(context)
+    memo = _get_request_memo(context, compiled)
+    key = compiled.memo_key(action, target, creds)
+    try:
+        result = memo[key]
+    except KeyError:
+        result = memo[key] = check(target, creds)
+    except TypeError:
+        # Unhashable target or credential values, evaluate every time
+        result = check(target, creds)
+
+    if not result:
+        raise exception.PolicyNotAuthorized(action=action)
+    return result
 
 
 def check_is_admin(roles):
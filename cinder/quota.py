@@ -179,8 +179,8 @@ class DbQuotaDriver(object):
         quotas = {}
         project_quotas = db.quota_get_all_by_project(context, project_id)
         if usages:
-            project_usages = db.quota_usage_get_all_by_project(context,
-                                                               project_id)
+            project_usages = db.quota_usage_get_all_by_project(
+                context, project_id, use_slave=True)
 
         # Get the quotas for the appropriate class.  If the project ID
         # matches the one in the context, we use the quota_class from
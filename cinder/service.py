@@ -49,6 +49,12 @@ service_opts = [
                default=10,
                help='Interval, in seconds, between nodes reporting state '
                     'to datastore'),
+    cfg.BoolOpt('batch_service_reports',
+                default=False,
+                help='Report the state of all the services run by one '
+                     'process, such as several volume backends hosted by a '
+                     'single launcher, with one database update per '
+                     'report_interval instead of one per service'),
     cfg.IntOpt('periodic_interval',
                default=60,
                help='Interval, in seconds, between running periodic tasks'),
@@ -145,6 +151,7 @@ class Service(service.Service):
                                                  self.host,
                                                  self.binary)
             self.service_id = service_ref['id']
+            self.availability_zone = service_ref['availability_zone']
         except exception.NotFound:
             self._create_service_ref(ctxt)
 
@@ -157,11 +164,14 @@ class Service(service.Service):
         self.rpcserver.start()
 
         if self.report_interval:
-            pulse = loopingcall.FixedIntervalLoopingCall(
-                self.report_state)
-            pulse.start(interval=self.report_interval,
-                        initial_delay=self.report_interval)
-            self.timers.append(pulse)
+            if CONF.batch_service_reports:
+                ServiceReporter.add_service(self)
+            else:
+                pulse = loopingcall.FixedIntervalLoopingCall(
+                    self.report_state)
+                pulse.start(interval=self.report_interval,
+                            initial_delay=self.report_interval)
+                self.timers.append(pulse)
 
         if self.periodic_interval:
             if self.periodic_fuzzy_delay:
@@ -200,6 +210,7 @@ class Service(service.Service):
                                          'report_count': 0,
                                          'availability_zone': zone})
         self.service_id = service_ref['id']
+        self.availability_zone = zone
 
     def __getattr__(self, key):
         manager = self.__dict__.get('manager', None)
@@ -258,6 +269,7 @@ class Service(service.Service):
             self.rpcserver.stop()
         except Exception:
             pass
+        ServiceReporter.remove_service(self)
         for x in self.timers:
             try:
                 x.stop()
@@ -280,35 +292,88 @@ class Service(service.Service):
 
     def report_state(self):
         """Update the state of this service in the datastore."""
+        self.report_services_state([self])
+
+    @staticmethod
+    def report_services_state(services):
+        """Update the state of the given services in the datastore.
+
+        The report counts of all the services are bumped with a single
+        conditional UPDATE. Service rows are only read back when some of
+        them disappeared, and the availability zone is only written when it
+        differs from the one cached by the service.
+        """
         ctxt = context.get_admin_context()
         zone = CONF.storage_availability_zone
-        state_catalog = {}
         try:
-            try:
-                service_ref = db.service_get(ctxt, self.service_id)
-            except exception.NotFound:
-                LOG.debug('The service database object disappeared, '
-                          'Recreating it.')
-                self._create_service_ref(ctxt)
-                service_ref = db.service_get(ctxt, self.service_id)
+            service_ids = [serv.service_id for serv in services]
+            updated = db.service_heartbeat(ctxt, service_ids)
+
+            for serv in services:
+                if updated < len(service_ids):
+                    try:
+                        db.service_get(ctxt, serv.service_id)
+                    except exception.NotFound:
+                        LOG.debug('The service database object disappeared, '
+                                  'Recreating it.')
+                        serv._create_service_ref(ctxt)
+
+                if zone != serv.availability_zone:
+                    db.service_update(ctxt, serv.service_id,
+                                      {'availability_zone': zone})
+                    serv.availability_zone = zone
+
+                # TODO(termie): make this pattern be more elegant.
+                if getattr(serv, 'model_disconnected', False):
+                    serv.model_disconnected = False
+                    LOG.error(_('Recovered model server connection!'))
 
-            state_catalog['report_count'] = service_ref['report_count'] + 1
-            if zone != service_ref['availability_zone']:
-                state_catalog['availability_zone'] = zone
+        # TODO(vish): this should probably only catch connection errors
+        except Exception:  # pylint: disable=W0702
+            for serv in services:
+                if not getattr(serv, 'model_disconnected', False):
+                    serv.model_disconnected = True
+                    LOG.exception(_('model server went away'))
 
-            db.service_update(ctxt,
-                              self.service_id, state_catalog)
 
-            # TODO(termie): make this pattern be more elegant.
-            if getattr(self, 'model_disconnected', False):
-                self.model_disconnected = False
-                LOG.error(_('Recovered model server connection!'))
+class ServiceReporter(object):
+    """Reports the state of the services of a process in batches.
 
-        # TODO(vish): this should probably only catch connection errors
-        except Exception:  # pylint: disable=W0702
-            if not getattr(self, 'model_disconnected', False):
-                self.model_disconnected = True
-                LOG.exception(_('model server went away'))
+    Used when batch_service_reports is set: there is one reporter per
+    report interval and the services sharing that interval register with it
+    instead of running their own looping call.
+    """
+
+    _reporters = {}
+
+    def __init__(self, report_interval):
+        self.report_interval = report_interval
+        self.services = []
+        self.pulse = loopingcall.FixedIntervalLoopingCall(self.report_state)
+        self.pulse.start(interval=report_interval,
+                         initial_delay=report_interval)
+
+    @classmethod
+    def add_service(cls, service):
+        reporter = cls._reporters.get(service.report_interval)
+        if reporter is None:
+            reporter = cls(service.report_interval)
+            cls._reporters[service.report_interval] = reporter
+        reporter.services.append(service)
+
+    @classmethod
+    def remove_service(cls, service):
+        reporter = cls._reporters.get(service.report_interval)
+        if reporter is None or service not in reporter.services:
+            return
+        reporter.services.remove(service)
+        if not reporter.services:
+            reporter.pulse.stop()
+            del cls._reporters[service.report_interval]
+
+    def report_state(self):
+        if self.services:
+            Service.report_services_state(list(self.services))
 
 
 class WSGIService(object):
@@ -45,7 +45,11 @@ def fake_snapshot_get(self, context, snapshot_id):
     return param
 
 
-def fake_snapshot_get_all(self, context, search_opts=None):
+def fake_snapshot_get_version(self, context, snapshot_id):
+    return {'id': snapshot_id, 'status': 'available'}
+
+
+def fake_snapshot_get_all(self, context, search_opts=None, **kwargs):
     param = _get_default_snapshot_param()
     return [param]
 
@@ -57,6 +61,8 @@ class ExtendedSnapshotAttributesTest(test.TestCase):
     def setUp(self):
         super(ExtendedSnapshotAttributesTest, self).setUp()
         self.stubs.Set(volume.api.API, 'get_snapshot', fake_snapshot_get)
+        self.stubs.Set(volume.api.API, 'get_snapshot_version',
+                       fake_snapshot_get_version)
         self.stubs.Set(volume.api.API, 'get_all_snapshots',
                        fake_snapshot_get_all)
 
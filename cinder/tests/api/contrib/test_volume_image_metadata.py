@@ -45,6 +45,10 @@ def fake_volume_get(*args, **kwargs):
     }
 
 
+def fake_volume_get_version(self, context, volume_id):
+    return {'id': volume_id, 'status': 'available'}
+
+
 def fake_volume_get_all(*args, **kwargs):
     return [fake_volume_get()]
 
@@ -71,6 +75,7 @@ class VolumeImageMetadataTest(test.TestCase):
     def setUp(self):
         super(VolumeImageMetadataTest, self).setUp()
         self.stubs.Set(volume.API, 'get', fake_volume_get)
+        self.stubs.Set(volume.API, 'get_version', fake_volume_get_version)
         self.stubs.Set(volume.API, 'get_all', fake_volume_get_all)
         self.stubs.Set(volume.API, 'get_volume_image_metadata',
                        fake_get_volume_image_metadata)
@@ -106,6 +111,19 @@ class VolumeImageMetadataTest(test.TestCase):
         self.assertEqual(self._get_image_metadata_list(res.body)[0],
                          fake_image_metadata)
 
+    def test_list_detail_volumes_fetches_page_metadata_only(self):
+        calls = []
+
+        def fake_get_volumes_metadata(self, context, volume_ids=None):
+            calls.append(volume_ids)
+            return {'fake': fake_image_metadata}
+
+        self.stubs.Set(volume.API, 'get_volumes_image_metadata',
+                       fake_get_volumes_metadata)
+        res = self._make_request('/v2/fake/volumes/detail')
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual([['fake']], calls)
+
 
 class ImageMetadataXMLDeserializer(common.MetadataXMLDeserializer):
     metadata_node_name = "volume_image_metadata"
@@ -47,6 +47,10 @@ def fake_volume_get(*args, **kwargs):
     }
 
 
+def fake_volume_get_version(self, context, volume_id):
+    return {'id': volume_id, 'status': 'available'}
+
+
 def fake_volume_get_all(*args, **kwargs):
     return [fake_volume_get()]
 
@@ -64,6 +68,7 @@ class VolumeTenantAttributeTest(test.TestCase):
     def setUp(self):
         super(VolumeTenantAttributeTest, self).setUp()
         self.stubs.Set(volume.API, 'get', fake_volume_get)
+        self.stubs.Set(volume.API, 'get_version', fake_volume_get_version)
         self.stubs.Set(volume.API, 'get_all', fake_volume_get_all)
         self.UUID = uuid.uuid4()
 
@@ -140,6 +140,27 @@ class RequestTest(test.TestCase):
                          request.cached_resource_by_id('o-0',
                                                        name='other-resource'))
 
+    def test_cached_resources_by_ids(self):
+        request = wsgi.Request.blank('/foo')
+        calls = []
+
+        def loader(resource_ids):
+            calls.append(resource_ids)
+            return dict((r_id, {'id': r_id}) for r_id in resource_ids
+                        if r_id != 'r-missing')
+
+        result = request.cached_resources_by_ids(['r-0', 'r-missing'],
+                                                 loader, name='things')
+        self.assertEqual({'r-0': {'id': 'r-0'}}, result)
+        # Cached and known missing IDs are not loaded again
+        result = request.cached_resources_by_ids(['r-0', 'r-missing', 'r-1'],
+                                                 loader, name='things')
+        self.assertEqual({'r-0': {'id': 'r-0'}, 'r-1': {'id': 'r-1'}},
+                         result)
+        self.assertEqual([['r-0', 'r-missing'], ['r-1']], calls)
+        self.assertEqual({'id': 'r-1'},
+                         request.cached_resource_by_id('r-1', name='things'))
+
 
 class ActionDispatcherTest(test.TestCase):
     def test_dispatch(self):
@@ -186,6 +207,31 @@ class JSONDictSerializerTest(test.TestCase):
         self.assertEqual(result, expected_json)
 
 
+class StreamingJSONDictSerializerTest(test.TestCase):
+    def test_json_not_streamed_by_default(self):
+        serializer = wsgi.StreamingJSONDictSerializer()
+        result = serializer.serialize(dict(volumes=[dict(id=1)]))
+        self.assertEqual('{"volumes": [{"id": 1}]}', result)
+
+    def test_json_streamed(self):
+        self.flags(osapi_stream_json_lists=True)
+        input_dict = dict(volumes=[dict(id=1), dict(id=2, name='vol2')],
+                          volumes_links=[dict(rel='next')], count=2)
+        serializer = wsgi.StreamingJSONDictSerializer()
+        result = serializer.serialize(input_dict)
+        self.assertNotIsInstance(result, basestring)
+        result = list(result)
+        self.assertIn('{"id": 1}', result)
+        self.assertEqual(wsgi.JSONDictSerializer().serialize(input_dict),
+                         ''.join(result))
+
+    def test_json_streamed_empty_list(self):
+        self.flags(osapi_stream_json_lists=True)
+        serializer = wsgi.StreamingJSONDictSerializer()
+        result = serializer.serialize(dict(volumes=[]))
+        self.assertEqual('{"volumes": []}', ''.join(result))
+
+
 class TextDeserializerTest(test.TestCase):
     def test_dispatch_default(self):
         deserializer = wsgi.TextDeserializer()
@@ -281,6 +327,17 @@ class ResourceTest(test.TestCase):
         self.assertEqual(response.body, 'off')
         self.assertEqual(response.status_int, 200)
 
+    def test_resource_call_etag(self):
+        class Controller(object):
+            def index(self, req):
+                req.environ['cinder.etag'] = 'abc'
+                return {'foo': 'bar'}
+
+        req = webob.Request.blank('/tests')
+        app = fakes.TestRouter(Controller())
+        response = req.get_response(app)
+        self.assertEqual('"abc"', response.headers['ETag'])
+
     def test_resource_not_authorized(self):
         class Controller(object):
             def index(self, req):
@@ -916,6 +973,17 @@ class ResponseObjectTest(test.TestCase):
             self.assertEqual(response.status_int, 202)
             self.assertEqual(response.body, mtype)
 
+    def test_serialize_streamed(self):
+        self.flags(osapi_stream_json_lists=True)
+        robj = wsgi.ResponseObject(dict(volumes=[dict(id=1), dict(id=2)]),
+                                   json=wsgi.StreamingJSONDictSerializer)
+        request = wsgi.Request.blank('/tests/123')
+        response = robj.serialize(request, 'application/json')
+
+        self.assertIsNone(response.content_length)
+        self.assertEqual('{"volumes": [{"id": 1}, {"id": 2}]}',
+                         ''.join(response.app_iter))
+
 
 class ValidBodyTest(test.TestCase):
 
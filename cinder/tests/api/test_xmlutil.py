@@ -666,6 +666,31 @@ class TemplateTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_xml)
 
+    def test_render_plan_cached(self):
+        root = xmlutil.TemplateElement('test', selector='test')
+        xmlutil.SubTemplateElement(root, 'a', selector='a').text = 0
+        master = xmlutil.MasterTemplate(root, 1)
+        root_slave = xmlutil.TemplateElement('test', selector='test')
+        xmlutil.SubTemplateElement(root_slave, 'b', selector='b').text = 0
+        slave = xmlutil.SlaveTemplate(root_slave, 1)
+
+        templates = [master.copy(), master.copy()]
+        for template in templates:
+            template.attach(slave)
+        plans = [xmlutil._get_render_plan(template._siblings())
+                 for template in templates]
+        self.assertIs(plans[0], plans[1])
+        self.assertEqual([root['a'], root_slave['b']],
+                         [child.element for child in plans[0].children])
+
+        # Changing the template tree invalidates the compiled plans
+        xmlutil.SubTemplateElement(root, 'c', selector='c').text = 0
+        result = templates[0].serialize({'test': {'a': ['1'], 'b': ['2'],
+                                                  'c': ['3']}})
+        result = result.replace('\n', '').replace(' ', '')
+        self.assertEqual("<?xmlversion='1.0'encoding='UTF-8'?>"
+                         "<test><a>1</a><c>3</c><b>2</b></test>", result)
+
 
 class MasterTemplateBuilder(xmlutil.TemplateBuilder):
     def construct(self):
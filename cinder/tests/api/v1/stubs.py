@@ -119,14 +119,27 @@ def stub_snapshot(id, **kwargs):
     return snapshot
 
 
-def stub_snapshot_get_all(self):
-    return [stub_snapshot(100, project_id='fake'),
-            stub_snapshot(101, project_id='superfake'),
-            stub_snapshot(102, project_id='superduperfake')]
-
-
-def stub_snapshot_get_all_by_project(self, context):
-    return [stub_snapshot(1)]
+def stub_filter_snapshots(snapshots, filters=None):
+    """Mimic the exact-match filtering done by the snapshot DB queries."""
+    filters = filters or {}
+    return [snapshot for snapshot in snapshots
+            if all(snapshot.get(key) == value
+                   for key, value in filters.items())]
+
+
+def stub_snapshot_get_all(self, marker=None, limit=None,
+                          sort_key='created_at', sort_dir='desc',
+                          filters=None, use_slave=False):
+    return stub_filter_snapshots(
+        [stub_snapshot(100, project_id='fake'),
+         stub_snapshot(101, project_id='superfake'),
+         stub_snapshot(102, project_id='superduperfake')], filters)
+
+
+def stub_snapshot_get_all_by_project(self, context, marker=None, limit=None,
+                                     sort_key='created_at', sort_dir='desc',
+                                     filters=None, use_slave=False):
+    return stub_filter_snapshots([stub_snapshot(1)], filters)
 
 
 def stub_snapshot_update(self, context, *args, **param):
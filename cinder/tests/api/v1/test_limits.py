@@ -21,6 +21,7 @@ import httplib
 from xml.dom import minidom
 
 from lxml import etree
+import mock
 import six
 import webob
 
@@ -559,6 +560,100 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class SharedLimiterTest(BaseLimitTestSuite):
+    """Tests for the `limits.SharedLimiter` class."""
+
+    def setUp(self):
+        """Run before each test."""
+        super(SharedLimiterTest, self).setUp()
+        self.stubs.Set(limits.MemoryBucketStore, "_get_time", self._get_time)
+        self.store = limits.MemoryBucketStore()
+        self.consumed = []
+        consume = self.store.consume
+
+        def fake_consume(bucket_key, capacity, rate, count):
+            self.consumed.append(count)
+            return consume(bucket_key, capacity, rate, count)
+
+        self.stubs.Set(self.store, "consume", fake_consume)
+
+    def _limiter(self, limits_list=TEST_LIMITS, **kwargs):
+        limiter = limits.SharedLimiter(
+            limits_list, store='cinder.api.v1.limits.MemoryBucketStore',
+            **kwargs)
+        limiter.store = self.store
+        return limiter
+
+    def test_limits_shared_between_workers(self):
+        """The 11th PUT is delayed no matter which worker gets it."""
+        workers = [self._limiter(), self._limiter()]
+        for i in xrange(10):
+            delay = workers[i % 2].check_for_delay("PUT", "/anything")
+            self.assertEqual((None, None), delay)
+
+        for worker in workers:
+            delay, error = worker.check_for_delay("PUT", "/anything")
+            self.assertEqual(6.0, delay)
+            self.assertIsNotNone(error)
+
+        self.time += 6.0
+        self.assertEqual((None, None),
+                         workers[1].check_for_delay("PUT", "/anything"))
+
+    def test_tokens_taken_in_batches(self):
+        get_limits = [limits.Limit("GET", "*", ".*", 100, limits.PER_MINUTE)]
+        limiter = self._limiter(get_limits, batch=5)
+        for i in xrange(10):
+            self.assertEqual((None, None),
+                             limiter.check_for_delay("GET", "/anything"))
+        self.assertEqual([5, 5], self.consumed)
+        self.assertEqual(90, limiter.get_limits()[0]['remaining'])
+
+    def test_batch_capped_to_tenth_of_limit(self):
+        limiter = self._limiter(batch=5)
+        limiter.check_for_delay("PUT", "/anything")
+        self.assertEqual([1], self.consumed)
+
+    def test_user_limits(self):
+        limiter = self._limiter(**{'limits.user0': '(get, *, .*, 2, minute)'})
+        results = [limiter.check_for_delay("GET", "/foo", "user0")[0]
+                   for i in xrange(3)]
+        self.assertEqual([None, None, 30.0], results)
+        self.assertEqual((None, None),
+                         limiter.check_for_delay("GET", "/foo", "user1"))
+
+
+class DbBucketStoreTest(BaseLimitTestSuite):
+    """Tests for the `limits.DbBucketStore` class."""
+
+    def setUp(self):
+        super(DbBucketStoreTest, self).setUp()
+        self.stubs.Set(limits.DbBucketStore, "_get_time", self._get_time)
+        self.mock_db = mock.Mock()
+        self.mock_db.rate_limit_consume.return_value = (1, 0, 0)
+        self.stubs.Set(limits, "db", self.mock_db)
+        self.store = limits.DbBucketStore()
+
+    def test_idle_buckets_purged(self):
+        self.store.consume('key', 10, 10.0 / 60, 1)
+        self.mock_db.rate_limit_purge.assert_called_once_with(
+            self.store.context, 86400)
+
+        self.time += 86399
+        self.store.consume('key', 10, 10.0 / 60, 1)
+        self.assertEqual(1, self.mock_db.rate_limit_purge.call_count)
+
+        self.time += 1
+        self.store.consume('key', 10, 10.0 / 60, 1)
+        self.assertEqual(2, self.mock_db.rate_limit_purge.call_count)
+        self.assertEqual(3, self.mock_db.rate_limit_consume.call_count)
+
+    def test_purge_waits_for_buckets_to_refill(self):
+        self.store.consume('key', 10, 10.0 / 172800, 1)
+        self.mock_db.rate_limit_purge.assert_called_once_with(
+            self.store.context, 172800)
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """Tests for `limits.WsgiLimiter` class."""
 
@@ -627,7 +627,8 @@ class VolumeApiTest(test.TestCase):
             def stub_volume_get_all_by_project(context, project_id, marker,
                                                limit, sort_key, sort_dir,
                                                filters=None,
-                                               viewable_admin_meta=False):
+                                               viewable_admin_meta=False,
+                                               use_slave=False):
                 return [
                     stubs.stub_volume(1, display_name='vol1'),
                     stubs.stub_volume(2, display_name='vol2'),
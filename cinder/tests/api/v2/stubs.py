@@ -113,9 +113,19 @@ def stub_volume_get_db(context, volume_id):
     return stub_volume(volume_id)
 
 
+def stub_volume_get_version(context, volume_id):
+    volume = stub_volume(volume_id)
+    return {'id': volume_id,
+            'project_id': volume['project_id'],
+            'status': volume['status'],
+            'updated_at': volume['updated_at'],
+            'metadata_updated_at': None,
+            'admin_metadata_updated_at': None}
+
+
 def stub_volume_get_all(context, search_opts=None, marker=None, limit=None,
                         sort_key='created_at', sort_dir='desc', filters=None,
-                        viewable_admin_meta=False):
+                        viewable_admin_meta=False, use_slave=False):
     return [stub_volume(100, project_id='fake'),
             stub_volume(101, project_id='superfake'),
             stub_volume(102, project_id='superduperfake')]
@@ -123,7 +133,7 @@ def stub_volume_get_all(context, search_opts=None, marker=None, limit=None,
 
 def stub_volume_get_all_by_project(self, context, marker, limit, sort_key,
                                    sort_dir, filters=None,
-                                   viewable_admin_meta=False):
+                                   viewable_admin_meta=False, use_slave=False):
     filters = filters or {}
     return [stub_volume_get(self, context, '1')]
 
@@ -142,14 +152,37 @@ def stub_snapshot(id, **kwargs):
     return snapshot
 
 
-def stub_snapshot_get_all(self):
-    return [stub_snapshot(100, project_id='fake'),
-            stub_snapshot(101, project_id='superfake'),
-            stub_snapshot(102, project_id='superduperfake')]
+def stub_snapshot_get_version(context, snapshot_id):
+    snapshot = stub_snapshot(snapshot_id)
+    return {'id': snapshot_id,
+            'project_id': snapshot['project_id'],
+            'status': snapshot['status'],
+            'updated_at': None,
+            'progress': None,
+            'metadata_updated_at': None}
+
+
+def stub_filter_snapshots(snapshots, filters=None):
+    """Mimic the exact-match filtering done by the snapshot DB queries."""
+    filters = filters or {}
+    return [snapshot for snapshot in snapshots
+            if all(snapshot.get(key) == value
+                   for key, value in filters.items())]
+
+
+def stub_snapshot_get_all(self, marker=None, limit=None,
+                          sort_key='created_at', sort_dir='desc',
+                          filters=None, use_slave=False):
+    return stub_filter_snapshots(
+        [stub_snapshot(100, project_id='fake'),
+         stub_snapshot(101, project_id='superfake'),
+         stub_snapshot(102, project_id='superduperfake')], filters)
 
 
-def stub_snapshot_get_all_by_project(self, context):
-    return [stub_snapshot(1)]
+def stub_snapshot_get_all_by_project(self, context, marker=None, limit=None,
+                                     sort_key='created_at', sort_dir='desc',
+                                     filters=None, use_slave=False):
+    return stub_filter_snapshots([stub_snapshot(1)], filters)
 
 
 def stub_snapshot_update(self, context, *args, **param):
@@ -70,7 +70,7 @@ def stub_snapshot_get(self, context, snapshot_id):
     return param
 
 
-def stub_snapshot_get_all(self, context, search_opts=None):
+def stub_snapshot_get_all(self, context, search_opts=None, **kwargs):
     param = _get_default_snapshot_param()
     return [param]
 
@@ -84,6 +84,8 @@ class SnapshotApiTest(test.TestCase):
                        stubs.stub_snapshot_get_all_by_project)
         self.stubs.Set(db, 'snapshot_get_all',
                        stubs.stub_snapshot_get_all)
+        self.stubs.Set(db, 'snapshot_get_version',
+                       stubs.stub_snapshot_get_version)
 
     def test_snapshot_create(self):
         self.stubs.Set(volume.api.API, "create_snapshot", stub_snapshot_create)
@@ -226,6 +228,17 @@ class SnapshotApiTest(test.TestCase):
         self.assertIn('snapshot', resp_dict)
         self.assertEqual(resp_dict['snapshot']['id'], UUID)
 
+    def test_snapshot_show_not_modified(self):
+        self.stubs.Set(volume.api.API, "get_snapshot", stub_snapshot_get)
+        req = fakes.HTTPRequest.blank('/v2/snapshots/%s' % UUID)
+        self.controller.show(req, UUID)
+        etag = req.environ['cinder.etag']
+
+        req = fakes.HTTPRequest.blank('/v2/snapshots/%s' % UUID)
+        req.headers['If-None-Match'] = '"%s"' % etag
+        res = self.controller.show(req, UUID)
+        self.assertEqual(304, res.status_int)
+
     def test_snapshot_show_invalid_id(self):
         snapshot_id = INVALID_UUID
         req = fakes.HTTPRequest.blank('/v2/snapshots/%s' % snapshot_id)
@@ -246,15 +259,17 @@ class SnapshotApiTest(test.TestCase):
         self.assertEqual(resp_snapshot['id'], UUID)
 
     def test_snapshot_list_by_status(self):
-        def stub_snapshot_get_all_by_project(context, project_id):
-            return [
-                stubs.stub_snapshot(1, display_name='backup1',
-                                    status='available'),
-                stubs.stub_snapshot(2, display_name='backup2',
-                                    status='available'),
-                stubs.stub_snapshot(3, display_name='backup3',
-                                    status='creating'),
-            ]
+        def stub_snapshot_get_all_by_project(context, project_id,
+                                             *args, **kwargs):
+            return stubs.stub_filter_snapshots(
+                [
+                    stubs.stub_snapshot(1, display_name='backup1',
+                                        status='available'),
+                    stubs.stub_snapshot(2, display_name='backup2',
+                                        status='available'),
+                    stubs.stub_snapshot(3, display_name='backup3',
+                                        status='creating'),
+                ], kwargs.get('filters'))
         self.stubs.Set(db, 'snapshot_get_all_by_project',
                        stub_snapshot_get_all_by_project)
 
@@ -279,12 +294,17 @@ class SnapshotApiTest(test.TestCase):
         self.assertEqual(len(resp['snapshots']), 0)
 
     def test_snapshot_list_by_volume(self):
-        def stub_snapshot_get_all_by_project(context, project_id):
-            return [
-                stubs.stub_snapshot(1, volume_id='vol1', status='creating'),
-                stubs.stub_snapshot(2, volume_id='vol1', status='available'),
-                stubs.stub_snapshot(3, volume_id='vol2', status='available'),
-            ]
+        def stub_snapshot_get_all_by_project(context, project_id,
+                                             *args, **kwargs):
+            return stubs.stub_filter_snapshots(
+                [
+                    stubs.stub_snapshot(1, volume_id='vol1',
+                                        status='creating'),
+                    stubs.stub_snapshot(2, volume_id='vol1',
+                                        status='available'),
+                    stubs.stub_snapshot(3, volume_id='vol2',
+                                        status='available'),
+                ], kwargs.get('filters'))
         self.stubs.Set(db, 'snapshot_get_all_by_project',
                        stub_snapshot_get_all_by_project)
 
@@ -308,12 +328,14 @@ class SnapshotApiTest(test.TestCase):
         self.assertEqual(resp['snapshots'][0]['status'], 'available')
 
     def test_snapshot_list_by_name(self):
-        def stub_snapshot_get_all_by_project(context, project_id):
-            return [
-                stubs.stub_snapshot(1, display_name='backup1'),
-                stubs.stub_snapshot(2, display_name='backup2'),
-                stubs.stub_snapshot(3, display_name='backup3'),
-            ]
+        def stub_snapshot_get_all_by_project(context, project_id,
+                                             *args, **kwargs):
+            return stubs.stub_filter_snapshots(
+                [
+                    stubs.stub_snapshot(1, display_name='backup1'),
+                    stubs.stub_snapshot(2, display_name='backup2'),
+                    stubs.stub_snapshot(3, display_name='backup3'),
+                ], kwargs.get('filters'))
         self.stubs.Set(db, 'snapshot_get_all_by_project',
                        stub_snapshot_get_all_by_project)
 
@@ -341,12 +363,14 @@ class SnapshotApiTest(test.TestCase):
 
     def test_list_snapshots_with_limit_and_offset(self):
         def list_snapshots_with_limit_and_offset(is_admin):
-            def stub_snapshot_get_all_by_project(context, project_id):
-                return [
-                    stubs.stub_snapshot(1, display_name='backup1'),
-                    stubs.stub_snapshot(2, display_name='backup2'),
-                    stubs.stub_snapshot(3, display_name='backup3'),
-                ]
+            def stub_snapshot_get_all_by_project(context, project_id,
+                                                 *args, **kwargs):
+                return stubs.stub_filter_snapshots(
+                    [
+                        stubs.stub_snapshot(1, display_name='backup1'),
+                        stubs.stub_snapshot(2, display_name='backup2'),
+                        stubs.stub_snapshot(3, display_name='backup3'),
+                    ], kwargs.get('filters'))
 
             self.stubs.Set(db, 'snapshot_get_all_by_project',
                            stub_snapshot_get_all_by_project)
@@ -365,6 +389,26 @@ class SnapshotApiTest(test.TestCase):
         #non_admin case
         list_snapshots_with_limit_and_offset(is_admin=False)
 
+    def test_list_snapshots_pushes_pagination_to_db(self):
+        calls = []
+
+        def stub_snapshot_get_all_by_project(context, project_id, marker,
+                                             limit, sort_key, sort_dir,
+                                             filters=None, use_slave=False):
+            calls.append((marker, limit, sort_key, sort_dir, filters))
+            return [stubs.stub_snapshot(1, display_name='backup1')]
+
+        self.stubs.Set(db, 'snapshot_get_all_by_project',
+                       stub_snapshot_get_all_by_project)
+
+        req = fakes.HTTPRequest.blank('/v2/fake/snapshots?limit=2&offset=1'
+                                      '&marker=1&sort_key=display_name'
+                                      '&sort_dir=asc&status=available')
+        self.controller.index(req)
+
+        self.assertEqual([('1', 3, 'display_name', 'asc',
+                           {'status': 'available'})], calls)
+
     def test_admin_list_snapshots_all_tenants(self):
         req = fakes.HTTPRequest.blank('/v2/fake/snapshots?all_tenants=1',
                                       use_admin_context=True)
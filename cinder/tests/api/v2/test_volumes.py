@@ -15,16 +15,19 @@
 
 
 import datetime
+import json
 
 from lxml import etree
 from oslo.config import cfg
 import six.moves.urllib.parse as urlparse
+import sqlalchemy
 import webob
 
 from cinder.api import extensions
 from cinder.api.v2 import volumes
 from cinder import context
 from cinder import db
+from cinder.db.sqlalchemy import api as sqla_api
 from cinder import exception
 from cinder import test
 from cinder.tests.api import fakes
@@ -69,6 +72,8 @@ class VolumeApiTest(test.TestCase):
                    notification_driver=[fake_notifier.__name__])
         self.stubs.Set(db, 'volume_get_all', stubs.stub_volume_get_all)
         self.stubs.Set(volume_api.API, 'delete', stubs.stub_volume_delete)
+        self.stubs.Set(db, 'volume_get_version',
+                       stubs.stub_volume_get_version)
         self.stubs.Set(db, 'service_get_all_by_topic',
                        stubs.stub_service_get_all_by_topic)
         self.maxDiff = None
@@ -751,7 +756,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_index_with_marker(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -812,7 +818,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_index_limit_offset(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -840,7 +847,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_detail_with_marker(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -901,7 +909,8 @@ class VolumeApiTest(test.TestCase):
     def test_volume_detail_limit_offset(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -960,7 +969,7 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all(context, marker, limit,
                                 sort_key, sort_dir,
                                 filters=None,
-                                viewable_admin_meta=False):
+                                viewable_admin_meta=False, use_slave=False):
             vols = [stubs.stub_volume(i)
                     for i in xrange(CONF.osapi_max_limit)]
             if limit is None or limit >= len(vols):
@@ -979,7 +988,7 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all2(context, marker, limit,
                                  sort_key, sort_dir,
                                  filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False, use_slave=False):
             vols = [stubs.stub_volume(i)
                     for i in xrange(100)]
             if limit is None or limit >= len(vols):
@@ -997,7 +1006,7 @@ class VolumeApiTest(test.TestCase):
         def stub_volume_get_all3(context, marker, limit,
                                  sort_key, sort_dir,
                                  filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False, use_slave=False):
             vols = [stubs.stub_volume(i)
                     for i in xrange(CONF.osapi_max_limit + 100)]
             if limit is None or limit >= len(vols):
@@ -1037,14 +1046,15 @@ class VolumeApiTest(test.TestCase):
         # Non-admin, project function should be called with no_migration_status
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
                                            sort_key, sort_dir, filters=None,
-                                           viewable_admin_meta=False):
+                                           viewable_admin_meta=False,
+                                           use_slave=False):
             self.assertEqual(filters['no_migration_targets'], True)
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol1')]
 
         def stub_volume_get_all(context, marker, limit,
                                 sort_key, sort_dir, filters=None,
-                                viewable_admin_meta=False):
+                                viewable_admin_meta=False, use_slave=False):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
@@ -1061,13 +1071,14 @@ class VolumeApiTest(test.TestCase):
         # without no_migration_status
         def stub_volume_get_all_by_project2(context, project_id, marker, limit,
                                             sort_key, sort_dir, filters=None,
-                                            viewable_admin_meta=False):
+                                            viewable_admin_meta=False,
+                                            use_slave=False):
             self.assertFalse('no_migration_targets' in filters)
             return [stubs.stub_volume(1, display_name='vol2')]
 
         def stub_volume_get_all2(context, marker, limit,
                                  sort_key, sort_dir, filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False, use_slave=False):
             return []
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project2)
@@ -1082,12 +1093,13 @@ class VolumeApiTest(test.TestCase):
         # without no_migration_status
         def stub_volume_get_all_by_project3(context, project_id, marker, limit,
                                             sort_key, sort_dir, filters=None,
-                                            viewable_admin_meta=False):
+                                            viewable_admin_meta=False,
+                                            use_slave=False):
             return []
 
         def stub_volume_get_all3(context, marker, limit,
                                  sort_key, sort_dir, filters=None,
-                                 viewable_admin_meta=False):
+                                 viewable_admin_meta=False, use_slave=False):
             self.assertFalse('no_migration_targets' in filters)
             self.assertFalse('all_tenants' in filters)
             return [stubs.stub_volume(1, display_name='vol3')]
@@ -1191,6 +1203,44 @@ class VolumeApiTest(test.TestCase):
 
         self.assertEqual(res_dict, expected)
 
+    def test_volume_show_etag(self):
+        self.stubs.Set(volume_api.API, 'get', stubs.stub_volume_get)
+
+        req = fakes.HTTPRequest.blank('/v2/volumes/1')
+        self.controller.show(req, '1')
+        self.assertTrue(req.environ['cinder.etag'])
+
+    def test_volume_show_not_modified(self):
+        self.stubs.Set(volume_api.API, 'get', stubs.stub_volume_get)
+        req = fakes.HTTPRequest.blank('/v2/volumes/1')
+        self.controller.show(req, '1')
+        etag = req.environ['cinder.etag']
+
+        self.stubs.Set(volume_api.API, 'get', stubs.stub_volume_get_notfound)
+        req = fakes.HTTPRequest.blank('/v2/volumes/1')
+        req.headers['If-None-Match'] = '"%s"' % etag
+        res = self.controller.show(req, '1')
+        self.assertEqual(304, res.status_int)
+        self.assertEqual(etag, res.etag)
+
+    def test_volume_show_etag_changes_with_status(self):
+        self.stubs.Set(volume_api.API, 'get', stubs.stub_volume_get)
+        req = fakes.HTTPRequest.blank('/v2/volumes/1')
+        self.controller.show(req, '1')
+        etag = req.environ['cinder.etag']
+
+        def stub_volume_get_version(context, volume_id):
+            version = stubs.stub_volume_get_version(context, volume_id)
+            version['status'] = 'available'
+            return version
+
+        self.stubs.Set(db, 'volume_get_version', stub_volume_get_version)
+        req = fakes.HTTPRequest.blank('/v2/volumes/1')
+        req.headers['If-None-Match'] = '"%s"' % etag
+        res_dict = self.controller.show(req, '1')
+        self.assertIn('volume', res_dict)
+        self.assertNotEqual(etag, req.environ['cinder.etag'])
+
     def test_volume_show_no_volume(self):
         self.stubs.Set(volume_api.API, "get", stubs.stub_volume_get_notfound)
 
@@ -1685,3 +1735,78 @@ class TestVolumeCreateRequestXMLDeserializer(test.TestCase):
             },
         }
         self.assertEqual(expected, request['body'])
+
+
+class VolumeDetailQueryCountTest(test.TestCase):
+    """Check that listing volumes costs a constant number of queries."""
+
+    def setUp(self):
+        super(VolumeDetailQueryCountTest, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.statements = []
+        self.engine = sqla_api.get_engine()
+        sqlalchemy.event.listen(self.engine, 'before_cursor_execute',
+                                self._count_statement)
+        self.addCleanup(sqlalchemy.event.remove, self.engine,
+                        'before_cursor_execute', self._count_statement)
+
+    def _count_statement(self, conn, cursor, statement, parameters,
+                         context, executemany):
+        self.statements.append(statement)
+
+    def _create_volumes(self, count):
+        for i in range(count):
+            vol = db.volume_create(self.ctxt, {'project_id': 'fake',
+                                               'host': 'host1',
+                                               'size': 1,
+                                               'status': 'available',
+                                               'metadata': {'k': 'v'}})
+            db.volume_glance_metadata_create(self.ctxt, vol['id'],
+                                             'image_id', 'fake-image')
+
+    def _count_detail_queries(self):
+        req = webob.Request.blank('/v2/fake/volumes/detail')
+        req.accept = 'application/json'
+        admin_ctxt = context.RequestContext('admin', 'fake', is_admin=True)
+        del self.statements[:]
+        res = req.get_response(fakes.wsgi_app(fake_auth_context=admin_ctxt))
+        self.assertEqual(200, res.status_int)
+        # Make sure the extensions really did their job
+        for vol in json.loads(res.body)['volumes']:
+            self.assertEqual({'image_id': 'fake-image'},
+                             vol['volume_image_metadata'])
+            self.assertEqual('fake', vol['os-vol-tenant-attr:tenant_id'])
+        return len(self.statements)
+
+    def test_detail_query_count_does_not_grow_with_volumes(self):
+        self._create_volumes(1)
+        queries_for_one = self._count_detail_queries()
+        self._create_volumes(9)
+        queries_for_ten = self._count_detail_queries()
+        self.assertEqual(queries_for_one, queries_for_ten)
+
+
+class VolumeDetailStreamingTest(test.TestCase):
+
+    def _get_detail(self):
+        req = webob.Request.blank('/v2/fake/volumes/detail')
+        req.accept = 'application/json'
+        admin_ctxt = context.RequestContext('admin', 'fake', is_admin=True)
+        return req.get_response(fakes.wsgi_app(fake_auth_context=admin_ctxt))
+
+    def test_detail_streamed(self):
+        ctxt = context.get_admin_context()
+        for i in range(3):
+            db.volume_create(ctxt, {'project_id': 'fake', 'host': 'host1',
+                                    'size': 1, 'status': 'available'})
+        res = self._get_detail()
+        self.assertEqual(200, res.status_int)
+        self.assertIsNotNone(res.content_length)
+        expected = json.loads(res.body)
+
+        self.flags(osapi_stream_json_lists=True)
+        res = self._get_detail()
+        self.assertEqual(200, res.status_int)
+        self.assertIsNone(res.content_length)
+        self.assertEqual(expected, json.loads(res.body))
+        self.assertEqual(3, len(expected['volumes']))
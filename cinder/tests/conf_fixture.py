@@ -29,6 +29,7 @@ CONF.import_opt('xiv_ds8k_proxy',
 CONF.import_opt('backup_driver', 'cinder.backup.manager')
 CONF.import_opt('fixed_key', 'cinder.keymgr.conf_key_mgr', group='keymgr')
 CONF.import_opt('scheduler_driver', 'cinder.scheduler.manager')
+CONF.import_opt('glance_image_cache_ttl', 'cinder.image.glance')
 
 def_vol_type = 'fake_vol_type'
 
@@ -51,5 +52,6 @@ def set_defaults(conf):
     conf.set_default('fixed_key', default='0' * 64, group='keymgr')
     conf.set_default('scheduler_driver',
                      'cinder.scheduler.filter_scheduler.FilterScheduler')
+    conf.set_default('glance_image_cache_ttl', 0)
     conf.set_default('state_path', os.path.abspath(
         os.path.join(os.path.dirname(__file__), '..', '..')))
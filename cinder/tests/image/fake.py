@@ -211,6 +211,14 @@ class _FakeImageService(object):
         if not removed:
             raise exception.ImageNotFound(image_id=image_id)
 
+    def add_location(self, context, image_id, url, metadata):
+        if not self.images.get(image_id):
+            raise exception.ImageNotFound(image_id=image_id)
+        image = self.images[image_id]
+        image.setdefault('locations', []).append({'url': url,
+                                                  'metadata': metadata})
+        return image
+
     def get_location(self, context, image_id):
         if image_id in self.images:
             return 'fake_location'
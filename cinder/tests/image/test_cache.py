@@ -0,0 +1,154 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import mock
+
+from cinder import context
+from cinder import exception
+from cinder.image import cache as image_cache
+from cinder import test
+from cinder.tests import fake_notifier
+
+
+class ImageVolumeCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImageVolumeCacheTestCase, self).setUp()
+        fake_notifier.reset()
+        self.addCleanup(fake_notifier.reset)
+        self.mock_db = mock.Mock()
+        self.mock_volume_api = mock.Mock()
+        self.context = context.RequestContext('internal-user',
+                                              'internal-project')
+        self.updated_at = datetime.datetime(2014, 10, 1, 12, 0, 0)
+        self.image_meta = {'updated_at': self.updated_at,
+                           'checksum': 'abc'}
+        self.volume = {'id': 'vol-new', 'host': 'host@lvm#pool',
+                       'size': 10}
+
+    def _build_cache(self, max_gb=0, max_count=0):
+        return image_cache.ImageVolumeCache(self.mock_db,
+                                            self.mock_volume_api,
+                                            max_gb, max_count)
+
+    def _build_entry(self, volume_id='vol-cached', size=10):
+        return {'id': 1, 'host': 'host@lvm#pool', 'image_id': 'image',
+                'image_updated_at': self.updated_at,
+                'image_checksum': 'abc', 'volume_id': volume_id,
+                'size': size}
+
+    def _notified(self):
+        return [(n['event_type'], n['payload'])
+                for n in fake_notifier.NOTIFICATIONS]
+
+    def test_get_entry_hit(self):
+        cache = self._build_cache()
+        entry = self._build_entry()
+        self.mock_db.image_volume_cache_get_and_update_last_used.\
+            return_value = entry
+
+        self.assertEqual(entry, cache.get_entry(self.context, self.volume,
+                                                'image', self.image_meta))
+        self.assertFalse(self.mock_volume_api.delete.called)
+        self.assertEqual([('image_volume_cache.hit',
+                           {'image_id': 'image',
+                            'host': 'host@lvm#pool'})], self._notified())
+
+    def test_get_entry_miss(self):
+        cache = self._build_cache()
+        self.mock_db.image_volume_cache_get_and_update_last_used.\
+            return_value = None
+
+        self.assertIsNone(cache.get_entry(self.context, self.volume,
+                                          'image', self.image_meta))
+        self.assertEqual([('image_volume_cache.miss',
+                           {'image_id': 'image',
+                            'host': 'host@lvm#pool'})], self._notified())
+
+    def _test_get_entry_evicted(self, entry, image_meta):
+        cache = self._build_cache()
+        self.mock_db.image_volume_cache_get_and_update_last_used.\
+            return_value = entry
+        cached_volume = {'id': 'vol-cached'}
+        self.mock_db.volume_get.return_value = cached_volume
+
+        self.assertIsNone(cache.get_entry(self.context, self.volume,
+                                          'image', image_meta))
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            mock.ANY, 'vol-cached')
+        self.mock_volume_api.delete.assert_called_once_with(
+            self.context, cached_volume, force=True)
+        self.assertEqual(['image_volume_cache.evict',
+                          'image_volume_cache.miss'],
+                         [event for event, payload in self._notified()])
+
+    def test_get_entry_image_updated(self):
+        image_meta = dict(self.image_meta, updated_at=(
+            self.updated_at + datetime.timedelta(hours=1)))
+        self._test_get_entry_evicted(self._build_entry(), image_meta)
+
+    def test_get_entry_checksum_changed(self):
+        image_meta = dict(self.image_meta, checksum='def')
+        self._test_get_entry_evicted(self._build_entry(), image_meta)
+
+    def test_get_entry_larger_than_volume(self):
+        self._test_get_entry_evicted(self._build_entry(size=20),
+                                     self.image_meta)
+
+    def test_create_cache_entry(self):
+        cache = self._build_cache()
+        self.mock_db.image_volume_cache_create.return_value = \
+            self._build_entry()
+        cache.create_cache_entry(self.context, self.volume, 'image',
+                                 self.image_meta)
+        self.mock_db.image_volume_cache_create.assert_called_once_with(
+            mock.ANY, 'host@lvm#pool', 'image', self.updated_at, 'abc',
+            'vol-new', 10)
+
+    def test_ensure_space_unlimited(self):
+        cache = self._build_cache()
+        self.assertTrue(cache.ensure_space(self.context, 1000, 'host'))
+        self.assertFalse(
+            self.mock_db.image_volume_cache_get_all_for_host.called)
+
+    def test_ensure_space_too_large(self):
+        cache = self._build_cache(max_gb=10)
+        self.assertFalse(cache.ensure_space(self.context, 11, 'host'))
+
+    def test_ensure_space_evicts_least_recently_used(self):
+        cache = self._build_cache(max_gb=30, max_count=5)
+        entries = [self._build_entry('vol-%d' % i) for i in range(3)]
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = \
+            entries
+        self.mock_db.volume_get.side_effect = (
+            lambda ctxt, volume_id: {'id': volume_id})
+
+        self.assertTrue(cache.ensure_space(self.context, 15, 'host'))
+        self.assertEqual(
+            [mock.call(self.context, {'id': 'vol-2'}, force=True),
+             mock.call(self.context, {'id': 'vol-1'}, force=True)],
+            self.mock_volume_api.delete.call_args_list)
+
+    def test_ensure_space_count_limit(self):
+        cache = self._build_cache(max_count=2)
+        entries = [self._build_entry('vol-%d' % i) for i in range(2)]
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = \
+            entries
+        self.mock_db.volume_get.side_effect = exception.VolumeNotFound(
+            volume_id='vol-1')
+
+        self.assertTrue(cache.ensure_space(self.context, 1, 'host'))
+        self.mock_db.image_volume_cache_delete.assert_called_once_with(
+            mock.ANY, 'vol-1')
+        self.assertFalse(self.mock_volume_api.delete.called)
@@ -15,7 +15,11 @@
 
 
 import datetime
+import hashlib
+import os
+import tempfile
 
+import eventlet
 import glanceclient.exc
 import mock
 from oslo.config import cfg
@@ -23,6 +27,7 @@ from oslo.config import cfg
 from cinder import context
 from cinder import exception
 from cinder.image import glance
+from cinder.openstack.common import units
 from cinder import test
 from cinder.tests.glance import stubs as glance_stubs
 
@@ -386,6 +391,27 @@ class TestGlanceImageService(test.TestCase):
         }
         self.assertEqual(image_meta, expected)
 
+    def test_add_location(self):
+        with mock.patch.object(self.service._client, 'call') as mock_call:
+            mock_call.return_value = glance_stubs.FakeImage({'id': '1'})
+            image_meta = self.service.add_location(
+                self.context, '1', 'rbd://location', {})
+
+        self.assertEqual('1', image_meta['id'])
+        mock_call.assert_called_once_with(self.context, 'update', '1',
+                                          location='rbd://location')
+
+    def test_add_location_v2(self):
+        self.flags(glance_api_version=2)
+        with mock.patch.object(self.service._client, 'call') as mock_call:
+            mock_call.return_value = glance_stubs.FakeImage({'id': '1'})
+            self.service.add_location(self.context, '1', 'rbd://location',
+                                      {'key': 'value'})
+
+        mock_call.assert_called_once_with(
+            self.context, 'add_location', '1', 'rbd://location',
+            {'key': 'value'})
+
     def test_show_raises_when_no_authtoken_in_the_context(self):
         fixture = self._make_fixture(name='image1',
                                      is_public=False,
@@ -608,6 +634,288 @@ class TestGlanceClientVersion(test.TestCase):
         self.assertEqual('2', _mockglanceclient.call_args[0][0])
 
 
+class TestGlanceParallelDownload(test.TestCase):
+
+    def setUp(self):
+        super(TestGlanceParallelDownload, self).setUp()
+        self.flags(glance_download_parallelism=3,
+                   glance_download_chunk_size_mb=1)
+        self.context = context.RequestContext('fake', 'fake', auth_token=True)
+        self.image_data = os.urandom(int(2.5 * units.Mi))
+        self.image_meta = {'id': 'image', 'size': len(self.image_data),
+                           'checksum': hashlib.md5(
+                               self.image_data).hexdigest()}
+        self.client = mock.Mock()
+        self.client.data_range.side_effect = self._data_range
+        self.service = glance.GlanceImageService(client=self.client)
+        self.service.show = mock.Mock(return_value=self.image_meta)
+        fd, self.dest_path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.unlink, self.dest_path)
+
+    def _data_range(self, context, image_id, offset, length):
+        data = self.image_data[offset:offset + length]
+        return 206, [data[:length // 2], data[length // 2:]]
+
+    def _download(self):
+        with open(self.dest_path, 'wb') as f:
+            self.service.download(self.context, 'image', f)
+        with open(self.dest_path, 'rb') as f:
+            return f.read()
+
+    def test_download_ranges(self):
+        self.assertEqual(self.image_data, self._download())
+        self.assertEqual(
+            [(0, units.Mi), (units.Mi, units.Mi),
+             (2 * units.Mi, units.Mi // 2)],
+            sorted(call[0][2:] for call in
+                   self.client.data_range.call_args_list))
+        self.assertFalse(self.client.call.called)
+
+    def test_download_ranges_not_supported(self):
+        self.client.data_range.side_effect = None
+        self.client.data_range.return_value = (200, [self.image_data])
+        self.assertEqual(self.image_data, self._download())
+        self.assertEqual(1, self.client.data_range.call_count)
+
+    def test_download_ranges_checksum_mismatch(self):
+        self.image_meta['checksum'] = 'bad'
+        self.assertRaises(exception.ImageChecksumMismatch, self._download)
+
+    def test_download_ranges_short_range(self):
+        def _data_range(context, image_id, offset, length):
+            return 206, [self.image_data[offset:offset + length - 1]]
+
+        self.client.data_range.side_effect = _data_range
+        self.assertRaises(exception.GlanceConnectionFailed, self._download)
+
+    def test_download_small_image_single_stream(self):
+        self.flags(glance_download_chunk_size_mb=4)
+        self.client.call.return_value = [self.image_data]
+        self.assertEqual(self.image_data, self._download())
+        self.assertFalse(self.client.data_range.called)
+
+    def test_download_to_writer_single_stream(self):
+        self.client.call.return_value = [self.image_data]
+        self.service.download(self.context, 'image', NullWriter())
+        self.assertFalse(self.client.data_range.called)
+        self.client.call.assert_called_once_with(self.context, 'data',
+                                                 'image')
+
+    def test_download_file_url_ranges(self):
+        self.flags(allowed_direct_url_schemes=['file'])
+        fd, src_path = tempfile.mkstemp()
+        os.write(fd, self.image_data)
+        os.close(fd)
+        self.addCleanup(os.unlink, src_path)
+        self.service.get_location = mock.Mock(
+            return_value=('file://' + src_path, None))
+
+        self.assertEqual(self.image_data, self._download())
+        self.assertFalse(self.client.data_range.called)
+        self.assertFalse(self.client.call.called)
+
+    @mock.patch('cinder.image.glance.glanceclient.Client')
+    def test_data_range_request(self, mock_client):
+        self.flags(glance_api_version=2)
+        http_client = mock_client.return_value.http_client
+        http_client.get.return_value = (mock.Mock(status_code=206), ['data'])
+        client = glance.GlanceClientWrapper(self.context, 'fake_host:9292',
+                                            False)
+
+        self.assertEqual((206, ['data']),
+                         client.data_range(self.context, 'image', 10, 4))
+        http_client.get.assert_called_once_with(
+            '/v2/images/image/file', headers={'Range': 'bytes=10-13'})
+
+
+class TestGlanceClientPool(test.TestCase):
+
+    def setUp(self):
+        super(TestGlanceClientPool, self).setUp()
+        self.flags(auth_strategy='keystone',
+                   glance_api_servers=['server1:9292', 'server2:9292'])
+        self.stubs.Set(glance, '_client_pool', glance.GlanceClientPool())
+        self.stubs.Set(glance.time, 'sleep', lambda s: None)
+        self.stubs.Set(glance.random, 'shuffle', lambda servers: None)
+        self.context = context.RequestContext('fake', 'fake',
+                                              auth_token='token')
+        self.clients = {}
+        patcher = mock.patch.object(glance, '_create_glance_client',
+                                    side_effect=self._create_client)
+        self.mock_create = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_client(self, context, netloc, use_ssl, version):
+        client = mock.Mock()
+        client.images.get.return_value = netloc
+        self.clients.setdefault(netloc, []).append(client)
+        return client
+
+    def test_clients_reused(self):
+        wrapper = glance.GlanceClientWrapper()
+        results = [wrapper.call(self.context, 'get', 'image')
+                   for i in range(4)]
+
+        self.assertEqual(['server1:9292', 'server2:9292'] * 2, results)
+        self.assertEqual(2, self.mock_create.call_count)
+        self.assertEqual({'clients': 2, 'hits': 2, 'misses': 2,
+                          'evictions': 0, 'servers_down': []},
+                         glance.get_client_pool_stats())
+
+    def test_clients_per_token(self):
+        self.flags(glance_api_servers=['server1:9292'])
+        other_context = context.RequestContext('fake', 'fake',
+                                               auth_token='other')
+        wrapper = glance.GlanceClientWrapper()
+        wrapper.call(self.context, 'get', 'image')
+        wrapper.call(other_context, 'get', 'image')
+        wrapper.call(self.context, 'get', 'image')
+
+        self.assertEqual(2, len(self.clients['server1:9292']))
+
+    def test_pool_size(self):
+        self.flags(glance_client_pool_size=1)
+        wrapper = glance.GlanceClientWrapper()
+        for i in range(3):
+            wrapper.call(self.context, 'get', 'image')
+
+        stats = glance.get_client_pool_stats()
+        self.assertEqual(1, stats['clients'])
+        self.assertEqual(2, stats['evictions'])
+        self.assertEqual(3, self.mock_create.call_count)
+
+    def test_server_down_skipped(self):
+        def _create_client(context, netloc, use_ssl, version):
+            client = self._create_client(context, netloc, use_ssl, version)
+            if netloc == 'server1:9292':
+                client.images.get.side_effect = (
+                    glanceclient.exc.CommunicationError())
+            return client
+
+        self.mock_create.side_effect = _create_client
+        self.flags(glance_num_retries=1)
+        wrapper = glance.GlanceClientWrapper()
+        results = [wrapper.call(self.context, 'get', 'image')
+                   for i in range(3)]
+
+        self.assertEqual(['server2:9292'] * 3, results)
+        self.assertEqual(1, len(self.clients['server1:9292']))
+        self.assertEqual(['server1:9292'],
+                         glance.get_client_pool_stats()['servers_down'])
+
+    def test_all_servers_down(self):
+        self.mock_create.side_effect = None
+        self.mock_create.return_value.images.get.side_effect = (
+            glanceclient.exc.CommunicationError())
+        self.flags(glance_num_retries=3)
+        wrapper = glance.GlanceClientWrapper()
+
+        self.assertRaises(exception.GlanceConnectionFailed, wrapper.call,
+                          self.context, 'get', 'image')
+        self.assertEqual(4, self.mock_create.call_count)
+        self.assertEqual(['server1:9292', 'server2:9292'],
+                         glance.get_client_pool_stats()['servers_down'])
+
+
+class TestImageMetadataCache(test.TestCase):
+
+    def setUp(self):
+        super(TestImageMetadataCache, self).setUp()
+        self.flags(glance_image_cache_ttl=5)
+        self.stubs.Set(glance, '_image_cache', glance.ImageMetadataCache())
+        self.client = glance_stubs.StubGlanceClient()
+        self.stubs.Set(glance, '_create_glance_client',
+                       lambda context, netloc, use_ssl, version: self.client)
+        wrapper = glance.GlanceClientWrapper('fake', 'fake_host', 9292)
+        self.service = glance.GlanceImageService(client=wrapper)
+        self.context = context.RequestContext('fake', 'project1',
+                                              auth_token=True)
+        self.client.create(id='public', is_public=True, properties={})
+        self.client.create(id='private', is_public=False, owner='project1',
+                           properties={})
+        patcher = mock.patch.object(self.client.images, 'get',
+                                    side_effect=self.client.get)
+        self.mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_show_cached(self):
+        first = self.service.show(self.context, 'public')
+        second = self.service.show(self.context, 'public')
+
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.mock_get.call_count)
+
+    def test_show_disabled(self):
+        self.flags(glance_image_cache_ttl=0)
+        self.service.show(self.context, 'public')
+        self.service.show(self.context, 'public')
+
+        self.assertEqual(2, self.mock_get.call_count)
+
+    def test_show_other_project_fetches_again(self):
+        other_context = context.RequestContext('fake', 'project2',
+                                               auth_token=True)
+        self.service.show(self.context, 'private')
+        self.service.show(other_context, 'private')
+        self.service.show(other_context, 'public')
+        self.service.show(self.context, 'private')
+
+        self.assertEqual([mock.call('private')] * 2 + [mock.call('public')],
+                         self.mock_get.call_args_list)
+
+    def test_show_expired(self):
+        with mock.patch.object(glance.time, 'time', return_value=100):
+            self.service.show(self.context, 'public')
+        with mock.patch.object(glance.time, 'time', return_value=104):
+            self.service.show(self.context, 'public')
+        with mock.patch.object(glance.time, 'time', return_value=105):
+            self.service.show(self.context, 'public')
+
+        self.assertEqual(2, self.mock_get.call_count)
+
+    def test_cache_size(self):
+        self.flags(glance_image_cache_size=1)
+        for image_id in ('public', 'private', 'public'):
+            self.service.show(self.context, image_id)
+
+        self.assertEqual(3, self.mock_get.call_count)
+
+    def test_update_invalidates(self):
+        self.service.show(self.context, 'private')
+        self.service.update(self.context, 'private', {'name': 'new'})
+        image_meta = self.service.show(self.context, 'private')
+
+        self.assertEqual('new', image_meta['name'])
+        self.assertEqual(2, self.mock_get.call_count)
+
+    def test_concurrent_fetches_share_one_call(self):
+        cache = glance.ImageMetadataCache()
+        fetches = []
+
+        def _fetch():
+            fetches.append(1)
+            eventlet.sleep(0)
+            return 'image'
+
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(
+            lambda i: cache.get('key', _fetch, lambda image: True),
+            range(10)))
+
+        self.assertEqual(['image'] * 10, results)
+        self.assertEqual(1, len(fetches))
+        self.assertEqual((9, 1), (cache.hits, cache.misses))
+
+    def test_failed_fetch_not_shared(self):
+        cache = glance.ImageMetadataCache()
+        fetch = mock.Mock(side_effect=[exception.ImageNotFound(image_id='x'),
+                                       'image'])
+        self.assertRaises(exception.ImageNotFound,
+                          cache.get, 'key', fetch, lambda image: True)
+        self.assertEqual('image', cache.get('key', fetch, lambda image: True))
+
+
 def _create_failing_glance_client(info):
     class MyGlanceStubClient(glance_stubs.StubGlanceClient):
         """A client that fails the first time, then succeeds."""
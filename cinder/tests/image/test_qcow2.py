@@ -0,0 +1,158 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from distutils import spawn
+import struct
+import tempfile
+
+import testtools
+
+from cinder.image import qcow2
+from cinder.openstack.common import processutils
+from cinder import test
+
+
+def _read_qcow2(image):
+    """Returns the guest data of a qcow2 image, checking its refcounts."""
+    (magic, version, backing_file_offset, backing_file_size, cluster_bits,
+     size, crypt_method, l1_size, l1_table_offset, refcount_table_offset,
+     refcount_table_clusters, nb_snapshots,
+     snapshots_offset) = qcow2.QCOW2_HEADER.unpack_from(image)
+    assert (magic, version) == ('QFI\xfb', 2)
+    assert (backing_file_offset, crypt_method, nb_snapshots) == (0, 0, 0)
+    cluster_size = 1 << cluster_bits
+    assert len(image) % cluster_size == 0
+    offset_mask = ((1 << 56) - 1) & ~(cluster_size - 1)
+    used = [0] * (len(image) // cluster_size)
+
+    def _use(offset, clusters=1):
+        assert offset % cluster_size == 0
+        for cluster in range(clusters):
+            used[offset // cluster_size + cluster] += 1
+
+    def _table(offset, entries):
+        return struct.unpack_from('>%dQ' % entries, image, offset)
+
+    _use(0)
+    _use(l1_table_offset, -(-l1_size * 8 // cluster_size) or 1)
+    _use(refcount_table_offset, refcount_table_clusters)
+
+    refcounts = []
+    for entry in _table(refcount_table_offset,
+                        refcount_table_clusters * cluster_size // 8):
+        if entry:
+            _use(entry)
+            refcounts.extend(struct.unpack_from('>%dH' % (cluster_size // 2),
+                                                image, entry))
+
+    data = []
+    l2_entries = cluster_size // 8
+    for l1_entry in _table(l1_table_offset, l1_size):
+        if not l1_entry:
+            data.append('\0' * cluster_size * l2_entries)
+            continue
+        assert l1_entry & qcow2.QCOW_OFLAG_COPIED
+        _use(l1_entry & offset_mask)
+        for l2_entry in _table(l1_entry & offset_mask, l2_entries):
+            if not l2_entry:
+                data.append('\0' * cluster_size)
+                continue
+            assert l2_entry & qcow2.QCOW_OFLAG_COPIED
+            offset = l2_entry & offset_mask
+            _use(offset)
+            data.append(image[offset:offset + cluster_size])
+
+    assert used == refcounts[:len(used)], 'refcounts do not match'
+    assert not any(refcounts[len(used):])
+    return ''.join(data)[:size]
+
+
+class Qcow2StreamTestCase(test.TestCase):
+
+    def _stream(self, data, cluster_bits=16):
+        volume = tempfile.NamedTemporaryFile()
+        self.addCleanup(volume.close)
+        volume.write(data)
+        volume.flush()
+        return qcow2.Qcow2Stream(volume.name, cluster_bits)
+
+    def test_sparse_volume(self):
+        data = ('a' * 1000 + '\0' * (3 * 65536 - 1000) + 'b' * 65536 +
+                '\0' * 65536 + 'c' * 10)
+        stream = self._stream(data)
+
+        self.assertEqual(6, stream.virtual_clusters)
+        self.assertEqual(3, stream.data_clusters)
+        image = stream.read()
+        self.assertEqual(stream.size, len(image))
+        self.assertEqual(data, _read_qcow2(image))
+
+    def test_empty_volume(self):
+        data = '\0' * (5 * 65536)
+        stream = self._stream(data)
+
+        self.assertEqual(0, stream.data_clusters)
+        image = stream.read()
+        # Header, L1 table, refcount table and one refcount block
+        self.assertEqual(4 * 65536, len(image))
+        self.assertEqual(data, _read_qcow2(image))
+
+    def test_many_tables(self):
+        # 512 byte clusters make 64 entry L1 table clusters and L2 tables
+        # and 256 entry refcount blocks, spread the image over several of
+        # each.
+        data = ''.join(chr(i % 250 + 1) * 512 if i % 3 else '\0' * 512
+                       for i in range(5000))
+        stream = self._stream(data, cluster_bits=9)
+
+        chunks = []
+        while True:
+            chunk = stream.read(1000)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        image = ''.join(chunks)
+        self.assertEqual(stream.size, len(image))
+        self.assertEqual(stream.size, stream.bytes_read)
+        self.assertGreater(stream._refcount_blocks, 1)
+        self.assertGreater(stream._l1_clusters, 1)
+        self.assertEqual(data, _read_qcow2(image))
+
+    def test_read_sizes(self):
+        data = 'a' * 65536 + '\0' * 65536 + 'b' * 100
+        image = self._stream(data).read()
+        stream = self._stream(data)
+
+        chunks = [stream.read(size) for size in (0, 1, 100000, 65535)]
+        chunks.append(stream.read())
+        self.assertEqual('', chunks[0])
+        self.assertEqual([1, 100000, 65535], map(len, chunks[1:4]))
+        self.assertEqual(image, ''.join(chunks))
+        self.assertEqual('', stream.read(10))
+
+    @testtools.skipUnless(spawn.find_executable('qemu-img'),
+                          'qemu-img is not installed')
+    def test_qemu_img_reads_image(self):
+        data = ''.join(chr(i % 250 + 1) * 65536 if i % 3 else '\0' * 65536
+                       for i in range(40)) + 'tail'
+        volume = tempfile.NamedTemporaryFile()
+        self.addCleanup(volume.close)
+        volume.write(data)
+        volume.flush()
+        image = tempfile.NamedTemporaryFile()
+        self.addCleanup(image.close)
+        image.write(qcow2.Qcow2Stream(volume.name).read())
+        image.flush()
+
+        processutils.execute('qemu-img', 'check', '-f', 'qcow2', image.name)
+        processutils.execute('qemu-img', 'compare', '-f', 'raw', '-F',
+                             'qcow2', volume.name, image.name)
@@ -16,9 +16,19 @@
 
 import time
 
+import mock
+
 from cinder import context
+from cinder import exception
+from cinder.openstack.common import processutils
+from cinder.openstack.common import units
 from cinder import test
+from cinder.volume import configuration as conf
+from cinder.volume.drivers import lvm
 from cinder.volume.flows.api import create_volume
+from cinder.volume.flows.manager import create_volume as \
+    manager_create_volume
+from cinder.volume import utils as volutils
 
 
 class fake_scheduler_rpc_api(object):
@@ -114,3 +124,192 @@ class CreateVolumeFlowTestCase(test.TestCase):
             fake_db())
 
         task._cast_create_volume(self.ctxt, spec, props)
+
+
+class CreateVolumeFlowManagerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(CreateVolumeFlowManagerTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.flags(cinder_internal_tenant_project_id='internal-project',
+                   cinder_internal_tenant_user_id='internal-user')
+        self.volumes = {}
+        self.mock_db = mock.Mock()
+        self.mock_db.volume_create.side_effect = self._volume_create
+        self.mock_db.volume_update.side_effect = self._volume_update
+        self.mock_db.volume_get.side_effect = self._volume_get
+        self.mock_driver = mock.Mock()
+        self.mock_driver.clone_image.return_value = (None, False)
+        self.mock_driver.create_volume.return_value = None
+        self.mock_cache = mock.Mock()
+        self.mock_cache.create_cache_entry.side_effect = self._cache_entry
+        self.mock_copy = mock.Mock()
+        self._create_task(self.mock_driver)
+        self.volumes['vol'] = {'id': 'vol', 'name': 'volume-vol',
+                               'host': 'host@lvm#pool', 'size': 10,
+                               'volume_type_id': None,
+                               'availability_zone': 'nova'}
+        self.image_meta = {'checksum': 'abc'}
+
+    def _create_task(self, driver):
+        self.task = manager_create_volume.CreateVolumeFromSpecTask(
+            self.mock_db, driver, self.mock_cache)
+        self.stubs.Set(self.task, '_handle_bootable_volume_glance_meta',
+                       mock.Mock())
+        self.stubs.Set(self.task, '_copy_image_to_volume', self.mock_copy)
+
+    def _volume_create(self, ctxt, values):
+        return self._volume_update(ctxt, 'cached', values)
+
+    def _volume_update(self, ctxt, volume_id, values):
+        volume = dict(self.volumes.get(volume_id, {}), id=volume_id,
+                      **values)
+        self.volumes[volume_id] = volume
+        return volume
+
+    def _volume_get(self, ctxt, volume_id):
+        return self.volumes[volume_id]
+
+    def _cache_entry(self, ctxt, image_volume, image_id, image_meta):
+        return {'volume_id': image_volume['id'], 'image_id': image_id,
+                'size': image_volume['size']}
+
+    def _create_from_image(self):
+        return self.task._create_from_image(
+            self.ctxt, self.volumes['vol'], image_location=None,
+            image_id='image', image_meta=self.image_meta,
+            image_service=mock.Mock())
+
+    def test_create_from_image_cache_hit(self):
+        self.mock_cache.get_entry.return_value = {'volume_id': 'cached',
+                                                  'image_id': 'image',
+                                                  'size': 5}
+        self.volumes['cached'] = {'id': 'cached', 'size': 5}
+        self.mock_driver.create_cloned_volume.return_value = {'a': 'b'}
+
+        self.assertEqual({'a': 'b'}, self._create_from_image())
+        self.mock_driver.create_cloned_volume.assert_called_once_with(
+            self.volumes['vol'], {'id': 'cached', 'size': 5})
+        self.assertFalse(self.mock_driver.create_volume.called)
+        self.assertFalse(self.mock_copy.called)
+        self.assertFalse(self.mock_cache.create_cache_entry.called)
+        self.assertFalse(self.mock_driver.extend_volume.called)
+
+    @mock.patch.object(volutils, 'copy_volume')
+    def test_create_from_image_cache_hit_lvm(self, mock_copy_volume):
+        lv_sizes = {}
+
+        def create_volume(name, size_str, *args):
+            lv_sizes[name] = size_str
+
+        def extend_volume(name, size_str):
+            if lv_sizes[name] == size_str:
+                raise processutils.ProcessExecutionError(
+                    stderr='New size given (2560 extents) not larger than '
+                           'existing size (2560 extents)')
+            lv_sizes[name] = size_str
+
+        vg = mock.Mock()
+        vg.create_volume.side_effect = create_volume
+        vg.extend_volume.side_effect = extend_volume
+        lvm_driver = lvm.LVMVolumeDriver(
+            configuration=conf.Configuration(None), vg_obj=vg)
+        self.stubs.Set(lvm_driver, 'delete_snapshot', mock.Mock())
+        self._create_task(lvm_driver)
+        self.mock_cache.get_entry.return_value = {'volume_id': 'cached',
+                                                  'image_id': 'image',
+                                                  'size': 5}
+        self.volumes['cached'] = {'id': 'cached', 'name': 'volume-cached',
+                                  'size': 5}
+
+        self._create_from_image()
+
+        self.assertEqual({'volume-vol': '10g'}, lv_sizes)
+        self.assertEqual(5 * units.Ki, mock_copy_volume.call_args[0][2])
+
+    @mock.patch.object(manager_create_volume, 'QUOTAS')
+    def test_create_from_image_cache_miss(self, mock_quotas):
+        self.mock_cache.get_entry.return_value = None
+        self.mock_cache.ensure_space.return_value = True
+
+        self._create_from_image()
+
+        self.mock_cache.ensure_space.assert_called_once_with(
+            mock.ANY, 10, 'host@lvm#pool')
+        image_volume = self.volumes['cached']
+        self.assertEqual('internal-project', image_volume['project_id'])
+        self.assertEqual('host@lvm#pool', image_volume['host'])
+        self.assertEqual('available', image_volume['status'])
+        self.mock_driver.create_volume.assert_called_once_with(mock.ANY)
+        self.assertEqual('cached',
+                         self.mock_driver.create_volume.call_args[0][0]['id'])
+        self.mock_copy.assert_called_once_with(self.ctxt, mock.ANY, 'image',
+                                               None, mock.ANY)
+        self.assertEqual('cached', self.mock_copy.call_args[0][1]['id'])
+        self.assertTrue(mock_quotas.commit.called)
+        self.mock_cache.create_cache_entry.assert_called_once_with(
+            mock.ANY, image_volume, 'image', self.image_meta)
+        self.mock_driver.create_cloned_volume.assert_called_once_with(
+            self.volumes['vol'], image_volume)
+        self.assertFalse(self.mock_driver.extend_volume.called)
+
+    @mock.patch.object(manager_create_volume, 'QUOTAS')
+    def test_create_from_image_cache_miss_sized_to_image(self, mock_quotas):
+        self.image_meta = {'checksum': 'abc', 'disk_format': 'raw',
+                           'size': 3 * units.Gi + 1}
+        self.mock_cache.get_entry.return_value = None
+        self.mock_cache.ensure_space.return_value = True
+
+        self._create_from_image()
+
+        self.mock_cache.ensure_space.assert_called_once_with(
+            mock.ANY, 4, 'host@lvm#pool')
+        self.assertEqual(4, self.volumes['cached']['size'])
+        mock_quotas.reserve.assert_called_once_with(mock.ANY, volumes=1,
+                                                    gigabytes=4)
+        self.mock_driver.create_cloned_volume.assert_called_once_with(
+            self.volumes['vol'], self.volumes['cached'])
+        self.assertEqual(10, self.volumes['vol']['size'])
+        self.assertNotIn('status', self.volumes['vol'])
+        self.assertFalse(self.mock_driver.extend_volume.called)
+
+    @mock.patch.object(manager_create_volume, 'QUOTAS')
+    def test_create_from_image_cache_entry_failure(self, mock_quotas):
+        self.mock_cache.get_entry.return_value = None
+        self.mock_cache.ensure_space.return_value = True
+        self.mock_copy.side_effect = [exception.ImageCopyFailure(
+            reason='fail'), None]
+
+        self._create_from_image()
+
+        self.assertEqual(2, self.mock_copy.call_count)
+        self.assertEqual('vol', self.mock_copy.call_args[0][1]['id'])
+        self.assertEqual('cached', self.mock_driver.delete_volume.call_args[
+            0][0]['id'])
+        self.mock_db.volume_destroy.assert_called_once_with(mock.ANY,
+                                                            'cached')
+        self.assertTrue(mock_quotas.rollback.called)
+        self.assertFalse(self.mock_cache.create_cache_entry.called)
+        self.assertFalse(self.mock_driver.create_cloned_volume.called)
+        self.assertEqual('downloading', self.volumes['vol']['status'])
+
+    def test_create_from_image_no_cache_space(self):
+        self.mock_cache.get_entry.return_value = None
+        self.mock_cache.ensure_space.return_value = False
+        volume = self.volumes['vol']
+
+        self._create_from_image()
+
+        self.mock_driver.create_volume.assert_called_once_with(volume)
+        self.assertEqual('vol', self.mock_copy.call_args[0][1]['id'])
+        self.assertFalse(self.mock_db.volume_create.called)
+        self.assertFalse(self.mock_cache.create_cache_entry.called)
+
+    def test_create_from_image_no_internal_tenant(self):
+        self.flags(cinder_internal_tenant_project_id=None)
+
+        self._create_from_image()
+
+        self.assertTrue(self.mock_copy.called)
+        self.assertFalse(self.mock_cache.get_entry.called)
+        self.assertFalse(self.mock_cache.create_cache_entry.called)
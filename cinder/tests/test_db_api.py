@@ -16,11 +16,17 @@
 
 import datetime
 
+import mock
 from oslo.config import cfg
+from oslo.db import exception as db_exc
+import sqlalchemy
 
 from cinder import context
 from cinder import db
+from cinder.db.sqlalchemy import api as sqlalchemy_api
+from cinder.db.sqlalchemy import models
 from cinder import exception
+from cinder.openstack.common import timeutils
 from cinder.openstack.common import uuidutils
 from cinder.quota import ReservableResource
 from cinder import test
@@ -149,6 +155,23 @@ class DBAPIServiceTestCase(BaseTest):
         self.assertRaises(exception.ServiceNotFound,
                           db.service_update, self.ctxt, 100500, {})
 
+    def test_service_heartbeat(self):
+        service1 = self._create_service({})
+        service2 = self._create_service({'host': 'fake_host2'})
+        service3 = self._create_service({'host': 'fake_host3'})
+        db.service_destroy(self.ctxt, service3['id'])
+
+        updated = db.service_heartbeat(self.ctxt, [service1['id'],
+                                                   service2['id'],
+                                                   service3['id']])
+
+        self.assertEqual(2, updated)
+        for service in (service1, service2):
+            real_service = db.service_get(self.ctxt, service['id'])
+            self.assertEqual(4, real_service['report_count'])
+            self.assertIsNotNone(real_service['updated_at'])
+        self.assertEqual(0, db.service_heartbeat(self.ctxt, []))
+
     def test_service_get(self):
         service1 = self._create_service({})
         real_service1 = db.service_get(self.ctxt, service1['id'])
@@ -346,6 +369,25 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualObjects(volume, db.volume_get(self.ctxt,
                                                        volume['id']))
 
+    def test_volume_get_version(self):
+        volume = db.volume_create(self.ctxt, {'status': 'creating'})
+        version = db.volume_get_version(self.ctxt, volume['id'])
+        self.assertEqual('creating', version['status'])
+        self.assertIsNone(version['metadata_updated_at'])
+
+        db.volume_update(self.ctxt, volume['id'], {'status': 'available'})
+        updated = db.volume_get_version(self.ctxt, volume['id'])
+        self.assertEqual('available', updated['status'])
+        self.assertNotEqual(version, updated)
+
+        db.volume_metadata_update(self.ctxt, volume['id'], {'a': 'b'}, False)
+        self.assertIsNotNone(db.volume_get_version(
+            self.ctxt, volume['id'])['metadata_updated_at'])
+
+    def test_volume_get_version_not_found(self):
+        self.assertRaises(exception.VolumeNotFound, db.volume_get_version,
+                          self.ctxt, 'fake-id')
+
     def test_volume_destroy(self):
         volume = db.volume_create(self.ctxt, {})
         db.volume_destroy(self.ctxt, volume['id'])
@@ -395,6 +437,30 @@ class DBAPIVolumeTestCase(BaseTest):
                                         db.volume_get_all_by_host(
                                         self.ctxt, 'foo'))
 
+    def test_volume_get_all_by_host_use_slave(self):
+        volume = db.volume_create(self.ctxt, {'host': 'h1'})
+        facade = sqlalchemy_api._create_facade_lazily()
+        get_session = facade.get_session
+        calls = []
+
+        def fake_get_session(use_slave=False, **kwargs):
+            calls.append(use_slave)
+            return get_session(use_slave=use_slave, **kwargs)
+
+        self.stubs.Set(facade, 'get_session', fake_get_session)
+        self._assertEqualListsOfObjects(
+            [volume], db.volume_get_all_by_host(self.ctxt, 'h1',
+                                                use_slave=True))
+        self.assertTrue(calls)
+        self.assertTrue(all(calls))
+
+        # The slave is only used for the duration of the read-only call.
+        del calls[:]
+        db.volume_get(self.ctxt, volume['id'])
+        db.volume_get_all_by_host(self.ctxt, 'h1')
+        self.assertTrue(calls)
+        self.assertFalse(any(calls))
+
     def test_volume_get_all_by_project(self):
         volumes = []
         for i in xrange(3):
@@ -710,6 +776,38 @@ class DBAPIVolumeTestCase(BaseTest):
 
         self.assertEqual(should_be, db_meta)
 
+    def test_volume_metadata_update_bulk(self):
+        db.volume_create(self.ctxt, {'id': 1,
+                                     'metadata': {'a': '1', 'b': '2',
+                                                  'c': '3'}})
+        metadata = dict(('key%d' % i, str(i)) for i in range(40))
+        metadata.update({'a': '1', 'b': '20'})
+
+        statements = []
+
+        def _count_statement(conn, cursor, statement, parameters,
+                             context, executemany):
+            statements.append(statement)
+
+        engine = sqlalchemy_api.get_engine()
+        sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                                _count_statement)
+        self.addCleanup(sqlalchemy.event.remove, engine,
+                        'before_cursor_execute', _count_statement)
+
+        db_meta = db.volume_metadata_update(self.ctxt, 1, metadata, True)
+
+        self.assertEqual(metadata, db_meta)
+        writes = [s for s in statements
+                  if s.startswith(('INSERT', 'UPDATE'))]
+        # one soft delete, one value update and one insert for all new keys
+        self.assertEqual(3, len(writes))
+        deleted = sqlalchemy_api.model_query(
+            self.ctxt, models.VolumeMetadata, read_deleted='only').\
+            filter_by(volume_id=1).all()
+        self.assertEqual(['c'], [row['key'] for row in deleted])
+        self.assertIsNotNone(deleted[0]['deleted_at'])
+
     def test_volume_metadata_delete(self):
         metadata = {'a': 'b', 'c': 'd'}
         db.volume_create(self.ctxt, {'id': 1, 'metadata': metadata})
@@ -734,6 +832,18 @@ class DBAPISnapshotTestCase(BaseTest):
         actual = db.snapshot_data_get_for_project(self.ctxt, 'project1')
         self.assertEqual(actual, (1, 42))
 
+    def test_snapshot_get_version(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        db.snapshot_create(self.ctxt, {'id': 1, 'volume_id': 1,
+                                       'status': 'creating'})
+        version = db.snapshot_get_version(self.ctxt, 1)
+        self.assertEqual('creating', version['status'])
+
+        db.snapshot_update(self.ctxt, 1, {'progress': '50%'})
+        updated = db.snapshot_get_version(self.ctxt, 1)
+        self.assertEqual('50%', updated['progress'])
+        self.assertNotEqual(version, updated)
+
     def test_snapshot_get_all(self):
         db.volume_create(self.ctxt, {'id': 1})
         snapshot = db.snapshot_create(self.ctxt, {'id': 1, 'volume_id': 1})
@@ -741,6 +851,67 @@ class DBAPISnapshotTestCase(BaseTest):
                                         db.snapshot_get_all(self.ctxt),
                                         ignored_keys=['metadata', 'volume'])
 
+    def test_snapshot_get_all_with_filters(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        db.volume_create(self.ctxt, {'id': 2})
+        snap1 = db.snapshot_create(self.ctxt, {'id': 1, 'volume_id': 1,
+                                               'status': 'available',
+                                               'metadata': {'k': 'v'}})
+        snap2 = db.snapshot_create(self.ctxt, {'id': 2, 'volume_id': 2,
+                                               'status': 'available'})
+        db.snapshot_create(self.ctxt, {'id': 3, 'volume_id': 2,
+                                       'status': 'creating'})
+
+        def _get(filters):
+            return db.snapshot_get_all(self.ctxt, sort_key='id',
+                                       sort_dir='asc', filters=filters)
+
+        self._assertEqualListsOfObjects(
+            [snap1, snap2], _get({'status': 'available'}),
+            ignored_keys=['metadata', 'volume', 'snapshot_metadata'])
+        self._assertEqualListsOfObjects(
+            [snap2], _get({'status': 'available', 'volume_id': 2}),
+            ignored_keys=['metadata', 'volume', 'snapshot_metadata'])
+        self._assertEqualListsOfObjects(
+            [snap1], _get({'metadata': {'k': 'v'}}),
+            ignored_keys=['metadata', 'volume', 'snapshot_metadata'])
+        self.assertEqual([], _get({'status': ['error', 'deleting']}))
+        self.assertEqual([], _get({'no_such_column': 'foo'}))
+        self.assertEqual([], _get({'volume': 'foo'}))
+
+    def test_snapshot_get_all_with_pagination(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        for i in range(1, 6):
+            db.snapshot_create(self.ctxt, {'id': i, 'volume_id': 1})
+
+        page = db.snapshot_get_all(self.ctxt, limit=2, sort_key='id',
+                                   sort_dir='asc')
+        self.assertEqual(['1', '2'], [s['id'] for s in page])
+        page = db.snapshot_get_all(self.ctxt, marker='2', limit=2,
+                                   sort_key='id', sort_dir='asc')
+        self.assertEqual(['3', '4'], [s['id'] for s in page])
+
+    def test_snapshot_get_all_by_project_with_filters(self):
+        db.volume_create(self.ctxt, {'id': 1})
+        db.snapshot_create(self.ctxt, {'id': 1, 'volume_id': 1,
+                                       'project_id': 'project1',
+                                       'display_name': 'snap1'})
+        db.snapshot_create(self.ctxt, {'id': 2, 'volume_id': 1,
+                                       'project_id': 'project1',
+                                       'display_name': 'snap2'})
+        db.snapshot_create(self.ctxt, {'id': 3, 'volume_id': 1,
+                                       'project_id': 'project2',
+                                       'display_name': 'snap1'})
+
+        result = db.snapshot_get_all_by_project(
+            self.ctxt, 'project1', filters={'display_name': 'snap1'})
+        self.assertEqual(['1'], [s['id'] for s in result])
+        # the project filter cannot be overridden by the given filters
+        result = db.snapshot_get_all_by_project(
+            self.ctxt, 'project1', sort_key='id', sort_dir='asc',
+            filters={'project_id': 'project2'})
+        self.assertEqual(['1', '2'], [s['id'] for s in result])
+
     def test_snapshot_metadata_get(self):
         metadata = {'a': 'b', 'c': 'd'}
         db.volume_create(self.ctxt, {'id': 1})
@@ -1258,3 +1429,222 @@ class DBAPIBackupTestCase(BaseTest):
     def test_backup_not_found(self):
         self.assertRaises(exception.BackupNotFound, db.backup_get, self.ctxt,
                           'notinbase')
+
+
+class DBAPIRateLimitTestCase(BaseTest):
+
+    """Tests for db.api.rate_limit_* methods."""
+
+    def setUp(self):
+        super(DBAPIRateLimitTestCase, self).setUp()
+        self.time = 1000.0
+        self.stubs.Set(sqlalchemy_api.time, 'time', lambda: self.time)
+
+    def test_rate_limit_consume(self):
+        self.assertEqual((4, 6, 0),
+                         db.rate_limit_consume(self.ctxt, 'key', 10, 1, 4))
+        self.assertEqual((6, 0, 0),
+                         db.rate_limit_consume(self.ctxt, 'key', 10, 1, 8))
+        self.assertEqual((0, 0, 1),
+                         db.rate_limit_consume(self.ctxt, 'key', 10, 1, 1))
+        # Other buckets are independent.
+        self.assertEqual((1, 9, 0),
+                         db.rate_limit_consume(self.ctxt, 'other', 10, 1, 1))
+
+    def test_rate_limit_consume_refill(self):
+        db.rate_limit_consume(self.ctxt, 'key', 10, 0.5, 10)
+        self.time += 3
+        self.assertEqual((1, 0.5, 0),
+                         db.rate_limit_consume(self.ctxt, 'key', 10, 0.5, 5))
+        self.assertEqual((0, 0.5, 1),
+                         db.rate_limit_consume(self.ctxt, 'key', 10, 0.5, 5))
+        # The bucket never fills above its capacity.
+        self.time += 1000
+        self.assertEqual((10, 0, 0),
+                         db.rate_limit_consume(self.ctxt, 'key', 10, 0.5, 20))
+
+    def test_rate_limit_consume_deleted_bucket(self):
+        db.rate_limit_consume(self.ctxt, 'key', 10, 1, 10)
+        session = sqlalchemy_api.get_session()
+        session.query(models.RateLimitBucket).update({'deleted': True})
+        self.assertEqual((4, 6, 0),
+                         db.rate_limit_consume(self.ctxt, 'key', 10, 1, 4))
+
+    def test_rate_limit_consume_duplicate_gives_up(self):
+        consume = mock.Mock(side_effect=db_exc.DBDuplicateEntry())
+        self.stubs.Set(sqlalchemy_api, '_rate_limit_consume', consume)
+        self.assertRaises(db_exc.DBDuplicateEntry, db.rate_limit_consume,
+                          self.ctxt, 'key', 10, 1, 1)
+        self.assertEqual(2, consume.call_count)
+
+    def test_rate_limit_purge(self):
+        db.rate_limit_consume(self.ctxt, 'old', 10, 1, 10)
+        self.time += 60
+        db.rate_limit_consume(self.ctxt, 'new', 10, 1, 10)
+        self.time += 30
+
+        self.assertEqual(1, db.rate_limit_purge(self.ctxt, 60))
+        # The purged bucket comes back full, the other one is kept.
+        self.assertEqual((10, 0, 0),
+                         db.rate_limit_consume(self.ctxt, 'old', 10, 1, 20))
+        self.assertEqual((10, 0, 0),
+                         db.rate_limit_consume(self.ctxt, 'new', 10, 1, 20))
+
+
+class DBAPIPurgeTestCase(BaseTest):
+
+    """Tests for cinder.db.api.purge_deleted_rows and archive_deleted_rows."""
+
+    def setUp(self):
+        super(DBAPIPurgeTestCase, self).setUp()
+        self.old = timeutils.utcnow() - datetime.timedelta(days=40)
+        for i in range(3):
+            db.volume_create(self.ctxt, {'id': 'vol%d' % i,
+                                         'metadata': {'a': 'b'}})
+        db.snapshot_create(self.ctxt, {'id': 'snap0', 'volume_id': 'vol1'})
+        for volume_id in ('vol0', 'vol1'):
+            db.volume_destroy(self.ctxt, volume_id)
+        self._age_deleted_rows()
+
+    def _age_deleted_rows(self):
+        for model in (models.Volume, models.VolumeMetadata):
+            sqlalchemy_api.model_query(self.ctxt, model,
+                                       read_deleted='only').\
+                update({'deleted_at': self.old}, synchronize_session=False)
+
+    def _ids(self, table):
+        engine = sqlalchemy_api.get_engine()
+        return sorted(row[0] for row in
+                      engine.execute(sqlalchemy.text('SELECT id FROM ' +
+                                                     table)))
+
+    def test_purge_deleted_rows(self):
+        counts = db.purge_deleted_rows(self.ctxt, 30, batch_size=1)
+
+        # vol1 is still referenced by a live snapshot
+        self.assertEqual(['vol1', 'vol2'], self._ids('volumes'))
+        self.assertEqual(1, counts['volumes'])
+        self.assertEqual(2, counts['volume_metadata'])
+        self.assertEqual(1, len(self._ids('volume_metadata')))
+
+    def test_purge_deleted_rows_honours_age(self):
+        counts = db.purge_deleted_rows(self.ctxt, 50)
+
+        self.assertEqual(['vol0', 'vol1', 'vol2'], self._ids('volumes'))
+        self.assertEqual(0, counts['volumes'])
+
+    def test_purge_deleted_rows_throttles_full_batches(self):
+        sleeps = []
+        self.stubs.Set(sqlalchemy_api.time, 'sleep', sleeps.append)
+
+        db.purge_deleted_rows(self.ctxt, 30, batch_size=1, throttle=0.5)
+
+        # volume_metadata fills two batches of one and volumes one
+        self.assertEqual(3, sleeps.count(0.5))
+
+    def test_archive_deleted_rows(self):
+        counts = db.archive_deleted_rows(self.ctxt, 30)
+
+        self.assertEqual(['vol1', 'vol2'], self._ids('volumes'))
+        self.assertEqual(['vol0'], self._ids('shadow_volumes'))
+        self.assertEqual(1, counts['volumes'])
+        self.assertEqual(2, len(self._ids('shadow_volume_metadata')))
+
+
+class DBAPIHostResourceTestCase(BaseTest):
+
+    """Tests for cinder.db.api.host_resource_*."""
+
+    def setUp(self):
+        super(DBAPIHostResourceTestCase, self).setUp()
+        for i, host in enumerate(['h1@lvm', 'h1@lvm#pool', 'h1@lvm#pool',
+                                  'h1@lvm2', 'h1Xlvm']):
+            db.volume_create(self.ctxt, {'id': 'vol%d' % i, 'host': host})
+        db.consistencygroup_create(self.ctxt, {'host': 'h1@lvm#pool'})
+        db.backup_create(self.ctxt, {'volume_id': 'vol0', 'host': 'h2'})
+
+    def test_host_resource_counts(self):
+        self.assertEqual([('consistencygroups', 'h1@lvm#pool', 1),
+                          ('volumes', 'h1@lvm', 1),
+                          ('volumes', 'h1@lvm#pool', 2)],
+                         db.host_resource_counts(self.ctxt, 'h1@lvm'))
+
+    def test_host_resource_counts_like_wildcards(self):
+        self.assertEqual([], db.host_resource_counts(self.ctxt, 'h1_lvm'))
+
+    def test_volume_capacity_get_by_host(self):
+        db.volume_create(self.ctxt, {'host': 'h1@lvm#pool', 'size': 5,
+                                     'status': 'error'})
+        db.volume_update(self.ctxt, 'vol1', {'size': 2,
+                                             'status': 'available'})
+        db.volume_update(self.ctxt, 'vol2', {'size': 3})
+        self.assertEqual([('h1@lvm', 0), ('h1@lvm#pool', 10)],
+                         db.volume_capacity_get_by_host(self.ctxt, 'h1@lvm'))
+        self.assertEqual([('h1@lvm#pool', 2)],
+                         db.volume_capacity_get_by_host(
+                             self.ctxt, 'h1@lvm', statuses=['available']))
+
+    def test_host_resource_rename(self):
+        result = db.host_resource_rename(
+            self.ctxt, [('volumes', 'h1@lvm#pool', 'h3@lvm#pool'),
+                        ('consistencygroups', 'h1@lvm#pool', 'h3@lvm#pool'),
+                        ('backups', 'h2', 'h4')])
+
+        self.assertEqual([('volumes', 'h1@lvm#pool', 'h3@lvm#pool', 2),
+                          ('consistencygroups', 'h1@lvm#pool',
+                           'h3@lvm#pool', 1),
+                          ('backups', 'h2', 'h4', 1)], result)
+        self.assertEqual(['vol1', 'vol2'],
+                         sorted(v['id'] for v in db.volume_get_all_by_host(
+                             self.ctxt, 'h3@lvm')))
+        self.assertEqual('h1@lvm', db.volume_get(self.ctxt, 'vol0')['host'])
+        self.assertEqual('h4', db.backup_get_all(self.ctxt)[0]['host'])
+
+
+class DBAPIImageVolumeCacheTestCase(BaseTest):
+
+    """Tests for cinder.db.api.image_volume_cache_*."""
+
+    def _create_entry(self, volume_id, host='host@lvm#pool',
+                      image_id='image'):
+        return db.image_volume_cache_create(
+            self.ctxt, host, image_id, datetime.datetime(2014, 10, 1),
+            'abc', volume_id, 10)
+
+    def test_image_volume_cache_get_and_update_last_used(self):
+        timeutils.set_time_override(datetime.datetime(2014, 1, 1))
+        self.addCleanup(timeutils.clear_time_override)
+        self._create_entry('vol1')
+        self._create_entry('vol2', host='otherhost')
+
+        timeutils.advance_time_seconds(60)
+        entry = db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'image', 'host@lvm#pool')
+        self.assertEqual('vol1', entry['volume_id'])
+        self.assertEqual(datetime.datetime(2014, 1, 1, 0, 1),
+                         entry['last_used'])
+        self.assertIsNone(db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'other-image', 'host@lvm#pool'))
+
+    def test_image_volume_cache_get_all_for_host(self):
+        timeutils.set_time_override(datetime.datetime(2014, 1, 1))
+        self.addCleanup(timeutils.clear_time_override)
+        for volume_id in ('vol1', 'vol2', 'vol3'):
+            self._create_entry(volume_id, image_id=volume_id)
+            timeutils.advance_time_seconds(60)
+        db.image_volume_cache_get_and_update_last_used(
+            self.ctxt, 'vol1', 'host@lvm#pool')
+
+        entries = db.image_volume_cache_get_all_for_host(self.ctxt,
+                                                         'host@lvm#pool')
+        self.assertEqual(['vol1', 'vol3', 'vol2'],
+                         [entry['volume_id'] for entry in entries])
+
+    def test_image_volume_cache_delete(self):
+        self._create_entry('vol1')
+        self.assertEqual('image', db.image_volume_cache_get_by_volume_id(
+            self.ctxt, 'vol1')['image_id'])
+
+        db.image_volume_cache_delete(self.ctxt, 'vol1')
+        self.assertIsNone(db.image_volume_cache_get_by_volume_id(self.ctxt,
+                                                                 'vol1'))
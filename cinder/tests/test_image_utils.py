@@ -16,8 +16,11 @@
 """Unit tests for image utils."""
 
 import contextlib
+import os
 import tempfile
 
+import eventlet
+from eventlet import event
 import mock
 import mox
 from oslo.config import cfg
@@ -60,6 +63,7 @@ class TestUtils(test.TestCase):
         super(TestUtils, self).setUp()
         self._mox = mox.Mox()
         self._image_service = FakeImageService()
+        self.stubs.Set(image_utils, '_qemu_img_installed', False)
 
         self.addCleanup(self._mox.UnsetStubs)
 
@@ -562,6 +566,314 @@ class TestUtils(test.TestCase):
                           image_meta, '/dev/loop1')
         m.VerifyAll()
 
+    def test_upload_volume_streams_qcow2(self):
+        self.flags(image_upload_stream_qcow2=True)
+        image_meta = {'id': 1, 'disk_format': 'qcow2'}
+        image_service = mock.Mock()
+        image_service.update.side_effect = (
+            lambda context, image_id, meta, data: data.read())
+        m = self._mox
+        m.StubOutWithMock(utils, 'execute')
+        m.ReplayAll()
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write('x' * 100000)
+            f.flush()
+            image_utils.upload_volume(context, image_service, image_meta,
+                                      f.name)
+
+        image_file = image_service.update.call_args[0][3]
+        self.assertEqual(2, image_file.data_clusters)
+        self.assertEqual(image_file.size, image_file.bytes_read)
+        m.VerifyAll()
+
+
+class RawFakeImageService(FakeImageService):
+    def __init__(self, data):
+        self.data = data
+
+    def download(self, context, image_id, data):
+        for i in range(0, len(self.data), 1000):
+            data.write(self.data[i:i + 1000])
+
+    def show(self, context, image_id):
+        return {'size': len(self.data),
+                'disk_format': 'raw',
+                'container_format': 'bare'}
+
+
+class TestStreamRawImage(test.TestCase):
+
+    def setUp(self):
+        super(TestStreamRawImage, self).setUp()
+        self.dest = tempfile.NamedTemporaryFile()
+        self.addCleanup(self.dest.close)
+        self.stubs.Set(utils, 'is_blk_device', lambda path: True)
+        self.mock_execute = mock.Mock()
+        self.stubs.Set(utils, 'execute', self.mock_execute)
+
+    def _fetch_to_raw(self, data, size=None):
+        image_utils.fetch_to_raw(context, RawFakeImageService(data), 'image',
+                                 self.dest.name, '4k', size=size)
+
+    def test_fetch_to_raw_streams_raw_image(self):
+        data = ''.join(chr(i % 251) for i in range(10000))
+        self._fetch_to_raw(data)
+
+        with open(self.dest.name, 'rb') as dest:
+            self.assertEqual(data, dest.read())
+        self.assertFalse(self.mock_execute.called)
+
+    def test_fetch_to_raw_stream_sparse(self):
+        # Blocks that are skipped keep what the volume held before
+        self.dest.write('x' * 16384)
+        self.dest.flush()
+        data = 'a' * 4096 + '\0' * 8192 + 'b' * 10
+        with mock.patch.object(image_utils, 'RawImageWriter',
+                               wraps=image_utils.RawImageWriter) as writer:
+            image_utils.fetch_to_raw(context, RawFakeImageService(data),
+                                     'image', self.dest.name, '4096',
+                                     sparse=True)
+
+        with open(self.dest.name, 'rb') as dest:
+            self.assertEqual('a' * 4096 + 'x' * 8192 + 'b' * 10 +
+                             'x' * 4086, dest.read())
+        writer.assert_called_once_with(self.dest.name, 4096, True)
+
+    def test_raw_image_writer_counts_skipped_bytes(self):
+        writer = image_utils.RawImageWriter(self.dest.name, 4096,
+                                            sparse=True)
+        writer.write('\0' * 8192 + 'a' * 4096)
+        writer.close()
+        self.assertEqual(4096, writer.bytes_written)
+        self.assertEqual(8192, writer.bytes_skipped)
+
+    def test_raw_image_writer_direct_tail_not_padded(self):
+        # The tail of an O_DIRECT write would have to be padded to the
+        # logical block size, it is written through the page cache.
+        self.dest.write('x' * 16384)
+        self.dest.flush()
+        writer = image_utils.RawImageWriter(self.dest.name, 4096)
+
+        def _open():
+            writer._fd = os.open(self.dest.name, os.O_WRONLY)
+            writer.direct = True
+
+        with mock.patch.object(writer, '_open', side_effect=_open):
+            writer.write('a' * 5000)
+            writer.close()
+
+        with open(self.dest.name, 'rb') as dest:
+            self.assertEqual('a' * 5000 + 'x' * 11384, dest.read())
+        self.assertEqual(5000, writer.bytes_written)
+
+    def test_fetch_to_raw_unknown_size_does_not_stream(self):
+        image_service = RawFakeImageService('x' * 10000)
+        with contextlib.nested(
+            mock.patch.object(image_service, 'show', return_value={
+                'size': None, 'disk_format': 'raw',
+                'container_format': 'bare'}),
+            mock.patch.object(image_utils, 'temporary_file',
+                              side_effect=test.TestingException())):
+            self.assertRaises(test.TestingException,
+                              image_utils.fetch_to_raw, context,
+                              image_service, 'image', self.dest.name, '4k')
+
+    def test_fetch_to_raw_stream_image_too_large(self):
+        self.assertRaises(exception.ImageUnacceptable,
+                          self._fetch_to_raw, 'x' * 10000, size=0)
+
+    @mock.patch.object(image_utils, 'temporary_file')
+    def test_fetch_to_raw_stream_falls_back_on_other_format(self,
+                                                            mock_temp):
+        mock_temp.side_effect = test.TestingException()
+        self.assertRaises(test.TestingException, self._fetch_to_raw,
+                          'QFI\xfb' + 'x' * 10000)
+
+        with open(self.dest.name, 'rb') as dest:
+            self.assertEqual('', dest.read())
+
+    def test_fetch_to_raw_with_bps_limit_does_not_stream(self):
+        self.flags(volume_copy_bps_limit=1048576)
+        with mock.patch.object(image_utils, 'temporary_file') as mock_temp:
+            mock_temp.side_effect = test.TestingException()
+            self.assertRaises(test.TestingException, self._fetch_to_raw,
+                              'x' * 10000)
+
+    def test_detect_image_format(self):
+        self.assertEqual('qcow', image_utils.detect_image_format(
+            'QFI\xfb\0\0\0\x03'))
+        self.assertEqual('vdi', image_utils.detect_image_format(
+            '<<< Oracle VM VirtualBox Disk Image >>>\n'.ljust(0x40, '\0') +
+            '\x7f\x10\xda\xbe'))
+        self.assertIsNone(image_utils.detect_image_format('\0' * 512))
+
+
+class TestImageInspection(test.TestCase):
+
+    def setUp(self):
+        super(TestImageInspection, self).setUp()
+        self.stubs.Set(image_utils, '_qemu_img_installed', False)
+        self.stubs.Set(image_utils, '_image_info_cache',
+                       image_utils.collections.OrderedDict())
+
+    @mock.patch.object(image_utils, 'qemu_img_info')
+    def test_check_qemu_img_installed_probes_once(self, mock_info):
+        self.assertTrue(image_utils.check_qemu_img_installed('/tmp/a'))
+        self.assertTrue(image_utils.check_qemu_img_installed('/tmp/b'))
+        mock_info.assert_called_once_with('/tmp/a')
+
+    @mock.patch.object(image_utils, 'qemu_img_info')
+    def test_check_qemu_img_not_installed_probes_again(self, mock_info):
+        mock_info.side_effect = processutils.ProcessExecutionError()
+        self.assertFalse(image_utils.check_qemu_img_installed('/tmp/a'))
+        self.assertFalse(image_utils.check_qemu_img_installed('/tmp/a'))
+        self.assertEqual(2, mock_info.call_count)
+
+    @mock.patch.object(image_utils, 'qemu_img_info')
+    def test_downloaded_image_info_cached_by_checksum(self, mock_info):
+        image_meta = {'checksum': 'abc'}
+        info = image_utils.downloaded_image_info('image', image_meta, '/a')
+        self.assertEqual(info, image_utils.downloaded_image_info(
+            'image', image_meta, '/b'))
+        mock_info.assert_called_once_with('/a')
+
+        image_utils.downloaded_image_info('image', {'checksum': 'def'}, '/c')
+        image_utils.downloaded_image_info('image', {}, '/d')
+        image_utils.downloaded_image_info('image', {}, '/d')
+        self.assertEqual(4, mock_info.call_count)
+
+    @mock.patch.object(image_utils, 'qemu_img_info')
+    def test_downloaded_image_info_cache_size(self, mock_info):
+        self.stubs.Set(image_utils, 'IMAGE_INFO_CACHE_SIZE', 2)
+        for image_id in ('a', 'b', 'a', 'c', 'a', 'b'):
+            image_utils.downloaded_image_info(image_id, {'checksum': 'x'},
+                                              image_id)
+        self.assertEqual([mock.call('a'), mock.call('b'), mock.call('c'),
+                          mock.call('b')], mock_info.call_args_list)
+
+    @mock.patch.object(image_utils, 'convert_image')
+    @mock.patch.object(image_utils,
+                       'replace_xenserver_image_with_coalesced_vhd')
+    @mock.patch.object(image_utils, 'fetch')
+    @mock.patch.object(image_utils, 'qemu_img_info')
+    def test_fetch_to_volume_format_shows_image_once(self, mock_info,
+                                                     mock_fetch,
+                                                     mock_replace,
+                                                     mock_convert):
+        image_service = mock.Mock()
+        image_service.show.return_value = {'disk_format': 'vhd',
+                                           'container_format': 'ovf',
+                                           'checksum': 'abc'}
+        mock_info.return_value.virtual_size = units.Gi
+        mock_info.return_value.file_format = 'vpc'
+        mock_info.return_value.backing_file = None
+
+        image_utils.fetch_to_vhd(context, image_service, 'image', '/dest',
+                                 None)
+
+        image_service.show.assert_called_once_with(context, 'image')
+        self.assertTrue(mock_replace.called)
+        self.assertTrue(mock_convert.called)
+
+
+class TestConversionScheduler(test.TestCase):
+
+    def setUp(self):
+        super(TestConversionScheduler, self).setUp()
+        self.scheduler = image_utils.ConversionScheduler()
+        self.events = []
+
+    def _convert(self, name, scratch_size, release):
+        with self.scheduler.admit(scratch_size):
+            self.events.append(name)
+            release.wait()
+            self.events.append(name + ' done')
+
+    def _spawn(self, name, scratch_size):
+        release = event.Event()
+        eventlet.spawn(self._convert, name, scratch_size, release)
+        self._settle()
+        return release
+
+    def _settle(self):
+        for i in range(5):
+            eventlet.sleep(0)
+
+    def test_concurrency_limit(self):
+        self.flags(image_conversion_concurrency=2)
+        releases = [self._spawn(name, 0) for name in 'abcd']
+        self.assertEqual(['a', 'b'], self.events)
+        self.assertEqual(2, self.scheduler.stats()['queued'])
+
+        releases[1].send()
+        self._settle()
+        self.assertEqual(['a', 'b', 'b done', 'c'], self.events)
+
+        for release in (releases[0], releases[2], releases[3]):
+            release.send()
+        self._settle()
+        self.assertEqual(['a', 'b', 'b done', 'c', 'a done', 'c done', 'd',
+                          'd done'], self.events)
+        stats = self.scheduler.stats()
+        self.assertEqual((0, 0, 0, 4, 2),
+                         (stats['running'], stats['queued'],
+                          stats['reserved_bytes'], stats['admitted'],
+                          stats['waited']))
+
+    @mock.patch.object(image_utils.ConversionScheduler, '_free_space',
+                       return_value=10)
+    def test_waits_for_scratch_space_in_order(self, mock_free):
+        releases = [self._spawn('a', 8), self._spawn('b', 5),
+                    self._spawn('c', 1)]
+        self.assertEqual(['a'], self.events)
+        self.assertEqual(8, self.scheduler.stats()['reserved_bytes'])
+
+        releases[0].send()
+        self._settle()
+        self.assertEqual(['a', 'a done', 'b', 'c'], self.events)
+        self.assertEqual(6, self.scheduler.stats()['reserved_bytes'])
+
+        releases[1].send()
+        releases[2].send()
+        self._settle()
+        self.assertEqual(0, self.scheduler.stats()['running'])
+
+    @mock.patch.object(image_utils.ConversionScheduler, '_free_space',
+                       return_value=10)
+    def test_written_scratch_space_not_claimed_twice(self, mock_free):
+        # Free space has already shrunk by what running conversions wrote.
+        scratch = tempfile.NamedTemporaryFile()
+        self.addCleanup(scratch.close)
+        scratch.write('x' * 6)
+        scratch.flush()
+        with self.scheduler.admit(8, scratch.name):
+            release = self._spawn('a', 8)
+            self.assertEqual(['a'], self.events)
+            release.send()
+            self._settle()
+
+    @mock.patch.object(image_utils.ConversionScheduler, '_free_space',
+                       return_value=10)
+    def test_single_conversion_always_admitted(self, mock_free):
+        self._spawn('a', 100).send()
+        self._settle()
+        self.assertEqual(['a', 'a done'], self.events)
+        self.assertFalse(mock_free.called)
+
+    def test_killed_waiter_leaves_queue(self):
+        self.flags(image_conversion_concurrency=1)
+        release = self._spawn('a', 0)
+        waiter = eventlet.spawn(self._convert, 'b', 0, event.Event())
+        self._settle()
+        waiter.kill()
+        self.assertEqual(0, self.scheduler.stats()['queued'])
+
+        release.send()
+        self._settle()
+        self.assertEqual(['a', 'a done'], self.events)
+        self.assertEqual(0, self.scheduler.stats()['running'])
+
 
 class TestExtractTo(test.TestCase):
     def test_extract_to_calls_tar(self):
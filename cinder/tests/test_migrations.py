@@ -1298,3 +1298,116 @@ class TestMigrations(test.TestCase):
                 execute().scalar()
 
             self.assertEqual(4, num_defaults)
+
+    def test_migration_027(self):
+        """Test adding table for shared rate limit buckets."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.db_initial_version())
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 26)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 27)
+
+            self.assertTrue(engine.dialect.has_table(engine.connect(),
+                                                     "rate_limit_buckets"))
+            buckets = sqlalchemy.Table('rate_limit_buckets',
+                                       metadata,
+                                       autoload=True)
+            self.assertIsInstance(buckets.c.bucket_key.type,
+                                  sqlalchemy.types.VARCHAR)
+            self.assertIsInstance(buckets.c.tokens.type,
+                                  sqlalchemy.types.Float)
+            self.assertIsInstance(buckets.c.refilled_at.type,
+                                  sqlalchemy.types.Float)
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 26)
+
+            self.assertFalse(engine.dialect.has_table(engine.connect(),
+                                                      "rate_limit_buckets"))
+
+    def test_migration_028(self):
+        """Test adding shadow tables for archived rows."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.db_initial_version())
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 27)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 28)
+
+            volumes = sqlalchemy.Table('volumes', metadata, autoload=True)
+            shadow = sqlalchemy.Table('shadow_volumes', metadata,
+                                      autoload=True)
+            self.assertEqual(sorted(volumes.c.keys()),
+                             sorted(shadow.c.keys()))
+            self.assertEqual(set(), shadow.foreign_keys)
+            self.assertTrue(engine.dialect.has_table(
+                engine.connect(), "shadow_volume_metadata"))
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 27)
+
+            self.assertFalse(engine.dialect.has_table(engine.connect(),
+                                                      "shadow_volumes"))
+            self.assertFalse(engine.dialect.has_table(
+                engine.connect(), "shadow_volume_metadata"))
+
+    def test_migration_029(self):
+        """Test adding partial indexes on live rows."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.db_initial_version())
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 28)
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 29)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+            volumes = sqlalchemy.Table('volumes', metadata, autoload=True)
+            index_names = [idx.name for idx in volumes.indexes]
+            if engine.name == 'postgresql':
+                self.assertIn('volumes_project_id_live_idx', index_names)
+            else:
+                self.assertNotIn('volumes_project_id_live_idx', index_names)
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 28)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+            volumes = sqlalchemy.Table('volumes', metadata, autoload=True)
+            index_names = [idx.name for idx in volumes.indexes]
+            self.assertNotIn('volumes_project_id_live_idx', index_names)
+
+    def test_migration_030(self):
+        """Test adding table for image volume cache entries."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.db_initial_version())
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 29)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 30)
+
+            self.assertTrue(engine.dialect.has_table(
+                engine.connect(), "image_volume_cache_entries"))
+            cache = sqlalchemy.Table('image_volume_cache_entries',
+                                     metadata,
+                                     autoload=True)
+            self.assertIsInstance(cache.c.image_id.type,
+                                  sqlalchemy.types.VARCHAR)
+            self.assertIsInstance(cache.c.image_updated_at.type,
+                                  self.time_type[engine.name])
+            self.assertIsInstance(cache.c.size.type,
+                                  sqlalchemy.types.INTEGER)
+            self.assertIsInstance(cache.c.last_used.type,
+                                  self.time_type[engine.name])
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 29)
+
+            self.assertFalse(engine.dialect.has_table(
+                engine.connect(), "image_volume_cache_entries"))
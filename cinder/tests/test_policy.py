@@ -0,0 +1,128 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the compiled policy evaluation in cinder.policy."""
+
+from cinder import context
+from cinder import exception
+from cinder.openstack.common import policy as common_policy
+from cinder import policy
+from cinder import test
+
+
+class PolicyTestCase(test.TestCase):
+
+    rules = {
+        'admin_or_owner': 'is_admin:True or project_id:%(project_id)s',
+        'default': 'rule:admin_or_owner',
+        'example:allowed': '',
+        'example:denied': '!',
+        'example:owner': 'rule:admin_or_owner',
+        'example:role': 'role:Member',
+        'example:not_role': 'not role:member',
+        'example:both': 'role:member and project_id:%(project_id)s',
+        'example:literal': "'yes':%(flag)s",
+        'example:loop_a': 'rule:example:loop_b',
+        'example:loop_b': 'rule:example:loop_a',
+        'example:http': 'http://www.example.com',
+        'example:missing_rule': 'rule:example:nowhere',
+    }
+
+    def setUp(self):
+        super(PolicyTestCase, self).setUp()
+        self.stubs.Set(policy, '_ENFORCER', common_policy.Enforcer())
+        self._set_rules(self.rules)
+        self.context = context.RequestContext('fake', 'fake',
+                                              roles=['member'])
+        self.target = {'project_id': 'fake'}
+
+    def _set_rules(self, rules):
+        policy._ENFORCER.set_rules(common_policy.Rules(
+            dict((k, common_policy.parse_rule(v))
+                 for k, v in rules.items()), 'default'))
+
+    def _assert_same_as_enforcer(self, action, target):
+        expected = policy._ENFORCER.enforce(action, target,
+                                            self.context.to_dict())
+        try:
+            policy.enforce(self.context, action, target)
+            actual = True
+        except exception.PolicyNotAuthorized:
+            actual = False
+        self.assertEqual(bool(expected), actual, action)
+
+    def test_compiled_matches_enforcer(self):
+        targets = [self.target, {'project_id': 'other'}, {},
+                   {'project_id': 'fake', 'flag': 'yes'},
+                   {'project_id': 'fake', 'flag': 'no'}]
+        for action in self.rules.keys() + ['example:unknown']:
+            if action in ('example:http', 'example:loop_a',
+                          'example:loop_b'):
+                continue
+            for target in targets:
+                self._assert_same_as_enforcer(action, target)
+
+    def test_compiles_rule_references(self):
+        compiled = policy._get_compiled_rules()
+        self.assertIs(compiled.lookup('admin_or_owner'),
+                      compiled.lookup('example:owner'))
+
+    def test_unknown_action_uses_default_rule(self):
+        policy.enforce(self.context, 'example:unknown', self.target)
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, 'example:unknown',
+                          {'project_id': 'other'})
+
+    def test_recursive_rule_is_not_compiled(self):
+        compiled = policy._get_compiled_rules()
+        self.assertIsNone(compiled.lookup('example:loop_a'))
+
+    def test_http_check_goes_through_enforcer(self):
+        calls = []
+
+        def fake_http_check(check, target, creds, enforcer):
+            calls.append((target, creds))
+            return True
+
+        self.stubs.Set(common_policy.HttpCheck, '__call__', fake_http_check)
+        policy.enforce(self.context, 'example:http', self.target)
+        self.assertEqual([(self.target, self.context.to_dict())], calls)
+
+    def test_result_memoized_for_request(self):
+        policy.enforce(self.context, 'example:role', self.target)
+        compiled = policy._get_compiled_rules()
+        self.stubs.Set(compiled, 'checks',
+                       {'example:role': lambda target, creds: False})
+        # Still allowed, answered from the memo on the context
+        policy.enforce(self.context, 'example:role', self.target)
+
+        other = context.RequestContext('fake', 'fake', roles=['member'])
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          other, 'example:role', self.target)
+
+    def test_memo_keyed_on_target_and_roles(self):
+        policy.enforce(self.context, 'example:owner', self.target)
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, 'example:owner',
+                          {'project_id': 'other'})
+
+        self.context.roles = ['reader']
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, 'example:role', self.target)
+
+    def test_memo_dropped_on_reload(self):
+        policy.enforce(self.context, 'example:allowed', self.target)
+        rules = dict(self.rules)
+        rules['example:allowed'] = '!'
+        self._set_rules(rules)
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, 'example:allowed', self.target)
@@ -890,7 +890,7 @@ class DbQuotaDriverTestCase(test.TestCase):
                         snapshots=10, backups=10,
                         backup_gigabytes=50)
 
-        def fake_qugabp(context, project_id):
+        def fake_qugabp(context, project_id, use_slave=False):
             self.calls.append('quota_usage_get_all_by_project')
             self.assertEqual(project_id, 'test_project')
             return dict(volumes=dict(in_use=2, reserved=0),
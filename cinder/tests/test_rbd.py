@@ -484,8 +484,10 @@ class RBDTestCase(test.TestCase):
             self.mock_rbd.Image.protect_snap = mock.Mock()
             self.mock_rbd.Image.close = mock.Mock()
 
-            self.driver.create_cloned_volume(dict(name=dst_name),
-                                             dict(name=src_name))
+            with mock.patch.object(self.driver, '_resize') as mock_resize:
+                self.driver.create_cloned_volume(dict(name=dst_name, size=1),
+                                                 dict(name=src_name, size=1))
+                self.assertFalse(mock_resize.called)
 
             self.mock_rbd.Image.create_snap.assert_called_once()
             self.mock_rbd.Image.protect_snap.assert_called_once()
@@ -493,6 +495,22 @@ class RBDTestCase(test.TestCase):
             self.mock_rbd.Image.close.assert_called_once()
             self.assertTrue(mock_get_clone_depth.called)
 
+    @common_mocks
+    def test_create_cloned_volume_larger_than_source(self):
+        dst = dict(name=u'volume-00000002', size=2)
+
+        self.cfg.rbd_max_clone_depth = 2
+        self.mock_rbd.RBD.clone = mock.Mock()
+
+        with mock.patch.object(self.driver, '_get_clone_depth') as \
+                mock_get_clone_depth:
+            mock_get_clone_depth.return_value = 1
+            with mock.patch.object(self.driver, '_resize') as mock_resize:
+                self.driver.create_cloned_volume(
+                    dst, dict(name=u'volume-00000001', size=1))
+
+                mock_resize.assert_called_once_with(dst)
+
     @common_mocks
     def test_create_cloned_volume_w_flatten(self):
         src_name = u'volume-00000001'
@@ -641,6 +659,64 @@ class RBDTestCase(test.TestCase):
         self.cfg.volume_tmp_dir = '/var/run/cinder/tmp'
         self._copy_image()
 
+    def _clone_volume_to_image(self, image_service):
+        client = self.mock_client.return_value
+        client.__enter__.return_value = client
+        client.cluster.get_fsid.return_value = 'fsid'
+        # The volume and the image it is cloned to share one mock. Other
+        # tests set attributes on mock.Mock itself, keep clear of them.
+        image = mock.NonCallableMock()
+        image.list_snaps.return_value = [{'name': 'snap'}]
+        self.mock_rbd.Image = mock.Mock(return_value=image)
+        self.mock_rbd.RBD = mock.Mock(return_value=mock.NonCallableMock())
+        image_meta = {'id': 'image-id', 'disk_format': 'raw'}
+
+        with mock.patch.object(self.driver, '_supports_layering',
+                               return_value=True):
+            return self.driver.clone_volume_to_image(
+                None, self.volume, image_service, image_meta)
+
+    @common_mocks
+    def test_clone_volume_to_image(self):
+        image_service = mock.Mock()
+        self.assertTrue(self._clone_volume_to_image(image_service))
+
+        image = self.mock_rbd.Image.return_value
+        self.mock_rbd.RBD.return_value.clone.assert_called_once_with(
+            mock.ANY, self.volume_name, 'image-id.clone_snap', mock.ANY,
+            'image-id', features=self.mock_rbd.RBD_FEATURE_LAYERING)
+        image.flatten.assert_called_once_with()
+        self.assertEqual([mock.call('image-id.clone_snap'),
+                          mock.call('snap')],
+                         image.protect_snap.call_args_list)
+        image.remove_snap.assert_called_once_with('image-id.clone_snap')
+        image_service.add_location.assert_called_once_with(
+            None, 'image-id', 'rbd://fsid/rbd/image-id/snap', {})
+
+    @common_mocks
+    def test_clone_volume_to_image_add_location_fails(self):
+        image_service = mock.Mock()
+        image_service.add_location.side_effect = exception.ImageNotFound(
+            image_id='image-id')
+        self.assertRaises(exception.ImageNotFound,
+                          self._clone_volume_to_image, image_service)
+
+        image = self.mock_rbd.Image.return_value
+        self.assertEqual([mock.call('image-id.clone_snap'),
+                          mock.call('snap')],
+                         image.remove_snap.call_args_list)
+        self.mock_rbd.RBD.return_value.remove.assert_called_once_with(
+            mock.ANY, 'image-id')
+
+    @common_mocks
+    def test_clone_volume_to_image_not_raw(self):
+        with mock.patch.object(self.driver, '_supports_layering',
+                               return_value=True):
+            self.assertFalse(self.driver.clone_volume_to_image(
+                None, self.volume, mock.Mock(),
+                {'id': 'image-id', 'disk_format': 'qcow2'}))
+        self.assertFalse(self.mock_client.called)
+
     @common_mocks
     def test_update_volume_stats(self):
         client = self.mock_client.return_value
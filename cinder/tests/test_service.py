@@ -148,8 +148,8 @@ class ServiceTestCase(test.TestCase):
                                        binary).AndRaise(exception.NotFound())
         service.db.service_create(mox.IgnoreArg(),
                                   service_create).AndReturn(service_ref)
-        service.db.service_get(mox.IgnoreArg(),
-                               mox.IgnoreArg()).AndRaise(Exception())
+        service.db.service_heartbeat(mox.IgnoreArg(),
+                                     mox.IgnoreArg()).AndRaise(Exception())
 
         self.mox.ReplayAll()
         serv = service.Service(host,
@@ -181,10 +181,8 @@ class ServiceTestCase(test.TestCase):
                                        binary).AndRaise(exception.NotFound())
         service.db.service_create(mox.IgnoreArg(),
                                   service_create).AndReturn(service_ref)
-        service.db.service_get(mox.IgnoreArg(),
-                               service_ref['id']).AndReturn(service_ref)
-        service.db.service_update(mox.IgnoreArg(), service_ref['id'],
-                                  mox.ContainsKeyValue('report_count', 1))
+        service.db.service_heartbeat(mox.IgnoreArg(),
+                                     [service_ref['id']]).AndReturn(1)
 
         self.mox.ReplayAll()
         serv = service.Service(host,
@@ -197,6 +195,76 @@ class ServiceTestCase(test.TestCase):
 
         self.assertFalse(serv.model_disconnected)
 
+    def _start_fake_service(self, host='foo', zone='nova', service_id=1):
+        service_ref = {'host': host,
+                       'binary': 'bar',
+                       'topic': 'test',
+                       'report_count': 0,
+                       'availability_zone': zone,
+                       'id': service_id}
+        service.db.service_get_by_args(mox.IgnoreArg(), host,
+                                       'bar').AndReturn(service_ref)
+        return service_ref
+
+    def test_report_state_service_disappeared(self):
+        self._start_fake_service()
+        service.db.service_heartbeat(mox.IgnoreArg(), [1]).AndReturn(0)
+        service.db.service_get(mox.IgnoreArg(), 1).AndRaise(
+            exception.ServiceNotFound(service_id=1))
+        service.db.service_create(
+            mox.IgnoreArg(),
+            mox.ContainsKeyValue('report_count', 0)).AndReturn({'id': 2})
+
+        self.mox.ReplayAll()
+        serv = service.Service('foo', 'bar', 'test',
+                               'cinder.tests.test_service.FakeManager')
+        serv.start()
+        serv.report_state()
+
+        self.assertEqual(2, serv.service_id)
+        self.assertFalse(serv.model_disconnected)
+
+    def test_report_state_zone_changed(self):
+        self._start_fake_service(zone='old_zone')
+        service.db.service_heartbeat(mox.IgnoreArg(), [1]).AndReturn(1)
+        service.db.service_update(mox.IgnoreArg(), 1,
+                                  {'availability_zone': 'nova'})
+        # The new zone is cached, so the next report is a single update
+        service.db.service_heartbeat(mox.IgnoreArg(), [1]).AndReturn(1)
+
+        self.mox.ReplayAll()
+        serv = service.Service('foo', 'bar', 'test',
+                               'cinder.tests.test_service.FakeManager')
+        serv.start()
+        serv.report_state()
+        serv.report_state()
+
+        self.assertEqual('nova', serv.availability_zone)
+
+    def test_batched_report_state(self):
+        self.flags(batch_service_reports=True)
+        self._start_fake_service(host='foo@backend1', service_id=1)
+        self._start_fake_service(host='foo@backend2', service_id=2)
+        service.db.service_heartbeat(mox.IgnoreArg(), [1, 2]).AndReturn(2)
+
+        self.mox.ReplayAll()
+        servs = [service.Service(host, 'bar', 'test',
+                                 'cinder.tests.test_service.FakeManager',
+                                 report_interval=10)
+                 for host in ('foo@backend1', 'foo@backend2')]
+        for serv in servs:
+            serv.start()
+            self.addCleanup(serv.stop)
+
+        reporter = service.ServiceReporter._reporters[10]
+        self.assertEqual(servs, reporter.services)
+        self.assertEqual([], servs[0].timers)
+        reporter.report_state()
+
+        for serv in servs:
+            serv.stop()
+        self.assertNotIn(10, service.ServiceReporter._reporters)
+
     def test_service_with_long_report_interval(self):
         CONF.set_override('service_down_time', 10)
         CONF.set_override('report_interval', 10)
@@ -39,6 +39,7 @@ from cinder.brick.local_dev import lvm as brick_lvm
 from cinder import context
 from cinder import db
 from cinder import exception
+from cinder.image import cache as image_cache
 from cinder.image import image_utils
 from cinder import keymgr
 from cinder.openstack.common import fileutils
@@ -274,6 +275,8 @@ class VolumeTestCase(BaseVolumeTestCase):
             self.context, size=1024,
             host=volutils.append_host(CONF.host, 'pool2'))
         self.volume.init_host()
+        # Legacy volume pools are updated in the background
+        self.volume._tp.waitall()
         stats = self.volume.stats
         self.assertEqual(stats['allocated_capacity_gb'], 2020)
         self.assertEqual(
@@ -292,6 +295,47 @@ class VolumeTestCase(BaseVolumeTestCase):
         self.volume.delete_volume(self.context, vol3['id'])
         self.volume.delete_volume(self.context, vol4['id'])
 
+    def test_init_host_updates_legacy_pools_in_background(self):
+        vol0 = tests_utils.create_volume(
+            self.context, size=100, host=CONF.host, status='available')
+        vol1 = tests_utils.create_volume(
+            self.context, size=28, host=CONF.host, status='in-use')
+        tests_utils.create_volume(
+            self.context, size=1, host=CONF.host, status='error')
+        self.stubs.Set(self.volume.driver, 'get_pool', lambda v: 'real')
+        self.volume.init_host()
+
+        stats = self.volume.stats
+        self.assertEqual(128, stats['allocated_capacity_gb'])
+        self.assertEqual(
+            128, stats['pools']['_pool0']['allocated_capacity_gb'])
+        vol0 = db.volume_get(context.get_admin_context(), vol0['id'])
+        self.assertEqual(CONF.host, vol0['host'])
+
+        self.volume._tp.waitall()
+        self.assertEqual(128, stats['allocated_capacity_gb'])
+        self.assertEqual(
+            0, stats['pools']['_pool0']['allocated_capacity_gb'])
+        self.assertEqual(
+            128, stats['pools']['real']['allocated_capacity_gb'])
+        for vol in (vol0, vol1):
+            vol = db.volume_get(context.get_admin_context(), vol['id'])
+            self.assertEqual(volutils.append_host(CONF.host, 'real'),
+                             vol['host'])
+
+    def test_delete_volume_evicts_image_volume_cache_entry(self):
+        admin_ctxt = context.get_admin_context()
+        volume = tests_utils.create_volume(self.context, size=1,
+                                           host=CONF.host)
+        self.volume.image_volume_cache = image_cache.ImageVolumeCache(
+            db, mock.Mock())
+        db.image_volume_cache_create(admin_ctxt, volume['host'], 'image',
+                                     None, None, volume['id'], 1)
+
+        self.volume.delete_volume(self.context, volume['id'])
+        self.assertIsNone(db.image_volume_cache_get_by_volume_id(
+            admin_ctxt, volume['id']))
+
     @mock.patch.object(QUOTAS, 'reserve')
     @mock.patch.object(QUOTAS, 'commit')
     @mock.patch.object(QUOTAS, 'rollback')
@@ -2163,7 +2207,7 @@ class VolumeTestCase(BaseVolumeTestCase):
             pass
 
         def fake_fetch_to_raw(ctx, image_service, image_id, path, blocksize,
-                              size=None):
+                              size=None, sparse=False):
             pass
 
         def fake_clone_image(volume_ref, image_location, image_id, image_meta):
@@ -3662,6 +3706,45 @@ class CopyVolumeToImageTestCase(BaseVolumeTestCase):
                               self.context,
                               saving_image_id)
 
+    def _copy_volume_to_image_with_clone(self, **clone_kwargs):
+        self.volume_attrs['instance_uuid'] = None
+        db.volume_create(self.context, self.volume_attrs)
+
+        with contextlib.nested(
+            mock.patch.object(self.volume.driver, 'clone_volume_to_image',
+                              **clone_kwargs),
+            mock.patch.object(self.volume.driver, 'copy_volume_to_image')
+        ) as (clone_mock, copy_mock):
+            self.volume.copy_volume_to_image(self.context,
+                                             self.volume_id,
+                                             self.image_meta)
+
+        volume = db.volume_get(self.context, self.volume_id)
+        self.assertEqual('available', volume['status'])
+        return clone_mock, copy_mock
+
+    def test_copy_volume_to_image_backend_clone_disabled(self):
+        clone_mock, copy_mock = self._copy_volume_to_image_with_clone(
+            return_value=True)
+        self.assertFalse(clone_mock.called)
+        self.assertTrue(copy_mock.called)
+
+    def test_copy_volume_to_image_backend_clone(self):
+        self.flags(image_upload_use_backend_clone=True)
+        clone_mock, copy_mock = self._copy_volume_to_image_with_clone(
+            return_value=True)
+        clone_mock.assert_called_once_with(self.context, mock.ANY,
+                                           mock.ANY, self.image_meta)
+        self.assertFalse(copy_mock.called)
+
+    def test_copy_volume_to_image_backend_clone_falls_back(self):
+        self.flags(image_upload_use_backend_clone=True)
+        clone_mock, copy_mock = self._copy_volume_to_image_with_clone(
+            side_effect=exception.VolumeBackendAPIException(data='error'))
+        self.assertTrue(clone_mock.called)
+        copy_mock.assert_called_once_with(self.context, mock.ANY,
+                                          mock.ANY, self.image_meta)
+
 
 class GetActiveByWindowTestCase(BaseVolumeTestCase):
     def setUp(self):
@@ -3768,6 +3851,35 @@ class GetActiveByWindowTestCase(BaseVolumeTestCase):
         self.assertEqual(snapshots[2].id, u'4')
         self.assertEqual(snapshots[2].volume.id, u'1')
 
+    def test_volume_get_active_by_window_batches(self):
+        for attrs in self.db_attrs:
+            db.volume_create(self.ctx, attrs)
+
+        begin = datetime.datetime(1, 3, 1, 1, 1, 1)
+        end = datetime.datetime(1, 4, 1, 1, 1, 1)
+        volumes = db.volume_get_active_by_window(self.context, begin, end,
+                                                 project_id='p1', limit=2)
+        self.assertEqual([u'2', u'3'], [v.id for v in volumes])
+        volumes = db.volume_get_active_by_window(self.context, begin, end,
+                                                 project_id='p1',
+                                                 marker=volumes[-1].id,
+                                                 limit=2)
+        self.assertEqual([u'4'], [v.id for v in volumes])
+
+    def test_snapshot_get_active_by_window_batches(self):
+        db.volume_create(self.context, {'id': 1})
+        for attrs in self.db_attrs:
+            attrs['volume_id'] = 1
+            db.snapshot_create(self.ctx, attrs)
+
+        begin = datetime.datetime(1, 3, 1, 1, 1, 1)
+        end = datetime.datetime(1, 4, 1, 1, 1, 1)
+        snapshots = db.snapshot_get_active_by_window(self.context, begin,
+                                                     end, project_id='p1',
+                                                     marker=u'2')
+        self.assertEqual([u'3', u'4'], [s.id for s in snapshots])
+        self.assertEqual(u'1', snapshots[0].volume.id)
+
 
 class DriverTestCase(test.TestCase):
     """Base Test class for Drivers."""
@@ -4024,7 +4136,8 @@ class LVMISCSIVolumeDriverTestCase(DriverTestCase):
                 '/dev/mapper/cinder--volumes--2-testvol',
                 2048,
                 '1M',
-                execute=mock_execute)
+                execute=mock_execute,
+                sparse=False)
 
     @staticmethod
     def _get_manage_existing_lvs(name):
@@ -4159,6 +4272,22 @@ class LVMVolumeDriverTestCase(DriverTestCase):
 
         lvm_driver._delete_volume(fake_snapshot, is_snapshot=True)
 
+    @mock.patch.object(image_utils, 'fetch_to_raw')
+    @mock.patch.object(volutils, 'copy_volume')
+    def test_thinlvm_sparse_copies(self, mock_copy, mock_fetch):
+        configuration = conf.Configuration(fake_opt, 'fake_group')
+        configuration.lvm_type = 'thin'
+        lvm_driver = lvm.LVMISCSIDriver(configuration=configuration,
+                                        vg_obj=mock.Mock())
+        volume = {'name': 'volume-1', 'size': 1}
+        snapshot = {'name': 'snapshot-1', 'volume_size': 1}
+
+        lvm_driver.create_volume_from_snapshot(volume, snapshot)
+        lvm_driver.copy_image_to_volume(self.context, volume, None, 'image')
+
+        self.assertTrue(mock_copy.call_args[1]['sparse'])
+        self.assertTrue(mock_fetch.call_args[1]['sparse'])
+
 
 class ISCSITestCase(DriverTestCase):
     """Test Case for ISCSIDriver"""
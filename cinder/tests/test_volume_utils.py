@@ -224,6 +224,33 @@ class CopyVolumeTestCase(test.TestCase):
                                  CONF.volume_dd_blocksize, sync=True,
                                  ionice=None, execute=fake_utils_execute)
 
+    def _test_copy_volume_sparse(self, supported_flags, expected_flags):
+        mock_execute = mock.Mock()
+        self.stubs.Set(volume_utils, 'check_for_odirect_support',
+                       lambda src, dest, flag: flag in supported_flags)
+        self.stubs.Set(volume_utils, 'setup_blkio_cgroup',
+                       lambda src, dest, bps_limit: None)
+
+        volume_utils.copy_volume('/dev/src', '/dev/dest', 1024, '1M',
+                                 sync=True, execute=mock_execute,
+                                 sparse=True)
+
+        mock_execute.assert_called_once_with(
+            'dd', 'if=/dev/src', 'of=/dev/dest', 'count=1024', 'bs=1M',
+            *expected_flags, run_as_root=True)
+
+    def test_copy_volume_sparse(self):
+        self._test_copy_volume_sparse(
+            ('iflag=direct', 'oflag=direct', 'conv=sparse'),
+            ('iflag=direct', 'oflag=direct', 'conv=sparse'))
+
+    def test_copy_volume_sparse_sync(self):
+        self._test_copy_volume_sparse(('conv=sparse',),
+                                      ('conv=fdatasync,sparse',))
+
+    def test_copy_volume_sparse_not_supported(self):
+        self._test_copy_volume_sparse(('iflag=direct',), ('iflag=direct',))
+
 
 class BlkioCgroupTestCase(test.TestCase):
 
@@ -334,6 +334,15 @@ class API(base.Base):
             raise exception.VolumeNotFound(volume_id=volume_id)
         return volume
 
+    def get_version(self, context, volume_id):
+        """Return the cheap version fields of a volume, see get()."""
+        version = self.db.volume_get_version(context, volume_id)
+        try:
+            check_policy(context, 'get', version)
+        except exception.PolicyNotAuthorized:
+            raise exception.VolumeNotFound(volume_id=volume_id)
+        return version
+
     def _get_all_tenants_value(self, filters):
         """Returns a Boolean for the value of filters['all_tenants'].
 
@@ -387,7 +396,8 @@ class API(base.Base):
             # Need to remove all_tenants to pass the filtering below.
             del filters['all_tenants']
             volumes = self.db.volume_get_all(context, marker, limit, sort_key,
-                                             sort_dir, filters=filters)
+                                             sort_dir, filters=filters,
+                                             use_slave=True)
         else:
             if viewable_admin_meta:
                 context = context.elevated()
@@ -395,7 +405,8 @@ class API(base.Base):
                                                         context.project_id,
                                                         marker, limit,
                                                         sort_key, sort_dir,
-                                                        filters=filters)
+                                                        filters=filters,
+                                                        use_slave=True)
 
         return volumes
 
@@ -404,36 +415,46 @@ class API(base.Base):
         rv = self.db.snapshot_get(context, snapshot_id)
         return dict(rv.iteritems())
 
+    def get_snapshot_version(self, context, snapshot_id):
+        check_policy(context, 'get_snapshot')
+        return self.db.snapshot_get_version(context, snapshot_id)
+
     def get_volume(self, context, volume_id):
         check_policy(context, 'get_volume')
         rv = self.db.volume_get(context, volume_id)
         return dict(rv.iteritems())
 
-    def get_all_snapshots(self, context, search_opts=None):
+    def get_all_snapshots(self, context, search_opts=None, marker=None,
+                          limit=None, sort_key='created_at', sort_dir='desc'):
         check_policy(context, 'get_all_snapshots')
 
         search_opts = search_opts or {}
 
+        try:
+            if limit is not None:
+                limit = int(limit)
+                if limit < 0:
+                    msg = _('limit param must be positive')
+                    raise exception.InvalidInput(reason=msg)
+        except ValueError:
+            msg = _('limit param must be an integer')
+            raise exception.InvalidInput(reason=msg)
+
+        if search_opts:
+            LOG.debug("Searching by: %s" % search_opts)
+
         if (context.is_admin and 'all_tenants' in search_opts):
             # Need to remove all_tenants to pass the filtering below.
             del search_opts['all_tenants']
-            snapshots = self.db.snapshot_get_all(context)
+            snapshots = self.db.snapshot_get_all(context, marker, limit,
+                                                 sort_key, sort_dir,
+                                                 filters=search_opts,
+                                                 use_slave=True)
         else:
             snapshots = self.db.snapshot_get_all_by_project(
-                context, context.project_id)
-
-        if search_opts:
-            LOG.debug("Searching by: %s" % search_opts)
+                context, context.project_id, marker, limit, sort_key,
+                sort_dir, filters=search_opts, use_slave=True)
 
-            results = []
-            not_found = object()
-            for snapshot in snapshots:
-                for opt, value in search_opts.iteritems():
-                    if snapshot.get(opt, not_found) != value:
-                        break
-                else:
-                    results.append(snapshot)
-            snapshots = results
         return snapshots
 
     @wrap_check_policy
@@ -911,9 +932,13 @@ class API(base.Base):
     def get_snapshot_metadata_value(self, snapshot, key):
         pass
 
-    def get_volumes_image_metadata(self, context):
+    def get_volumes_image_metadata(self, context, volume_ids=None):
         check_policy(context, 'get_volumes_image_metadata')
-        db_data = self.db.volume_glance_metadata_get_all(context)
+        if volume_ids is None:
+            db_data = self.db.volume_glance_metadata_get_all(context)
+        else:
+            db_data = self.db.volume_glance_metadata_get_many(context,
+                                                              volume_ids)
         results = collections.defaultdict(dict)
         for meta_entry in db_data:
             results[meta_entry['volume_id']].update({meta_entry['key']:
@@ -127,6 +127,25 @@ volume_opts = [
                default=None,
                help='The path to the client certificate for verification, '
                     'if the driver supports it.'),
+    cfg.BoolOpt('image_volume_cache_enabled',
+                default=False,
+                help='Enable the image volume cache for this backend. '
+                     'Requires the Cinder internal tenant to be '
+                     'configured.'),
+    cfg.IntOpt('image_volume_cache_max_size_gb',
+               default=0,
+               help='Max size of the image volume cache for this backend in '
+                    'GB. 0 => unlimited.'),
+    cfg.IntOpt('image_volume_cache_max_count',
+               default=0,
+               help='Max number of entries allowed in the image volume cache. '
+                    '0 => unlimited.'),
+    cfg.BoolOpt('image_upload_use_backend_clone',
+                default=False,
+                help='Upload volumes to images by registering a backend '
+                     'copy of the volume as the image location, for '
+                     'drivers that support it. Glance must be able to '
+                     'read images from this backend.'),
 ]
 
 # for backward compatibility
@@ -315,6 +334,9 @@ class VolumeDriver(object):
     def create_cloned_volume(self, volume, src_vref):
         """Creates a clone of the specified volume.
 
+        The clone is created at the size of volume, which may be larger
+        than src_vref.
+
         If volume_type extra specs includes 'replication: <is> True' the
         driver needs to create a volume replica (secondary)
         and setup replication between the newly created volume
@@ -552,6 +574,19 @@ class VolumeDriver(object):
         """
         return None, False
 
+    def clone_volume_to_image(self, context, volume, image_service,
+                              image_meta):
+        """Create an image efficiently from an existing volume.
+
+        Drivers whose backend Glance can read images from may copy the
+        volume within the backend and register the copy as the location of
+        the image with image_service.add_location, instead of the volume
+        being read and uploaded by copy_volume_to_image.
+
+        Returns a boolean indicating whether the image was created.
+        """
+        return False
+
     def backup_volume(self, context, backup, backup_service):
         """Create a new backup from an existing volume."""
         volume = self.db.volume_get(context, backup['volume_id'])
@@ -69,6 +69,9 @@ class LVMVolumeDriver(driver.VolumeDriver):
         self.backend_name =\
             self.configuration.safe_get('volume_backend_name') or 'LVM'
         self.protocol = 'local'
+        # New thin volumes read back as zeros, copies to them can skip
+        # writing blocks of zeros and leave them unallocated.
+        self._sparse_copy_volume = self.configuration.lvm_type == 'thin'
 
     def set_execute(self, execute):
         self._execute = execute
@@ -213,7 +216,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
                              self.local_path(volume),
                              snapshot['volume_size'] * units.Ki,
                              self.configuration.volume_dd_blocksize,
-                             execute=self._execute)
+                             execute=self._execute,
+                             sparse=self._sparse_copy_volume)
 
     def delete_volume(self, volume):
         """Deletes a logical volume."""
@@ -267,7 +271,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
                                  image_id,
                                  self.local_path(volume),
                                  self.configuration.volume_dd_blocksize,
-                                 size=volume['size'])
+                                 size=volume['size'],
+                                 sparse=self._sparse_copy_volume)
 
     def copy_volume_to_image(self, context, volume, image_service, image_meta):
         """Copy the volume to the specified image."""
@@ -308,7 +313,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
                 self.local_path(volume),
                 src_vref['size'] * units.Ki,
                 self.configuration.volume_dd_blocksize,
-                execute=self._execute)
+                execute=self._execute,
+                sparse=self._sparse_copy_volume)
         finally:
             self.delete_snapshot(temp_snapshot)
 
@@ -633,7 +639,8 @@ class LVMISCSIDriver(LVMVolumeDriver, driver.ISCSIDriver):
                              self.local_path(volume, vg=dest_vg),
                              size_in_mb,
                              self.configuration.volume_dd_blocksize,
-                             execute=self._execute)
+                             execute=self._execute,
+                             sparse=lvm_type == 'thin')
         self._delete_volume(volume)
         model_update = self._create_export(ctxt, volume, vg=dest_vg)
 
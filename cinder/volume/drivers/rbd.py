@@ -27,6 +27,7 @@ import six
 from cinder import exception
 from cinder.i18n import _
 from cinder.image import image_utils
+from cinder.openstack.common import excutils
 from cinder.openstack.common import fileutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import strutils
@@ -422,6 +423,7 @@ class RBDDriver(driver.VolumeDriver):
             with RBDVolumeProxy(self, src_name, read_only=True) as vol:
                 vol.copy(vol.ioctx, dest_name)
 
+            self._extend_clone(volume, src_vref)
             return
 
         # Otherwise do COW clone.
@@ -479,8 +481,14 @@ class RBDDriver(driver.VolumeDriver):
             finally:
                 src_volume.close()
 
+        self._extend_clone(volume, src_vref)
         LOG.debug("clone created successfully")
 
+    def _extend_clone(self, volume, src_vref):
+        """Grow a clone to the size of volume if its source is smaller."""
+        if int(volume['size']) > int(src_vref['size']):
+            self._resize(volume)
+
     def create_volume(self, volume):
         """Creates a logical volume."""
         if int(volume['size']) == 0:
@@ -837,6 +845,80 @@ class RBDDriver(driver.VolumeDriver):
                                       image_meta, tmp_file)
         os.unlink(tmp_file)
 
+    def clone_volume_to_image(self, context, volume, image_service,
+                              image_meta):
+        """Register a copy of the volume made in the pool as the image.
+
+        The volume is cloned to an rbd image named after the image, which
+        is flattened and given the protected 'snap' snapshot the Glance rbd
+        store expects, so Glance reads and deletes it like the images it
+        stores itself. The data is copied by the cluster instead of being
+        exported and uploaded through this host.
+        """
+        if (image_meta['disk_format'] != 'raw' or
+                not self._supports_layering()):
+            return False
+
+        volume_name = strutils.safe_encode(volume['name'])
+        image_name = strutils.safe_encode(image_meta['id'])
+        clone_snap = "%s.clone_snap" % image_name
+        with RADOSClient(self) as client:
+            src_volume = self.rbd.Image(client.ioctx, volume_name)
+            try:
+                src_volume.create_snap(clone_snap)
+                src_volume.protect_snap(clone_snap)
+                try:
+                    LOG.debug("cloning '%(src_vol)s@%(src_snap)s' to image "
+                              "'%(dest)s'" %
+                              {'src_vol': volume_name, 'src_snap': clone_snap,
+                               'dest': image_name})
+                    self.rbd.RBD().clone(
+                        client.ioctx, volume_name, clone_snap, client.ioctx,
+                        image_name, features=self.rbd.RBD_FEATURE_LAYERING)
+                    try:
+                        image = self.rbd.Image(client.ioctx, image_name)
+                        try:
+                            image.flatten()
+                            image.create_snap('snap')
+                            image.protect_snap('snap')
+                        finally:
+                            image.close()
+                    except Exception:
+                        with excutils.save_and_reraise_exception():
+                            self._delete_image_clone(client, image_name)
+                finally:
+                    src_volume.unprotect_snap(clone_snap)
+                    src_volume.remove_snap(clone_snap)
+            finally:
+                src_volume.close()
+
+            location = 'rbd://%s' % '/'.join(
+                urllib.quote(part, '') for part in
+                (client.cluster.get_fsid(), self.configuration.rbd_pool,
+                 image_name, 'snap'))
+            try:
+                image_service.add_location(context, image_meta['id'],
+                                           location, {})
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self._delete_image_clone(client, image_name)
+        return True
+
+    def _delete_image_clone(self, client, image_name):
+        """Removes the rbd image of an image upload that failed."""
+        image = self.rbd.Image(client.ioctx, image_name)
+        try:
+            for snap in image.list_snaps():
+                try:
+                    image.unprotect_snap(snap['name'])
+                except self.rbd.Error:
+                    # It was not protected yet.
+                    pass
+                image.remove_snap(snap['name'])
+        finally:
+            image.close()
+        self.rbd.RBD().remove(client.ioctx, image_name)
+
     def backup_volume(self, context, backup, backup_service):
         """Create a new backup from an existing volume."""
         volume = self.db.volume_get(context, backup['volume_id'])
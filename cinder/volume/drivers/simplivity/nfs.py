@@ -260,8 +260,9 @@ class SvtNfsDriver(nfs.NfsDriver):
             (out, err) = self._execute('rm', '-rf', src_path, run_as_root=True)
 
         # Update volume metadata to point to new container
-        vol_metadata['svt_container'] = dest_container
-        self.db.volume_metadata_update(context, volume_id, vol_metadata, False)
+        self.db.volume_metadata_update(context, volume_id,
+                                       {'svt_container': dest_container},
+                                       False)
 
     def _do_create_volume(self, volume):
         """Create a volume on given remote share."""
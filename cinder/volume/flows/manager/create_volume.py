@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import math
 import traceback
 
 from oslo.config import cfg
@@ -17,13 +18,17 @@ import taskflow.engines
 from taskflow.patterns import linear_flow
 from taskflow.utils import misc
 
+from cinder import context as cinder_context
 from cinder import exception
 from cinder import flow_utils
 from cinder.i18n import _
 from cinder.image import glance
+from cinder.openstack.common import excutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import processutils
 from cinder.openstack.common import timeutils
+from cinder.openstack.common import units
+from cinder import quota
 from cinder import utils
 from cinder.volume.flows import common
 from cinder.volume import utils as volume_utils
@@ -32,6 +37,7 @@ LOG = logging.getLogger(__name__)
 
 ACTION = 'volume:create'
 CONF = cfg.CONF
+QUOTAS = quota.QUOTAS
 
 # These attributes we will attempt to save for the volume if they exist
 # in the source image metadata.
@@ -329,10 +335,11 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
 
     default_provides = 'volume'
 
-    def __init__(self, db, driver):
+    def __init__(self, db, driver, image_volume_cache=None):
         super(CreateVolumeFromSpecTask, self).__init__(addons=[ACTION])
         self.db = db
         self.driver = driver
+        self.image_volume_cache = image_volume_cache
 
     def _handle_bootable_volume_glance_meta(self, context, volume_id,
                                             **kwargs):
@@ -537,21 +544,14 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
             if value is not None:
                 property_metadata[key] = value
 
-        # NOTE(harlowja): The best way for this to happen would be in bulk,
-        # but that doesn't seem to exist (yet), so we go through one by one
-        # which means we can have partial create/update failure.
         volume_metadata = dict(property_metadata)
         volume_metadata.update(base_metadata)
         LOG.debug("Creating volume glance metadata for volume %(volume_id)s"
                   " backed by image %(image_id)s with: %(vol_metadata)s." %
                   {'volume_id': volume_id, 'image_id': image_id,
                    'vol_metadata': volume_metadata})
-        for (key, value) in volume_metadata.items():
-            try:
-                self.db.volume_glance_metadata_create(context, volume_id,
-                                                      key, value)
-            except exception.GlanceMetadataExists:
-                pass
+        self.db.volume_glance_metadata_bulk_create(context, volume_id,
+                                                   volume_metadata)
 
     def _create_from_image(self, context, volume_ref,
                            image_location, image_id, image_meta,
@@ -567,6 +567,24 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
         # and clone status.
         model_update, cloned = self.driver.clone_image(
             volume_ref, image_location, image_id, image_meta)
+
+        should_create_cache_entry = False
+        internal_context = None
+        if not cloned and self.image_volume_cache:
+            internal_context = cinder_context.get_internal_tenant_context()
+            if not internal_context:
+                LOG.info(_('Unable to get Cinder internal context, will '
+                           'not use image-volume cache.'))
+            else:
+                model_update, cloned = self._create_from_image_cache(
+                    internal_context, volume_ref, image_id, image_meta)
+                should_create_cache_entry = not cloned
+
+        if should_create_cache_entry:
+            model_update, cloned = self._create_from_new_image_cache_entry(
+                context, internal_context, volume_ref, image_id,
+                image_location, image_meta, image_service)
+
         if not cloned:
             # TODO(harlowja): what needs to be rolled back in the clone if this
             # volume create fails?? Likely this should be a subflow or broken
@@ -582,18 +600,160 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                 volume_ref = self.db.volume_update(context,
                                                    volume_ref['id'], updates)
             except exception.CinderException:
-                LOG.exception(_("Failed updating volume %(volume_id)s with "
-                                "%(updates)s") %
+                LOG.exception(_("Failed updating volume %(volume_id)s "
+                                "with %(updates)s") %
                               {'volume_id': volume_ref['id'],
                                'updates': updates})
-            self._copy_image_to_volume(context, volume_ref,
-                                       image_id, image_location, image_service)
+            self._copy_image_to_volume(context, volume_ref, image_id,
+                                       image_location, image_service)
 
         self._handle_bootable_volume_glance_meta(context, volume_ref['id'],
                                                  image_id=image_id,
                                                  image_meta=image_meta)
         return model_update
 
+    def _create_from_image_cache(self, internal_context, volume_ref,
+                                 image_id, image_meta):
+        """Clone volume_ref from the image-volume cache entry of the image.
+
+        Returns the model update and whether the volume was cloned.
+        """
+        cache_entry = self.image_volume_cache.get_entry(internal_context,
+                                                        volume_ref,
+                                                        image_id,
+                                                        image_meta)
+        if not cache_entry:
+            return None, False
+        return self._clone_image_cache_entry(internal_context, volume_ref,
+                                             cache_entry)
+
+    def _clone_image_cache_entry(self, internal_context, volume_ref,
+                                 cache_entry):
+        """Clone volume_ref from an image-volume cache entry.
+
+        The driver creates the clone at the size of volume_ref, which may
+        be larger than the cached volume. Returns the model update and
+        whether the volume was cloned.
+        """
+        # Keep the cached volume from being deleted while it is cloned.
+        @utils.synchronized('%s-delete_volume' % cache_entry['volume_id'],
+                            external=True)
+        def _clone_image_volume():
+            image_volume = self.db.volume_get(internal_context,
+                                              cache_entry['volume_id'])
+            return self.driver.create_cloned_volume(volume_ref, image_volume)
+
+        LOG.debug('Cloning volume %(volume_id)s from image-volume cache '
+                  'entry %(volume)s of image %(image_id)s.',
+                  {'volume_id': volume_ref['id'],
+                   'volume': cache_entry['volume_id'],
+                   'image_id': cache_entry['image_id']})
+        try:
+            model_update = _clone_image_volume()
+        except exception.VolumeNotFound:
+            # The cached volume went away, forget it and download instead.
+            self.image_volume_cache.evict(internal_context, cache_entry)
+            return None, False
+        return model_update, True
+
+    @staticmethod
+    def _image_volume_size(image_meta):
+        """Size in GB of the smallest volume the image fits in, if known."""
+        virtual_size = image_meta.get('virtual_size')
+        if not virtual_size and image_meta.get('disk_format') == 'raw':
+            virtual_size = image_meta.get('size')
+        if not virtual_size:
+            return None
+        return max(int(math.ceil(float(virtual_size) / units.Gi)),
+                   image_meta.get('min_disk') or 0, 1)
+
+    def _create_from_new_image_cache_entry(self, context, internal_context,
+                                           volume_ref, image_id,
+                                           image_location, image_meta,
+                                           image_service):
+        """Download the image into a new cache entry and clone volume_ref.
+
+        The entry is a volume of the internal tenant sized to the image, so
+        it can be cloned for any volume the image fits in. Failing to make
+        the entry does not fail the creation of volume_ref, the image is
+        then downloaded onto volume_ref instead. Returns the model update
+        and whether volume_ref was cloned.
+        """
+        size = min(self._image_volume_size(image_meta) or volume_ref['size'],
+                   volume_ref['size'])
+        try:
+            if not self.image_volume_cache.ensure_space(
+                    internal_context, size, volume_ref['host']):
+                LOG.warning(_('Unable to ensure space for image-volume in '
+                              'cache. Will skip creating entry for image '
+                              '%(image)s on host %(host)s.'),
+                            {'image': image_id, 'host': volume_ref['host']})
+                return None, False
+
+            image_volume = self._create_image_volume(
+                context, internal_context, volume_ref, size, image_id,
+                image_location, image_service)
+            cache_entry = self.image_volume_cache.create_cache_entry(
+                internal_context, image_volume, image_id, image_meta)
+        except exception.CinderException as ex:
+            LOG.warning(_('Failed to create new image-volume cache entry '
+                          'for image %(image)s, error: %(error)s'),
+                        {'image': image_id, 'error': ex})
+            return None, False
+
+        return self._clone_image_cache_entry(internal_context, volume_ref,
+                                             cache_entry)
+
+    def _create_image_volume(self, context, internal_context, volume_ref,
+                             size, image_id, image_location, image_service):
+        """Create a volume of the internal tenant holding the image."""
+        volume_type_id = volume_ref['volume_type_id']
+        reserve_opts = {'volumes': 1, 'gigabytes': size}
+        QUOTAS.add_volume_type_opts(internal_context, reserve_opts,
+                                    volume_type_id)
+        reservations = QUOTAS.reserve(internal_context, **reserve_opts)
+        try:
+            image_volume = self.db.volume_create(internal_context, {
+                'size': size,
+                'user_id': internal_context.user_id,
+                'project_id': internal_context.project_id,
+                'host': volume_ref['host'],
+                'availability_zone': volume_ref['availability_zone'],
+                'volume_type_id': volume_type_id,
+                'status': 'creating',
+                'attach_status': 'detached',
+                'display_name': 'image-%s' % image_id,
+                'display_description': 'Image-volume cache entry',
+            })
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                QUOTAS.rollback(internal_context, reservations)
+
+        try:
+            model_update = self.driver.create_volume(image_volume)
+            updates = dict(model_update or {}, status='downloading')
+            image_volume = self.db.volume_update(internal_context,
+                                                 image_volume['id'], updates)
+            # The image is fetched as the requester, who is allowed to see
+            # it, the internal tenant may not be.
+            self._copy_image_to_volume(context, image_volume, image_id,
+                                       image_location, image_service)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                try:
+                    self.driver.delete_volume(image_volume)
+                except Exception:
+                    LOG.exception(_('Failed to delete image-volume %s.'),
+                                  image_volume['id'])
+                self.db.volume_destroy(internal_context.elevated(),
+                                       image_volume['id'])
+                QUOTAS.rollback(internal_context, reservations)
+
+        QUOTAS.commit(internal_context, reservations)
+        return self.db.volume_update(internal_context, image_volume['id'],
+                                     {'status': 'available',
+                                      'launched_at': timeutils.utcnow()})
+
     def _create_raw_volume(self, context, volume_ref, **kwargs):
         return self.driver.create_volume(volume_ref)
 
@@ -706,7 +866,7 @@ def get_flow(context, db, driver, scheduler_rpcapi, host, volume_id,
              allow_reschedule, reschedule_context, request_spec,
              filter_properties, snapshot_id=None, image_id=None,
              source_volid=None, source_replicaid=None,
-             consistencygroup_id=None):
+             consistencygroup_id=None, image_volume_cache=None):
     """Constructs and returns the manager entrypoint flow.
 
     This flow will do the following:
@@ -748,7 +908,8 @@ def get_flow(context, db, driver, scheduler_rpcapi, host, volume_id,
 
     volume_flow.add(ExtractVolumeSpecTask(db),
                     NotifyVolumeActionTask(db, "create.start"),
-                    CreateVolumeFromSpecTask(db, driver),
+                    CreateVolumeFromSpecTask(db, driver,
+                                             image_volume_cache),
                     CreateVolumeOnFinishTask(db, "create.end"))
 
     # Now load (but do not run) the flow using the provided initial data.
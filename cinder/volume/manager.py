@@ -47,6 +47,7 @@ from cinder import context
 from cinder import exception
 from cinder import flow_utils
 from cinder.i18n import _, _LE, _LI, _LW
+from cinder.image import cache as image_cache
 from cinder.image import glance
 from cinder import manager
 from cinder.openstack.common import excutils
@@ -65,6 +66,7 @@ from cinder.volume import rpcapi as volume_rpcapi
 from cinder.volume import utils as vol_utils
 from cinder.volume import volume_types
 
+from eventlet import greenthread
 from eventlet.greenpool import GreenPool
 
 LOG = logging.getLogger(__name__)
@@ -84,6 +86,11 @@ volume_manager_opts = [
                 default=False,
                 help='Offload pending volume delete during '
                      'volume service startup'),
+    cfg.IntOpt('volume_pool_update_batch_size',
+               default=100,
+               help='Number of legacy volumes, created before pools were '
+                    'introduced, to update with their pool name before '
+                    'yielding to other work during volume service startup'),
     cfg.StrOpt('zoning_mode',
                default='none',
                help='FC Zoning mode configured'),
@@ -193,49 +200,83 @@ class VolumeManager(manager.SchedulerDependentManager):
                 LOG.error("Invalid JSON: %s" %
                           self.driver.configuration.extra_capabilities)
 
+        self.image_volume_cache = None
+        if self.driver.configuration.safe_get('image_volume_cache_enabled'):
+            self.image_volume_cache = image_cache.ImageVolumeCache(
+                self.db,
+                importutils.import_object(CONF.volume_api_class),
+                self.driver.configuration.safe_get(
+                    'image_volume_cache_max_size_gb'),
+                self.driver.configuration.safe_get(
+                    'image_volume_cache_max_count'))
+            LOG.info(_('Image-volume cache enabled for host %s.'),
+                     self.host)
+
     def _add_to_threadpool(self, func, *args, **kwargs):
         self._tp.spawn_n(func, *args, **kwargs)
 
-    def _count_allocated_capacity(self, ctxt, volume):
-        pool = vol_utils.extract_host(volume['host'], 'pool')
-        if pool is None:
-            # No pool name encoded in host, so this is a legacy
-            # volume created before pool is introduced, ask
-            # driver to provide pool info if it has such
-            # knowledge and update the DB.
+    def _default_pool(self, host):
+        # Legacy volumes with no pool encoded in host are counted in a
+        # special fixed pool with volume_backend_name being the pool name,
+        # if volume_backend_name is None, use default pool name.
+        return (self.driver.configuration.safe_get('volume_backend_name') or
+                vol_utils.extract_host(host, 'pool', True))
+
+    def _add_allocated_capacity(self, pool, size):
+        try:
+            self.stats['pools'][pool]['allocated_capacity_gb'] += size
+        except KeyError:
+            # First volume in the pool
+            self.stats['pools'][pool] = dict(allocated_capacity_gb=size)
+
+    def _count_allocated_capacity(self, ctxt):
+        """Sum the size of available and in-use volumes per pool.
+
+        Returns True if some of them are legacy volumes, created before
+        pools were introduced, whose host has no pool name encoded.
+        """
+        self.stats['pools'] = {}
+        self.stats['allocated_capacity_gb'] = 0
+        legacy = False
+        for host, size in self.db.volume_capacity_get_by_host(
+                ctxt, self.host, statuses=['in-use', 'available']):
+            pool = vol_utils.extract_host(host, 'pool')
+            if pool is None:
+                legacy = True
+                pool = self._default_pool(host)
+            self._add_allocated_capacity(pool, size)
+            self.stats['allocated_capacity_gb'] += size
+        return legacy
+
+    def _update_legacy_volume_pools(self, ctxt, volumes):
+        """Ask the driver for the pool of legacy volumes and update the DB.
+
+        Runs in the background after init_host, yielding between batches,
+        and moves the capacity counted in the default pool to the pool
+        the driver reports.
+        """
+        for i, volume in enumerate(volumes, 1):
             try:
                 pool = self.driver.get_pool(volume)
             except Exception as err:
                 LOG.error(_('Failed to fetch pool name for volume: %s'),
                           volume['id'])
                 LOG.exception(err)
-                return
+                continue
 
             if pool:
-                new_host = vol_utils.append_host(volume['host'],
-                                                 pool)
-                self.db.volume_update(ctxt, volume['id'],
-                                      {'host': new_host})
-            else:
-                # Otherwise, put them into a special fixed pool with
-                # volume_backend_name being the pool name, if
-                # volume_backend_name is None, use default pool name.
-                # This is only for counting purpose, doesn't update DB.
-                pool = (self.driver.configuration.safe_get(
-                    'volume_backend_name') or vol_utils.extract_host(
-                    volume['host'], 'pool', True))
-        try:
-            pool_stat = self.stats['pools'][pool]
-        except KeyError:
-            # First volume in the pool
-            self.stats['pools'][pool] = dict(
-                allocated_capacity_gb=0)
-            pool_stat = self.stats['pools'][pool]
-        pool_sum = pool_stat['allocated_capacity_gb']
-        pool_sum += volume['size']
+                new_host = vol_utils.append_host(volume['host'], pool)
+                try:
+                    self.db.volume_update(ctxt, volume['id'],
+                                          {'host': new_host})
+                except exception.VolumeNotFound:
+                    continue
+                self._add_allocated_capacity(
+                    self._default_pool(volume['host']), -volume['size'])
+                self._add_allocated_capacity(pool, volume['size'])
 
-        self.stats['pools'][pool]['allocated_capacity_gb'] = pool_sum
-        self.stats['allocated_capacity_gb'] += volume['size']
+            if i % CONF.volume_pool_update_batch_size == 0:
+                greenthread.sleep(0)
 
     def init_host(self):
         """Do any initialization that needs to be run if this is a
@@ -263,14 +304,10 @@ class VolumeManager(manager.SchedulerDependentManager):
         LOG.debug("Re-exporting %s volumes" % len(volumes))
 
         try:
-            self.stats['pools'] = {}
-            self.stats.update({'allocated_capacity_gb': 0})
+            # available volume should also be counted into allocated
+            has_legacy = self._count_allocated_capacity(ctxt)
             for volume in volumes:
-                # available volume should also be counted into allocated
                 if volume['status'] in ['in-use', 'available']:
-                    # calculate allocated capacity for driver
-                    self._count_allocated_capacity(ctxt, volume)
-
                     try:
                         if volume['status'] in ['in-use']:
                             self.driver.ensure_export(ctxt, volume)
@@ -301,6 +338,16 @@ class VolumeManager(manager.SchedulerDependentManager):
         # at this point the driver is considered initialized.
         self.driver.set_initialized()
 
+        if has_legacy:
+            legacy = [volume for volume in volumes
+                      if volume['status'] in ['in-use', 'available'] and
+                      vol_utils.extract_host(volume['host'],
+                                             'pool') is None]
+            LOG.debug('Updating pool of %s legacy volumes in the '
+                      'background' % len(legacy))
+            self._add_to_threadpool(self._update_legacy_volume_pools,
+                                    ctxt, legacy)
+
         LOG.debug('Resuming any in progress delete operations')
         for volume in volumes:
             if volume['status'] == 'deleting':
@@ -347,7 +394,8 @@ class VolumeManager(manager.SchedulerDependentManager):
                 allow_reschedule=allow_reschedule,
                 reschedule_context=context_saved,
                 request_spec=request_spec,
-                filter_properties=filter_properties)
+                filter_properties=filter_properties,
+                image_volume_cache=self.image_volume_cache)
         except Exception:
             LOG.exception(_("Failed to create manager volume flow"))
             raise exception.CinderException(
@@ -503,6 +551,13 @@ class VolumeManager(manager.SchedulerDependentManager):
             self.db.volume_destroy(context, volume_id)
             LOG.info(_LI("volume %s: deleted successfully"), volume_ref['id'])
 
+            # Forget the volume if it held an image-volume cache entry
+            if self.image_volume_cache:
+                cache_entry = self.image_volume_cache.get_by_image_volume(
+                    context, volume_id)
+                if cache_entry:
+                    self.image_volume_cache.evict(context, cache_entry)
+
         # If deleting source/destination volume in a migration, we should
         # skip quotas.
         if not is_migrating:
@@ -823,8 +878,10 @@ class VolumeManager(manager.SchedulerDependentManager):
 
             image_service, image_id = \
                 glance.get_remote_image_service(context, image_meta['id'])
-            self.driver.copy_volume_to_image(context, volume, image_service,
-                                             image_meta)
+            if not self._clone_volume_to_image(context, volume,
+                                               image_service, image_meta):
+                self.driver.copy_volume_to_image(context, volume,
+                                                 image_service, image_meta)
             LOG.debug("Uploaded volume %(volume_id)s to "
                       "image (%(image_id)s) successfully",
                       {'volume_id': volume_id, 'image_id': image_id})
@@ -847,6 +904,27 @@ class VolumeManager(manager.SchedulerDependentManager):
                 self.db.volume_update(context, volume_id,
                                       {'status': 'in-use'})
 
+    def _clone_volume_to_image(self, context, volume, image_service,
+                               image_meta):
+        """Creates the image from a backend copy of the volume if enabled.
+
+        Returns False if the volume has to be copied to the image instead.
+        """
+        if not self.driver.configuration.safe_get(
+                'image_upload_use_backend_clone'):
+            return False
+        try:
+            return self.driver.clone_volume_to_image(context, volume,
+                                                     image_service,
+                                                     image_meta)
+        except Exception:
+            LOG.warning(_LW("Failed to create image %(image_id)s from a "
+                            "backend copy of volume %(volume_id)s, copying "
+                            "the volume instead."),
+                        {'image_id': image_meta['id'],
+                         'volume_id': volume['id']}, exc_info=True)
+            return False
+
     def _delete_image(self, context, image_id, image_service):
         """Deletes an image stuck in queued or saving state."""
         try:
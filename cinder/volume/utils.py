@@ -297,7 +297,13 @@ def check_for_odirect_support(src, dest, flag='oflag=direct'):
 
 
 def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
-                execute=utils.execute, ionice=None):
+                execute=utils.execute, ionice=None, sparse=False):
+    """Copy size_in_m MB from srcstr to deststr with dd.
+
+    With sparse, blocks of zeros are skipped instead of written, which is
+    only correct if deststr already reads back as zeros, like a new thin
+    provisioned volume does.
+    """
     # Use O_DIRECT to avoid thrashing the system buffer cache
     extra_flags = []
     if check_for_odirect_support(srcstr, deststr, 'iflag=direct'):
@@ -309,8 +315,18 @@ def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
     # If the volume is being unprovisioned then
     # request the data is persisted before returning,
     # so that it's not discarded from the cache.
+    conv = []
     if sync and not extra_flags:
-        extra_flags.append('conv=fdatasync')
+        conv.append('fdatasync')
+    if sparse:
+        if check_for_odirect_support(srcstr, deststr, 'conv=sparse'):
+            conv.append('sparse')
+        else:
+            LOG.debug("dd does not support conv=sparse, copying all blocks "
+                      "to %s." % deststr)
+            sparse = False
+    if conv:
+        extra_flags.append('conv=%s' % ','.join(conv))
 
     blocksize, count = _calculate_count(size_in_m, blocksize)
 
@@ -336,11 +352,13 @@ def copy_volume(srcstr, deststr, size_in_m, blocksize, sync=False,
         duration = 1
     mbps = (size_in_m / duration)
     mesg = ("Volume copy details: src %(src)s, dest %(dest)s, "
-            "size %(sz).2f MB, duration %(duration).2f sec")
+            "size %(sz).2f MB, duration %(duration).2f sec, "
+            "sparse %(sparse)s")
     LOG.debug(mesg % {"src": srcstr,
                       "dest": deststr,
                       "sz": size_in_m,
-                      "duration": duration})
+                      "duration": duration,
+                      "sparse": sparse})
     mesg = _("Volume copy %(size_in_m).2f MB at %(mbps).2f MB/s")
     LOG.info(mesg % {'size_in_m': size_in_m, 'mbps': mbps})
 
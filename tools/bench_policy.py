@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time the policy checks made on the volume API get and get_all paths.
+
+A get checks volume:get against the volume and the soft authorizers of the
+volume attribute extensions.  A get_all checks volume:get_all, the same
+extension authorizers and then volume:get for every volume returned, the
+way a per item filter does.  The checks run against etc/cinder/policy.json
+with a member context, and the best time per request is printed.
+
+Usage: tools/bench_policy.py [volumes] [repeat]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from oslo.config import cfg  # noqa
+
+from cinder.api import extensions  # noqa
+from cinder import context  # noqa
+from cinder import policy  # noqa
+from cinder.volume import api as volume_api  # noqa
+
+CONF = cfg.CONF
+
+EXTENSIONS = ['volume_host_attribute', 'volume_tenant_attribute',
+              'volume_mig_status_attribute', 'volume_image_metadata']
+
+
+def _authorizers():
+    return [extensions.soft_extension_authorizer('volume', name)
+            for name in EXTENSIONS]
+
+
+def _context():
+    return context.RequestContext('user', 'project', roles=['member'])
+
+
+def get(volume, authorizers):
+    ctxt = _context()
+    volume_api.check_policy(ctxt, 'get', volume)
+    for authorize in authorizers:
+        authorize(ctxt)
+
+
+def get_all(volumes, authorizers):
+    ctxt = _context()
+    volume_api.check_policy(ctxt, 'get_all')
+    for authorize in authorizers:
+        authorize(ctxt)
+    for volume in volumes:
+        volume_api.check_policy(ctxt, 'get', volume)
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 1000
+    repeat = int(argv[2]) if len(argv) > 2 else 10
+    CONF([], project='cinder')
+    CONF.set_override('policy_file', os.path.abspath(
+        os.path.join(os.path.dirname(__file__), os.pardir,
+                     'etc', 'cinder', 'policy.json')))
+    policy.init()
+
+    authorizers = _authorizers()
+    volumes = [{'id': 'vol%d' % i, 'project_id': 'project',
+                'user_id': 'user'} for i in range(count)]
+
+    times = timeit.repeat(lambda: get(volumes[0], authorizers),
+                          number=1000, repeat=repeat)
+    print('get: best %.1f us per request' % (min(times) * 1000))
+    times = timeit.repeat(lambda: get_all(volumes, authorizers),
+                          number=1, repeat=repeat)
+    print('get_all of %d volumes: best %.2f ms per request' %
+          (count, min(times) * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time the XML serialization of a volume list response.
+
+Serializes a list of volumes with the v2 VolumesTemplate and the host and
+tenant attribute extension templates attached, the way a detail request
+with those extensions loaded does, and prints the best time per response.
+
+Usage: tools/bench_xml_templates.py [volumes] [repeat]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from cinder.api.contrib import volume_host_attribute  # noqa
+from cinder.api.contrib import volume_tenant_attribute  # noqa
+from cinder.api.v2 import volumes  # noqa
+
+
+def _volume(i):
+    return {
+        'id': '00000000-0000-0000-0000-%012d' % i,
+        'status': 'available',
+        'size': 1,
+        'availability_zone': 'nova',
+        'created_at': '2014-01-01T00:00:00.000000',
+        'name': 'vol%d' % i,
+        'description': 'volume %d' % i,
+        'volume_type': 'lvm',
+        'snapshot_id': None,
+        'source_volid': None,
+        'consistencygroup_id': None,
+        'attachments': [{'id': 'a%d' % i, 'volume_id': 'v%d' % i,
+                         'server_id': 's%d' % i, 'device': '/dev/vdb'}],
+        'metadata': {'key1': 'value1', 'key2': 'value2'},
+        'os-vol-host-attr:host': 'host@lvm#pool',
+        'os-vol-tenant-attr:tenant_id': 'tenant',
+    }
+
+
+def serialize(data):
+    template = volumes.VolumesTemplate()
+    template.attach(
+        volume_host_attribute.VolumeListHostAttributeTemplate(),
+        volume_tenant_attribute.VolumeListTenantAttributeTemplate())
+    return template.serialize(data)
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 1000
+    repeat = int(argv[2]) if len(argv) > 2 else 10
+    data = {'volumes': [_volume(i) for i in range(count)]}
+
+    times = timeit.repeat(lambda: serialize(data), number=1, repeat=repeat)
+    print('%d volumes: best %.1f ms per response' %
+          (count, min(times) * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv)